@@ -0,0 +1,115 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Compares the memory and time it takes to build a data frame of query results
+
+    python scripts/benchmark_fetch.py --rows 1000000
+
+Rows are served by an in-memory DB-API cursor, so that only building the
+frame is measured, either from `list(cursor.fetchall())` or with
+`superset.utils.fetch.fetch_df`.
+"""
+import argparse
+from datetime import datetime, timedelta
+from decimal import Decimal
+import time
+import tracemalloc
+
+import pandas as pd
+
+from superset.utils.fetch import fetch_df
+
+
+class NUMBER(object):
+    def __eq__(self, other):
+        return other == 'number'
+
+
+class DBAPI(object):
+    NUMBER = NUMBER()
+
+
+class Cursor(object):
+    description = [
+        ('ds', 'datetime', None, None, None, None, None),
+        ('name', 'string', None, None, None, None, None),
+        ('num', 'number', None, None, None, None, None),
+        ('sum__num', 'number', None, None, None, None, None),
+        ('avg__num', 'number', None, None, None, None, None),
+    ]
+
+    def __init__(self, rowcount):
+        self.rowcount = rowcount
+        self.fetched = 0
+        self.start = datetime(2019, 1, 1)
+
+    def make_row(self, i):
+        return (
+            self.start + timedelta(minutes=i),
+            'name_{}'.format(i % 1000),
+            i,
+            Decimal(i) / 4,
+            None if i % 10 == 0 else i / 3,
+        )
+
+    def fetchmany(self, size):
+        end = min(self.fetched + size, self.rowcount)
+        rows = [self.make_row(i) for i in range(self.fetched, end)]
+        self.fetched = end
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(self.rowcount)
+
+
+def fetch_records(cursor):
+    columns = [col_desc[0] for col_desc in cursor.description]
+    return pd.DataFrame.from_records(
+        data=list(cursor.fetchall()),
+        columns=columns,
+        coerce_float=True,
+    )
+
+
+def measure(name, fetch, rows):
+    tracemalloc.start()
+    start = time.time()
+    df = fetch(Cursor(rows))
+    elapsed = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    frame_size = df.memory_usage(index=True, deep=True).sum()
+    print('{:<12} {:>8.2f} s {:>10.1f} MB peak {:>10.1f} MB frame'.format(
+        name, elapsed, peak / 2 ** 20, frame_size / 2 ** 20))
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    expected = measure('fetchall', fetch_records, args.rows)
+    df = measure(
+        'fetchmany',
+        lambda cursor: fetch_df(cursor, DBAPI, args.chunk_size),
+        args.rows)
+    pd.testing.assert_frame_equal(expected, df)
+
+
+if __name__ == '__main__':
+    main()
@@ -107,6 +107,7 @@ setup(
         'wtforms-json',
     ],
     extras_require={
+        'arrow': ['pyarrow>=0.12.0'],
         'cors': ['flask-cors>=2.0.0'],
         'console_log': ['console_log==0.2.10'],
         'hive': [
@@ -385,6 +385,37 @@ def update_datasources_cache():
                 print('{}'.format(str(e)))
 
 
+@app.cli.command()
+@click.option(
+    '--datasource-type', '-t', default='table',
+    help='Type of the datasource, `table` or `druid`')
+@click.option(
+    '--datasource-id', '-i', type=int, help='Id of the datasource')
+@click.option(
+    '--table-name', '-n', help='Name of the table, instead of its id')
+@click.option(
+    '--schema', '-s', help='Schema of the table, when using its name')
+def invalidate_cache(datasource_type, datasource_id, table_name, schema):
+    """Invalidates the cached chart data of a datasource"""
+    from superset.connectors.connector_registry import ConnectorRegistry
+    session = db.session()
+    datasource_class = ConnectorRegistry.sources[datasource_type]
+    if datasource_id is not None:
+        datasources = session.query(datasource_class).filter_by(
+            id=datasource_id).all()
+    elif table_name and datasource_type == 'table':
+        datasources = session.query(datasource_class).filter_by(
+            table_name=table_name, schema=schema).all()
+    else:
+        raise click.UsageError(
+            'Either --datasource-id or --table-name should be specified')
+    if not datasources:
+        raise click.ClickException('No matching datasource found')
+    for datasource in datasources:
+        datasource.invalidate_cache()
+        print('Invalidated the cache of [{}]'.format(datasource.full_name))
+
+
 @app.cli.command()
 @click.option(
     '--workers', '-w',
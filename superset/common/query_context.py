@@ -15,9 +15,10 @@
 # specific language governing permissions and limitations
 # under the License.
 # pylint: disable=C,R,W
+import copy
 from datetime import datetime, timedelta
+from functools import partial
 import logging
-import pickle as pkl
 import traceback
 from typing import Dict, List
 
@@ -27,12 +28,24 @@ import pandas as pd
 from superset import app, cache
 from superset import db
 from superset.connectors.connector_registry import ConnectorRegistry
-from superset.utils import core as utils
+from superset.utils import core as utils, subsumption
+from superset.utils.cache_codecs import get_cache_codec
+from superset.utils.cache_index import register
+from superset.utils.cache_keys import project_columns
 from superset.utils.core import DTTM_ALIAS
+from superset.utils.single_flight import SingleFlight
+from superset.utils.stale_cache import (
+    get_stale_timeout,
+    is_stale,
+    refresh_in_background,
+    set_freshness,
+)
+from superset.utils.tiered_cache import evict_local
 from .query_object import QueryObject
 
 config = app.config
 stats_logger = config.get('STATS_LOGGER')
+cache_codec = get_cache_codec(config.get('CACHE_CONFIG'))
 
 
 class QueryContext:
@@ -52,6 +65,7 @@ class QueryContext:
             queries: List[Dict],
             force: bool = False,
             custom_cache_timeout: int = None,
+            confirm_cost: bool = False,
     ):
         self.datasource = ConnectorRegistry.get_datasource(datasource.get('type'),
                                                            int(datasource.get('id')),  # noqa: E501, T400
@@ -59,6 +73,7 @@ class QueryContext:
         self.queries = list(map(lambda query_obj: QueryObject(**query_obj), queries))
 
         self.force = force
+        self.confirm_cost = confirm_cost
 
         self.custom_cache_timeout = custom_cache_timeout
 
@@ -78,7 +93,8 @@ class QueryContext:
                 timestamp_format = dttm_col.python_date_format
 
         # The datasource here can be different backend but the interface is common
-        result = self.datasource.query(query_object.to_dict())
+        result = self.datasource.query(
+            query_object.to_dict(), cost_confirmed=self.confirm_cost)
 
         df = result.df
         # Transform the timestamp we received from database to pandas supported
@@ -107,6 +123,8 @@ class QueryContext:
             'status': result.status,
             'error_message': result.error_message,
             'df': df,
+            'queue_wait': result.queue_wait,
+            'cost_estimate': result.cost_estimate,
         }
 
     def df_metrics_to_num(self, df, query_object):
@@ -149,10 +167,75 @@ class QueryContext:
             return self.datasource.database.cache_timeout
         return config.get('CACHE_DEFAULT_TIMEOUT')
 
+    @property
+    def cache_stale_timeout(self):
+        return get_stale_timeout(
+            self.datasource, config.get('CACHE_STALE_TIMEOUT'))
+
+    @property
+    def subsumption_cache_enabled(self):
+        return bool(cache) and bool(
+            (config.get('CACHE_CONFIG') or {}).get('CACHE_SUBSUMPTION'))
+
+    def subsumption_index_key(self, query_obj, **kwargs):
+        relaxed = copy.copy(query_obj)
+        relaxed.row_limit = None
+        _, relaxed.filter = subsumption.split_filters(query_obj.to_dict())
+        return 'subsumption_' + relaxed.cache_key(
+            datasource=self.datasource.uid,
+            datasource_generation=self.datasource.cache_generation,
+            **kwargs)
+
+    def register_subsumption_source(self, query_obj, cache_key, df, **kwargs):
+        """Makes a freshly cached result available to narrower queries"""
+        query_dict = query_obj.to_dict()
+        if (
+                df is None or
+                not self.subsumption_cache_enabled or
+                not subsumption.is_eligible(query_dict)):
+            return
+        cache_config = config.get('CACHE_CONFIG') or {}
+        register(
+            cache,
+            self.subsumption_index_key(query_obj, **kwargs),
+            subsumption.make_entry(cache_key, query_dict, df),
+            max_entries=cache_config.get('CACHE_SUBSUMPTION_MAX_SOURCES', 10),
+            timeout=self.cache_timeout)
+
+    def get_subsumed_result(self, query_obj, **kwargs):
+        """Returns the result of a query out of a broader cached one, if any"""
+        query_dict = query_obj.to_dict()
+        if not self.subsumption_cache_enabled or \
+                not subsumption.is_eligible(query_dict):
+            return None
+        entry, kind = subsumption.find_source(
+            cache, self.subsumption_index_key(query_obj, **kwargs), query_dict)
+        cache_value = cache.get(entry['key']) if entry else None
+        df = None
+        if cache_value:
+            try:
+                cache_value = cache_codec.decode(cache_value)
+                df = subsumption.apply(cache_value['df'], query_dict)
+            except Exception as e:
+                logging.exception(e)
+        if df is None:
+            stats_logger.incr('semantic_cache_miss')
+            return None
+        stats_logger.incr('semantic_cache_hit_{}'.format(kind))
+        return {
+            'query': '-- served from the cached result of:\n{}'.format(
+                cache_value['query']),
+            'status': utils.QueryStatus.SUCCESS,
+            'error_message': None,
+            'df': df,
+        }
+
     def get_df_payload(self, query_obj, **kwargs):
         """Handles caching around the df paylod retrieval"""
         cache_key = query_obj.cache_key(
-            datasource=self.datasource.uid, **kwargs) if query_obj else None
+            datasource=self.datasource.uid,
+            datasource_generation=self.datasource.cache_generation,
+            **kwargs) if query_obj else None
         logging.info('Cache key: {}'.format(cache_key))
         is_loaded = False
         stacktrace = None
@@ -162,16 +245,34 @@ class QueryContext:
         status = None
         query = ''
         error_message = None
+        stale = False
+        queue_wait = 0
+        cost_estimate = None
+        if cache_key and cache and self.force:
+            evict_local(cache, cache_key)
+        flight = SingleFlight(
+            cache, cache_key, config.get('CACHE_CONFIG'), stats_logger)
         if cache_key and cache and not self.force:
             cache_value = cache.get(cache_key)
+            if not cache_value:
+                # wait for an identical in-flight query to populate the cache
+                cache_value = flight.wait()
             if cache_value:
                 stats_logger.incr('loaded_from_cache')
                 try:
-                    cache_value = pkl.loads(cache_value)
+                    cache_value = cache_codec.decode(cache_value)
                     df = cache_value['df']
                     query = cache_value['query']
                     status = utils.QueryStatus.SUCCESS
                     is_loaded = True
+                    if is_stale(cache_value):
+                        stats_logger.incr('loaded_from_stale_cache')
+                        stale = True
+                        refresh_in_background(
+                            cache,
+                            cache_key,
+                            partial(self.refresh_df_payload, query_obj, **kwargs),
+                            config.get('SUPERSET_WEBSERVER_TIMEOUT'))
                 except Exception as e:
                     logging.exception(e)
                     logging.error('Error reading cache: ' +
@@ -180,11 +281,14 @@ class QueryContext:
 
         if query_obj and not is_loaded:
             try:
-                query_result = self.get_query_result(query_obj)
+                query_result = self.get_subsumed_result(query_obj, **kwargs) or \
+                    self.get_query_result(query_obj)
                 status = query_result['status']
                 query = query_result['query']
                 error_message = query_result['error_message']
                 df = query_result['df']
+                queue_wait = query_result.get('queue_wait', 0)
+                cost_estimate = query_result.get('cost_estimate')
                 if status != utils.QueryStatus.FAILED:
                     stats_logger.incr('loaded_from_source')
                     is_loaded = True
@@ -206,8 +310,9 @@ class QueryContext:
                         df=df if df is not None else None,
                         query=query,
                     )
-                    cache_value = pkl.dumps(
-                        cache_value, protocol=pkl.HIGHEST_PROTOCOL)
+                    timeout = set_freshness(
+                        cache_value, self.cache_timeout, self.cache_stale_timeout)
+                    cache_value = cache_codec.encode(cache_value)
 
                     logging.info('Caching {} chars at key {}'.format(
                         len(cache_value), cache_key))
@@ -216,22 +321,40 @@ class QueryContext:
                     cache.set(
                         cache_key,
                         cache_value,
-                        timeout=self.cache_timeout)
+                        timeout=timeout)
+                    self.register_subsumption_source(
+                        query_obj, cache_key, df, **kwargs)
                 except Exception as e:
                     # cache.set call can fail if the backend is down or if
                     # the key is too large or whatever other reasons
                     logging.warning('Could not cache key {}'.format(cache_key))
                     logging.exception(e)
                     cache.delete(cache_key)
+            flight.release()
+        if df is not None and query_obj:
+            df = project_columns(df, query_obj.to_dict())
         return {
             'cache_key': cache_key,
             'cached_dttm': cache_value['dttm'] if cache_value is not None else None,
             'cache_timeout': self.cache_timeout,
+            'cost_estimate': cost_estimate,
             'df': df,
             'error': error_message,
+            'is_approximate': bool(
+                query_obj and self.datasource.is_approximate(query_obj.to_dict())),
             'is_cached': cache_key is not None,
+            'is_stale': stale,
             'query': query,
+            'queue_wait': queue_wait,
             'status': status,
             'stacktrace': stacktrace,
             'rowcount': len(df.index) if df is not None else 0,
         }
+
+    def refresh_df_payload(self, query_obj, **kwargs):
+        """Recomputes and caches a payload, outside of the current request"""
+        query_context = copy.copy(self)
+        query_context.force = True
+        query_context.datasource = ConnectorRegistry.get_datasource(
+            self.datasource.type, self.datasource.id, db.session)
+        query_context.get_df_payload(query_obj, **kwargs)
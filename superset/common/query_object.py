@@ -22,6 +22,7 @@ import simplejson as json
 
 from superset import app
 from superset.utils import core as utils
+from superset.utils.cache_keys import canonicalize
 
 
 # TODO: Type Metrics dictionary with TypedDict when it becomes a vanilla python type
@@ -104,12 +105,15 @@ class QueryObject:
         We remove datetime bounds that are hard values, and replace them with
         the use-provided inputs to bounds, which may be time-relative (as in
         "5 days ago" or "now").
+        The query object is put in a canonical form first, so that the order
+        of its groupby, filters or metrics doesn't change the key.
         """
         cache_dict = self.to_dict()
         cache_dict.update(extra)
 
         for k in ['from_dttm', 'to_dttm']:
             del cache_dict[k]
+        cache_dict = canonicalize(cache_dict)
         if self.time_range:
             cache_dict['time_range'] = self.time_range
         json_data = self.json_dumps(cache_dict, sort_keys=True)
@@ -66,6 +66,66 @@ SUPERSET_WEBSERVER_PORT = 8088
 # (gunicorn, nginx, apache, ...) timeout setting to be <= to this setting
 SUPERSET_WEBSERVER_TIMEOUT = 60
 
+# When set, chart queries are cancelled after running this many seconds, on
+# the databases whose engine spec knows how to. SUPERSET_WEBSERVER_TIMEOUT is
+# a good value, as the request waiting for them has timed out by then. This
+# can be overridden with `query_timeout` in a database's extra. Queries are
+# also cancelled when their client disconnects, but only the ones of the
+# charts served by the `/superset/dashboard_data/` endpoint.
+CHART_QUERY_TIMEOUT = None
+
+# How many of a chart's queries (the main one plus the time comparisons of
+# line charts or the columns of filter boxes) can run at once. This can be
+# overridden with `query_concurrency` in a database's extra.
+DEFAULT_QUERY_CONCURRENCY = 1
+
+# When set, the time comparisons of line charts on tables are fetched along
+# with the main query, in a single query over the union of their time windows,
+# when that union spans at most this many times the total duration of the
+# windows. 1 only scans windows that don't leave gaps between them. `None`
+# runs a query per window.
+TIME_COMPARE_SINGLE_SCAN_RATIO = None
+
+# Queries open a connection of their own to analytics databases, unless the
+# database sets `connection_pool` in its extra, or this is set: the queries of
+# a worker process then share a pool of connections to the database. The
+# `connection_pool` of a database overrides these settings, and `null` opens
+# a connection per query. `pre_ping` tests connections before handing them
+# out, as the warehouse may have closed them. For instance:
+# DEFAULT_DB_CONNECTION_POOL = {
+#     'pool_size': 5,
+#     'max_overflow': 10,
+#     'pool_recycle': 3600,
+#     'pool_timeout': 30,
+#     'pre_ping': True,
+# }
+DEFAULT_DB_CONNECTION_POOL = None
+
+# The engines of analytics databases, and so their connection pools, are kept
+# per database, schema, impersonated user and source. Only this many of the
+# most recently used ones are kept, each for at most this many seconds.
+DB_ENGINE_REGISTRY_SIZE = 100
+DB_ENGINE_REGISTRY_TTL = 24 * 60 * 60
+
+# Limits how many chart queries run at once against a database, which a
+# database overrides with `admission_control` in its extra. Queries over
+# `max_queries` wait in a queue per user, or per dashboard when `fair_by` is
+# 'dashboard', and fail after waiting `max_wait` seconds. The queries running
+# are counted per process, or across processes in the cache backend when
+# `distributed`. For instance:
+# {'max_queries': 8, 'max_wait': 30, 'fair_by': 'user', 'distributed': False}
+DEFAULT_DB_ADMISSION_CONTROL = None
+
+# Thresholds of the rows and bytes that chart and SQL Lab queries are
+# estimated to read, above which they get a warning, need a confirmation or
+# are refused, on the databases whose engine can estimate them. A database
+# overrides them with `cost_guardrails` in its extra. For instance:
+# {'warn': {'bytes': 10 ** 10}, 'confirm': {'bytes': 10 ** 11},
+#  'refuse': {'rows': 10 ** 10}}
+DEFAULT_DB_COST_GUARDRAILS = None
+# how long the estimates of queries are cached, in seconds
+COST_ESTIMATE_CACHE_TIMEOUT = 60 * 60
+
 SUPERSET_DASHBOARD_POSITION_DATA_LIMIT = 65535
 EMAIL_NOTIFICATIONS = False
 CUSTOM_SECURITY_MANAGER = None
@@ -236,7 +296,56 @@ IMG_UPLOAD_URL = '/static/uploads/'
 # IMG_SIZE = (300, 200, True)
 
 CACHE_DEFAULT_TIMEOUT = 60 * 60 * 24
+# Once a chart's `cache_timeout` has passed, keep serving its cached data for
+# this many more seconds while it is recomputed in the background. This can be
+# overridden with `cache_stale_timeout` in a datasource's params or in a
+# database's extra. `None` disables stale-while-revalidate.
+CACHE_STALE_TIMEOUT = None
 CACHE_CONFIG = {'CACHE_TYPE': 'null'}
+# The chart dataframe cache serializes payloads with the codec set under
+# `CACHE_CODEC` in `CACHE_CONFIG`. `pickle` (the default) pickles the whole
+# payload, `arrow` stores the dataframe as a compressed Arrow stream (requires
+# `pyarrow`), with codec arguments passed as `CACHE_CODEC_OPTIONS`, e.g.:
+# CACHE_CONFIG = {
+#     'CACHE_TYPE': 'redis',
+#     'CACHE_CODEC': 'arrow',
+#     'CACHE_CODEC_OPTIONS': {'compression': 'zstd'},
+# }
+# Setting `CACHE_L1_MAX_ENTRIES` in a cache config puts a per-process LRU
+# tier in front of the shared backend, bounded by `CACHE_L1_MAX_BYTES`
+# (default 64MB). Local entries live for the `cache_timeout` they were set
+# with, capped to `CACHE_L1_MAX_TIMEOUT` seconds (default 300) since entries
+# refreshed by other processes can't be invalidated locally.
+# Setting `CACHE_SINGLE_FLIGHT_TIMEOUT` (in seconds) in `CACHE_CONFIG` makes
+# concurrent chart requests missing the cache on the same key wait for the
+# first one to run the query instead of all hitting the database. Waiters
+# fall back to running the query themselves after the timeout. The lock is
+# kept in the cache backend unless `CACHE_SINGLE_FLIGHT_LOCK` is `local`.
+# Setting `CACHE_GET_DATA` to True in `CACHE_CONFIG` also caches the
+# serialized, post-processed data of charts on top of their dataframes. Filter
+# boxes (`cache_type = 'get_data'`) always cache their data.
+# Setting `CACHE_INCREMENTAL` to True in `CACHE_CONFIG` caches time series
+# results per time bucket (of the chart's time grain), so that moving a time
+# range only queries the buckets that aren't cached yet, plus the still open
+# ones. Buckets are considered open until `CACHE_INCREMENTAL_LAG` seconds
+# after their end (default 0), which also accounts for late data and time
+# zone offsets. Queries spanning more than `CACHE_INCREMENTAL_MAX_BUCKETS`
+# buckets (default 1000) are not split.
+# Setting `CACHE_ROLLUP` to True in `CACHE_CONFIG` answers queries whose
+# metrics are all plain SUM, COUNT, MIN or MAX aggregates from cached results
+# of the same query with more groupby columns or a finer time grain, rolling
+# them up in pandas instead of querying the database. Up to
+# `CACHE_ROLLUP_MAX_SOURCES` (default 10) such results are tracked per query.
+# Setting `CACHE_SUBSUMPTION` to True in `CACHE_CONFIG` answers queries from
+# the cached result of the same query with a higher row limit, or without
+# some of its equality/IN filters on grouped dimensions, by slicing or
+# masking it. Hits are reported as `semantic_cache_hit_row_limit` and
+# `semantic_cache_hit_filter`. Up to `CACHE_SUBSUMPTION_MAX_SOURCES`
+# (default 10) such results are tracked per query.
+# Setting `CACHE_PREQUERIES` to True in `CACHE_CONFIG` caches the top groups
+# selected by the prequeries of time series limited to their top series, so
+# that the charts and time comparisons selecting the same groups don't query
+# them again. Hits are reported as `prequery_cache_hit`.
 TABLE_NAMES_CACHE_CONFIG = {'CACHE_TYPE': 'null'}
 
 # CORS Options
@@ -400,6 +509,10 @@ class CeleryConfig(object):
             'task': 'email_reports.schedule_hourly',
             'schedule': crontab(minute=1, hour='*'),
         },
+        'rollups.schedule_refreshes': {
+            'task': 'rollups.schedule_refreshes',
+            'schedule': crontab(minute='*/10'),
+        },
     }
 
 
@@ -431,6 +544,26 @@ SQLLAB_DEFAULT_DBID = None
 # by celery.
 SQLLAB_ASYNC_TIME_LIMIT_SEC = 60 * 60 * 6
 
+# Lets `explore_json` and `/api/v1/query/` compute the charts requested with
+# `async=true` on Celery workers, which requires a cache. They answer with a
+# 202 and the url the client then polls for the payload, which waits up to
+# ASYNC_QUERY_MAX_WAIT seconds for it with `wait`. Chart queries are
+# cancelled after running ASYNC_QUERY_TIMEOUT seconds on workers, and jobs
+# are forgotten after ASYNC_QUERY_JOB_TIMEOUT seconds.
+ASYNC_CHART_QUERIES = False
+ASYNC_QUERY_TIMEOUT = 60 * 10
+ASYNC_QUERY_JOB_TIMEOUT = 60 * 60
+ASYNC_QUERY_MAX_WAIT = 30
+ASYNC_QUERY_POLL_INTERVAL = 0.5
+
+# Rollups pre-aggregate tables into tables of their database, which the
+# queries they answer are routed to. Celery beat checks every 10 minutes for
+# the rollups to build again, each `refresh_interval` seconds or every
+# `ROLLUP_REFRESH_INTERVAL` seconds when unset. Builds taking more than
+# `ROLLUP_REFRESH_TIMEOUT` seconds are stopped.
+ROLLUP_REFRESH_INTERVAL = 24 * 60 * 60
+ROLLUP_REFRESH_TIMEOUT = 60 * 60
+
 # An instantiated derivative of werkzeug.contrib.cache.BaseCache
 # if enabled, it can be used to store the results of long-running queries
 # in SQL Lab by using the "Run Async" button/feature
@@ -26,6 +26,7 @@ from sqlalchemy.orm import foreign, relationship
 from superset.models.core import Slice
 from superset.models.helpers import AuditMixinNullable, ImportMixin
 from superset.utils import core as utils
+from superset.utils.cache_generations import bump_generation, get_generation
 
 
 class BaseDatasource(AuditMixinNullable, ImportMixin):
@@ -84,6 +85,16 @@ class BaseDatasource(AuditMixinNullable, ImportMixin):
         """Unique id across datasource types"""
         return f'{self.id}__{self.type}'
 
+    @property
+    def cache_generation(self):
+        """Changes whenever the cached chart data of this datasource is
+        invalidated, see `invalidate_cache`"""
+        return get_generation(self.type, self.id)
+
+    def invalidate_cache(self):
+        """Invalidates all the cached chart data of this datasource"""
+        bump_generation(self.type, self.id)
+
     @property
     def column_names(self):
         return sorted([c.column_name for c in self.columns], key=lambda x: x or '')
@@ -254,14 +265,20 @@ class BaseDatasource(AuditMixinNullable, ImportMixin):
         understand what is taking place behind the scene"""
         raise NotImplementedError()
 
-    def query(self, query_obj):
+    def query(self, query_obj, cost_confirmed=False):
         """Executes the query and returns a dataframe
 
         query_obj is a dictionary representing Superset's query interface.
-        Should return a ``superset.models.helpers.QueryResult``
+        cost_confirmed confirms queries the cost guardrails of the database
+        ask to confirm, and isn't part of query_obj so it stays out of cache
+        keys. Should return a ``superset.models.helpers.QueryResult``
         """
         raise NotImplementedError()
 
+    def is_approximate(self, query_obj):
+        """Whether some of the metrics of a query are approximated"""
+        return False
+
     def values_for_column(self, column_name, limit=10000):
         """Given a column, returns an iterable of distinct values
 
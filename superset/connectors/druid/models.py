@@ -53,7 +53,8 @@ from superset.exceptions import MetricPermException, SupersetException
 from superset.models.helpers import (
     AuditMixinNullable, ImportMixin, QueryResult,
 )
-from superset.utils import core as utils, import_datasource
+from superset.utils import core as utils, import_datasource, prequery_cache
+from superset.utils.cache_generations import bump_generation
 from superset.utils.core import (
     DimSelector, DTTM_ALIAS, flasher,
 )
@@ -1158,7 +1159,7 @@ class DruidDatasource(Model, BaseDatasource):
             pre_qry['dimension'] = self._dimensions_to_values(qry.get('dimensions'))[0]
             del pre_qry['dimensions']
 
-            client.topn(**pre_qry)
+            df = self.run_prequery(client, 'topn', pre_qry)
             logging.info('Phase 1 Complete')
             if phase == 2:
                 query_str += '// Two phase query\n// Phase 1\n'
@@ -1169,7 +1170,6 @@ class DruidDatasource(Model, BaseDatasource):
                 return query_str
             query_str += (
                 "// Phase 2 (built based on phase one's results)\n")
-            df = client.export_pandas()
             qry['filter'] = self._add_filter_from_pre_query_data(
                 df,
                 [pre_qry['dimension']],
@@ -1230,7 +1230,7 @@ class DruidDatasource(Model, BaseDatasource):
                         'direction': order_direction,
                     }],
                 }
-                client.groupby(**pre_qry)
+                df = self.run_prequery(client, 'groupby', pre_qry)
                 logging.info('Phase 1 Complete')
                 query_str += '// Two phase query\n// Phase 1\n'
                 query_str += json.dumps(
@@ -1240,7 +1240,6 @@ class DruidDatasource(Model, BaseDatasource):
                     return query_str
                 query_str += (
                     "// Phase 2 (built based on phase one's results)\n")
-                df = client.export_pandas()
                 qry['filter'] = self._add_filter_from_pre_query_data(
                     df,
                     pre_qry['dimensions'],
@@ -1267,6 +1266,22 @@ class DruidDatasource(Model, BaseDatasource):
             client.query_builder.last_query.query_dict, indent=2)
         return query_str
 
+    def run_prequery(self, client, query_type, pre_qry):
+        """Runs the first phase of a two-phase query, returns its frame
+
+        When prequeries are cached, the query is built first to look its
+        frame up in the cache, which also makes it the client's last query.
+        """
+        def run():
+            getattr(client, query_type)(**pre_qry)
+            return client.export_pandas()
+
+        if not prequery_cache.is_enabled():
+            return run()
+        query = getattr(client.query_builder, query_type)(pre_qry)
+        return prequery_cache.get_df(
+            self, json.dumps(query.query_dict, sort_keys=True), run)
+
     @staticmethod
     def homogenize_types(df, groupby_cols):
         """Converting all GROUPBY columns to strings
@@ -1282,7 +1297,7 @@ class DruidDatasource(Model, BaseDatasource):
             df[col] = df[col].fillna('<NULL>').astype('unicode')
         return df
 
-    def query(self, query_obj):
+    def query(self, query_obj, cost_confirmed=False):
         qry_start_dttm = datetime.now()
         client = self.cluster.get_pydruid_client()
         query_str = self.get_query_str(
@@ -1544,5 +1559,19 @@ class DruidDatasource(Model, BaseDatasource):
         ]
 
 
+def invalidate_datasource_cache(mapper, connection, target):
+    """Invalidates the cached charts of a Druid datasource when it, or one
+    of its columns or metrics, changes"""
+    datasource_id = (
+        target.id if isinstance(target, DruidDatasource)
+        else target.datasource_id)
+    if datasource_id:
+        bump_generation(DruidDatasource.type, datasource_id)
+
+
 sa.event.listen(DruidDatasource, 'after_insert', security_manager.set_perm)
 sa.event.listen(DruidDatasource, 'after_update', security_manager.set_perm)
+sa.event.listen(DruidDatasource, 'after_update', invalidate_datasource_cache)
+for cls in (DruidColumn, DruidMetric):
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        sa.event.listen(cls, event_name, invalidate_datasource_cache)
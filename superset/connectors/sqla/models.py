@@ -16,8 +16,10 @@
 # under the License.
 # pylint: disable=C,R,W
 from collections import namedtuple, OrderedDict
-from datetime import datetime
+from datetime import datetime, timedelta
+import json
 import logging
+import time
 
 from flask import escape, Markup
 from flask_appbuilder import Model
@@ -30,18 +32,29 @@ from sqlalchemy import (
 )
 from sqlalchemy.exc import CompileError
 from sqlalchemy.orm import backref, relationship
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.schema import UniqueConstraint
 from sqlalchemy.sql import column, literal_column, table, text
 from sqlalchemy.sql.expression import TextAsFrom
 import sqlparse
 
-from superset import app, db, security_manager
+from superset import app, cache, db, security_manager
 from superset.connectors.base.models import BaseColumn, BaseDatasource, BaseMetric
+from superset.exceptions import QueryCostException, SupersetException
 from superset.jinja_context import get_template_processor
 from superset.models.annotations import Annotation
 from superset.models.core import Database
-from superset.models.helpers import QueryResult
-from superset.utils import core as utils, import_datasource
+from superset.models.helpers import AuditMixinNullable, QueryResult
+from superset.sql_parse import ParsedQuery
+from superset.utils import (
+    core as utils, cost_estimates, import_datasource, prequery_cache,
+)
+from superset.utils.cache_generations import bump_generation
+from superset.utils.incremental_cache import (
+    floor_dttm, is_aligned, is_supported_grain,
+)
+from superset.utils.rollup import get_rollup_aggregate, is_finer_grain
+from superset.utils.single_flight import CacheLock
 
 config = app.config
 metadata = Model.metadata  # pylint: disable=no-member
@@ -57,7 +70,7 @@ class AnnotationDatasource(BaseDatasource):
 
     cache_timeout = 0
 
-    def query(self, query_obj):
+    def query(self, query_obj, cost_confirmed=False):
         df = None
         error_message = None
         qry = db.session.query(Annotation)
@@ -218,11 +231,19 @@ class SqlMetric(Model, BaseMetric):
         s for s in export_fields if s not in ('table_id', )])
     export_parent = 'table'
 
-    def get_sqla_col(self, label=None):
+    def get_sqla_col(self, label=None, approximate=False):
         label = label or self.metric_name
-        sqla_col = literal_column(self.expression)
+        expression = self.expression
+        if approximate:
+            expression = self.get_approximation() or expression
+        sqla_col = literal_column(expression)
         return self.table.make_sqla_column_compatible(sqla_col, label)
 
+    def get_approximation(self):
+        """Returns the expression with approximate aggregates, if there's one"""
+        db_engine_spec = self.table.database.db_engine_spec
+        return db_engine_spec.approximate_expression(self.expression)
+
     @property
     def perm(self):
         return (
@@ -276,6 +297,8 @@ class SqlaTable(Model, BaseDatasource):
     sql = Column(Text)
     is_sqllab_view = Column(Boolean, default=False)
     template_params = Column(Text)
+    # whether charts use approximate aggregates unless they say otherwise
+    approximate = Column(Boolean, default=False)
 
     baselink = 'tablemodelview'
 
@@ -283,7 +306,7 @@ class SqlaTable(Model, BaseDatasource):
         'table_name', 'main_dttm_col', 'description', 'default_endpoint',
         'database_id', 'offset', 'cache_timeout', 'schema',
         'sql', 'params', 'template_params', 'filter_select_enabled',
-        'fetch_values_predicate',
+        'fetch_values_predicate', 'approximate',
     )
     update_from_object_fields = [
         f for f in export_fields if f not in ('table_name', 'database_id')]
@@ -477,11 +500,29 @@ class SqlaTable(Model, BaseDatasource):
         return get_template_processor(
             table=self, database=self.database, **kwargs)
 
+    def get_rollup(self, query_obj):
+        """Returns the smallest built rollup answering a query, if any"""
+        rollups = [
+            r for r in self.rollups if r.physical_table and r.covers(query_obj)]
+        if not rollups:
+            return None
+        return min(
+            rollups,
+            key=lambda r: (
+                r.row_count is None, r.row_count or 0, len(r.dimension_names)))
+
     def get_query_str_extended(self, query_obj):
-        sqlaq = self.get_sqla_query(**query_obj)
+        rollup = self.get_rollup(query_obj)
+        if rollup:
+            sqlaq = rollup.get_sqla_query(query_obj)
+        else:
+            sqlaq = self.get_sqla_query(**query_obj)
         sql = self.database.compile_sqla_query(sqlaq.sqla_query)
         logging.info(sql)
         sql = sqlparse.format(sql, reindent=True)
+        if rollup:
+            sql = '-- routed to the {} rollup of {}\n{}'.format(
+                rollup.name, self.table_name, sql)
         if query_obj['is_prequery']:
             query_obj['prequeries'].append(sql)
         sql = self.mutate_query_from_config(sql)
@@ -506,19 +547,23 @@ class SqlaTable(Model, BaseDatasource):
             return TextAsFrom(sa.text(from_sql), []).alias('expr_qry')
         return self.get_sqla_table()
 
-    def adhoc_metric_to_sqla(self, metric, cols):
+    def adhoc_metric_to_sqla(self, metric, cols, approximate=False):
         """
         Turn an adhoc metric into a sqlalchemy column.
 
         :param dict metric: Adhoc metric definition
         :param dict cols: Columns for the current table
+        :param bool approximate: Whether to use approximate aggregates
         :returns: The metric defined as a sqlalchemy column
         :rtype: sqlalchemy.sql.column
         """
         expression_type = metric.get('expressionType')
         label = utils.get_metric_name(metric)
 
-        if expression_type == utils.ADHOC_METRIC_EXPRESSION_TYPES['SIMPLE']:
+        approximation = approximate and self.get_adhoc_approximation(metric, cols)
+        if approximation:
+            sqla_metric = literal_column(approximation)
+        elif expression_type == utils.ADHOC_METRIC_EXPRESSION_TYPES['SIMPLE']:
             column_name = metric.get('column').get('column_name')
             table_column = cols.get(column_name)
             if table_column:
@@ -533,6 +578,53 @@ class SqlaTable(Model, BaseDatasource):
 
         return self.make_sqla_column_compatible(sqla_metric, label)
 
+    def get_adhoc_approximation(self, metric, cols):
+        """Returns the SQL of an adhoc metric with approximate aggregates
+
+        :param dict metric: Adhoc metric definition
+        :param dict cols: Columns for the current table
+        :returns: The SQL expression, or None if the metric has no
+            approximation on this database
+        """
+        db_engine_spec = self.database.db_engine_spec
+        expression_type = metric.get('expressionType')
+        if expression_type == utils.ADHOC_METRIC_EXPRESSION_TYPES['SIMPLE']:
+            column_name = metric.get('column').get('column_name')
+            table_column = cols.get(column_name)
+            if table_column and table_column.expression:
+                col = table_column.expression
+            else:
+                col = self.database.get_quoter()(column_name)
+            return db_engine_spec.approximate_aggregate(metric.get('aggregate'), col)
+        elif expression_type == utils.ADHOC_METRIC_EXPRESSION_TYPES['SQL']:
+            return db_engine_spec.approximate_expression(metric.get('sqlExpression'))
+        return None
+
+    def uses_approximation(self, extras):
+        """Whether a query asks for approximate aggregates, see `approximate`"""
+        approximate = (extras or {}).get('approximate')
+        if approximate is None:
+            return bool(self.approximate)
+        return bool(approximate)
+
+    def is_approximate(self, query_obj):
+        """Whether some of the metrics of a query are approximated"""
+        if not self.uses_approximation(query_obj.get('extras')):
+            return False
+        cols = {col.column_name: col for col in self.columns}
+        metrics_dict = {m.metric_name: m for m in self.metrics}
+        metrics = list(query_obj.get('metrics') or [])
+        if query_obj.get('timeseries_limit_metric'):
+            metrics.append(query_obj['timeseries_limit_metric'])
+        metrics += [col for col, ascending in query_obj.get('orderby') or []]
+        for metric in metrics:
+            if utils.is_adhoc_metric(metric):
+                if self.get_adhoc_approximation(metric, cols):
+                    return True
+            elif metric in metrics_dict and metrics_dict[metric].get_approximation():
+                return True
+        return False
+
     def get_sqla_query(  # sqla
             self,
             groupby, metrics,
@@ -584,12 +676,20 @@ class SqlaTable(Model, BaseDatasource):
                 'and is required by this type of chart'))
         if not groupby and not metrics and not columns:
             raise Exception(_('Empty query?'))
+        # one grouping set per groupby column
+        grouping_sets = bool(groupby and (extras or {}).get('grouping_sets'))
+        if grouping_sets and (is_timeseries or not db_engine_spec.allows_grouping_sets):
+            raise Exception(_(
+                'Grouping sets are only supported in non time series queries '
+                'on databases supporting them'))
+        approximate = self.uses_approximation(extras)
         metrics_exprs = []
         for m in metrics:
             if utils.is_adhoc_metric(m):
-                metrics_exprs.append(self.adhoc_metric_to_sqla(m, cols))
+                metrics_exprs.append(self.adhoc_metric_to_sqla(m, cols, approximate))
             elif m in metrics_dict:
-                metrics_exprs.append(metrics_dict.get(m).get_sqla_col())
+                metrics_exprs.append(metrics_dict.get(m).get_sqla_col(
+                    approximate=approximate))
             else:
                 raise Exception(_("Metric '{}' is not valid".format(m)))
         if metrics_exprs:
@@ -612,6 +712,9 @@ class SqlaTable(Model, BaseDatasource):
 
                 groupby_exprs_sans_timestamp[outer.name] = outer
                 select_exprs.append(outer)
+                if grouping_sets:
+                    select_exprs.append(self.make_sqla_column_compatible(
+                        sa.func.grouping(outer), utils.GROUPING_PREFIX + s))
         elif columns:
             for s in columns:
                 select_exprs.append(
@@ -630,6 +733,19 @@ class SqlaTable(Model, BaseDatasource):
                 select_exprs += [timestamp]
                 groupby_exprs_with_timestamp[timestamp.name] = timestamp
 
+                # tags rows with a bitmask of the time windows they fall in, so
+                # that the result of a query over their union can be split
+                time_windows = extras.get('time_windows')
+                if time_windows:
+                    tag = None
+                    for i, (start, end) in enumerate(time_windows):
+                        in_window = sa.case(
+                            [(dttm_col.get_time_filter(start, end), 2 ** i)], else_=0)
+                        tag = in_window if tag is None else tag + in_window
+                    tag = self.make_sqla_column_compatible(tag, utils.TIME_WINDOWS_ALIAS)
+                    select_exprs.append(tag)
+                    groupby_exprs_with_timestamp[utils.TIME_WINDOWS_ALIAS] = tag
+
             # Use main dttm column to support index with secondary dttm columns
             if db_engine_spec.time_secondary_columns and \
                     self.main_dttm_col in self.dttm_cols and \
@@ -649,7 +765,11 @@ class SqlaTable(Model, BaseDatasource):
 
         tbl = self.get_from_clause(template_processor)
 
-        if not columns:
+        if grouping_sets:
+            qry = qry.group_by(sa.func.grouping_sets(*[
+                sa.tuple_(gby_obj) for gby_obj in groupby_exprs_with_timestamp.values()
+            ]))
+        elif not columns:
             qry = qry.group_by(*groupby_exprs_with_timestamp.values())
 
         where_clause_and = []
@@ -716,7 +836,7 @@ class SqlaTable(Model, BaseDatasource):
         for col, ascending in orderby:
             direction = asc if ascending else desc
             if utils.is_adhoc_metric(col):
-                col = self.adhoc_metric_to_sqla(col, cols)
+                col = self.adhoc_metric_to_sqla(col, cols, approximate)
             qry = qry.order_by(direction(col))
 
         if row_limit:
@@ -752,6 +872,7 @@ class SqlaTable(Model, BaseDatasource):
                         timeseries_limit_metric,
                         metrics_dict,
                         cols,
+                        approximate,
                     )
                 direction = desc if order_desc else asc
                 subq = subq.order_by(direction(ob))
@@ -773,6 +894,7 @@ class SqlaTable(Model, BaseDatasource):
                             timeseries_limit_metric,
                             metrics_dict,
                             cols,
+                            approximate,
                         ),
                         False,
                     )]
@@ -794,12 +916,20 @@ class SqlaTable(Model, BaseDatasource):
                     'columns': columns,
                     'order_desc': True,
                 }
-                result = self.query(subquery_obj)
+                query_str_ext = self.get_query_str_extended(subquery_obj)
+
+                def run_prequery():
+                    result = self.query(subquery_obj, query_str_ext)
+                    if result.status == utils.QueryStatus.FAILED:
+                        raise Exception(result.error_message)
+                    return result.df
+
+                df = prequery_cache.get_df(self, query_str_ext.sql, run_prequery)
                 dimensions = [
-                    c for c in result.df.columns
+                    c for c in df.columns
                     if c not in metrics and c in groupby_exprs_sans_timestamp
                 ]
-                top_groups = self._get_top_groups(result.df,
+                top_groups = self._get_top_groups(df,
                                                   dimensions,
                                                   groupby_exprs_sans_timestamp)
                 qry = qry.where(top_groups)
@@ -807,32 +937,71 @@ class SqlaTable(Model, BaseDatasource):
         return SqlaQuery(sqla_query=qry.select_from(tbl),
                          labels_expected=labels_expected)
 
-    def _get_timeseries_orderby(self, timeseries_limit_metric, metrics_dict, cols):
+    def _get_timeseries_orderby(
+            self, timeseries_limit_metric, metrics_dict, cols, approximate=False):
         if utils.is_adhoc_metric(timeseries_limit_metric):
-            ob = self.adhoc_metric_to_sqla(timeseries_limit_metric, cols)
+            ob = self.adhoc_metric_to_sqla(timeseries_limit_metric, cols, approximate)
         elif timeseries_limit_metric in metrics_dict:
             timeseries_limit_metric = metrics_dict.get(
                 timeseries_limit_metric,
             )
-            ob = timeseries_limit_metric.get_sqla_col()
+            ob = timeseries_limit_metric.get_sqla_col(approximate=approximate)
         else:
             raise Exception(_("Metric '{}' is not valid".format(timeseries_limit_metric)))
 
         return ob
 
     def _get_top_groups(self, df, dimensions, groupby_exprs):
-        groups = []
-        for unused, row in df.iterrows():
-            group = []
-            for dimension in dimensions:
-                group.append(groupby_exprs[dimension] == row[dimension])
-            groups.append(and_(*group))
+        """Returns a predicate matching the groups in the rows of `df`
 
-        return or_(*groups)
+        Groups sharing the value of their first dimension are factored into
+        a clause on that value and their other dimensions, and so on, values
+        with the same other dimensions sharing an IN clause. The top groups
+        on a single dimension make a single IN clause for instance, rather
+        than an equality per group.
+        """
+        if not dimensions or df.empty:
+            return or_()
+        groups = zip(*[df[dimension].tolist() for dimension in dimensions])
+        groups = [
+            tuple(None if pd.isnull(v) else v for v in group) for group in groups]
+        return self._factor_groups(
+            list(OrderedDict.fromkeys(groups)),
+            [groupby_exprs[dimension] for dimension in dimensions])
 
-    def query(self, query_obj):
+    @classmethod
+    def _factor_groups(cls, groups, exprs):
+        if len(exprs) == 1:
+            return cls._in_values(exprs[0], [group[0] for group in groups])
+        rests = OrderedDict()
+        for group in groups:
+            rests.setdefault(group[0], OrderedDict())[group[1:]] = None
+        values = OrderedDict()
+        for value, rest in rests.items():
+            values.setdefault(frozenset(rest), (list(rest), []))[1].append(value)
+        return or_(*[
+            and_(
+                cls._in_values(exprs[0], vals),
+                cls._factor_groups(rest, exprs[1:]))
+            for rest, vals in values.values()
+        ])
+
+    @staticmethod
+    def _in_values(expr, values):
+        clauses = []
+        not_null = [v for v in values if v is not None]
+        if len(not_null) == 1:
+            clauses.append(expr == not_null[0])
+        elif not_null:
+            clauses.append(expr.in_(not_null))
+        if len(not_null) < len(values):
+            clauses.append(expr == None)  # noqa
+        return or_(*clauses) if len(clauses) > 1 else clauses[0]
+
+    def query(self, query_obj, query_str_ext=None, cost_confirmed=False):
         qry_start_dttm = datetime.now()
-        query_str_ext = self.get_query_str_extended(query_obj)
+        if query_str_ext is None:
+            query_str_ext = self.get_query_str_extended(query_obj)
         sql = query_str_ext.sql
         status = utils.QueryStatus.SUCCESS
         error_message = None
@@ -847,8 +1016,21 @@ class SqlaTable(Model, BaseDatasource):
                     df.columns = labels_expected
             return df
 
+        queue_wait = 0
+        cost_estimate = None
         try:
-            df = self.database.get_df(sql, self.schema, mutator)
+            cost_estimate = cost_estimates.enforce(
+                self.database,
+                sql,
+                self.schema,
+                confirmed=cost_confirmed)
+            with self.database.admit_query() as queue_wait:
+                df = self.database.get_df(sql, self.schema, mutator)
+        except QueryCostException as e:
+            df = None
+            status = utils.QueryStatus.FAILED
+            error_message = str(e)
+            cost_estimate = e.estimate
         except Exception as e:
             df = None
             status = utils.QueryStatus.FAILED
@@ -867,7 +1049,9 @@ class SqlaTable(Model, BaseDatasource):
             df=df,
             duration=datetime.now() - qry_start_dttm,
             query=sql,
-            error_message=error_message)
+            error_message=error_message,
+            queue_wait=queue_wait,
+            cost_estimate=cost_estimate)
 
     def get_sqla_table_object(self):
         return self.database.get_table(self.table_name, schema=self.schema)
@@ -968,5 +1152,362 @@ class SqlaTable(Model, BaseDatasource):
         return qry.filter_by(is_sqllab_view=False)
 
 
+class SqlaRollup(Model, AuditMixinNullable):
+
+    """A pre-aggregation of a table, which its queries are routed to
+
+    A rollup groups the rows of its table by some of its dimensions and by a
+    time grain of its main datetime column, and aggregates some of its
+    additive metrics. It is built in the table's database, as a new physical
+    table each time it's refreshed (see `superset.tasks.rollups`). Queries
+    on the table go to the smallest built rollup covering them: grouping and
+    filtering on its dimensions, with its metrics, its time grain or a
+    coarser one, and a time range aligned on its time grain.
+
+    Time filters include the end of their range, so the rows timestamped at
+    the start of a bucket are aggregated apart from the rest of the bucket:
+    a rollup answers a range ending at a bucket with that part only.
+    """
+
+    __tablename__ = 'sqla_rollups'
+    __table_args__ = (UniqueConstraint('table_id', 'name'),)
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(250), nullable=False)
+    table_id = Column(Integer, ForeignKey('tables.id'), nullable=False)
+    table = relationship(
+        'SqlaTable',
+        backref=backref('rollups', cascade='all, delete-orphan'),
+        foreign_keys=[table_id])
+    # JSON lists of column and metric names
+    dimensions = Column(Text)
+    metrics = Column(Text)
+    time_grain = Column(String(255))
+    # in seconds, defaults to ROLLUP_REFRESH_INTERVAL
+    refresh_interval = Column(Integer)
+    physical_table = Column(String(250))
+    row_count = Column(Integer)
+    refreshed_on = Column(DateTime)
+    # the definitions the physical table was built from, see `get_definition`
+    definition = Column(Text)
+
+    BUCKET_START_ALIAS = '__bucket_start'
+    AGGREGATES = {'sum': 'SUM', 'min': 'MIN', 'max': 'MAX'}
+
+    def __repr__(self):
+        return self.name
+
+    @property
+    def dimension_names(self):
+        return json.loads(self.dimensions or '[]')
+
+    @property
+    def metric_names(self):
+        return json.loads(self.metrics or '[]')
+
+    @property
+    def time_column(self):
+        return self.table.main_dttm_col if self.time_grain else None
+
+    def get_rollup_aggregates(self):
+        """Maps the metrics of the rollup to the SQL aggregates rolling them up"""
+        expressions = {m.metric_name: m.expression for m in self.table.metrics}
+        aggregates = {}
+        for metric in self.metric_names:
+            aggregate = get_rollup_aggregate(metric, expressions)
+            aggregates[metric] = self.AGGREGATES.get(aggregate)
+        return aggregates
+
+    def get_definition(self):
+        """Returns the SQL definitions the rollup's contents depend on
+
+        Those are the ones of its table, dimensions and metrics: a rollup
+        whose physical table was built from other definitions is stale.
+        """
+        table = self.table
+        cols = {c.column_name: c for c in table.columns}
+        metrics = {m.metric_name: m for m in table.metrics}
+        definition = {
+            'table': [table.schema, table.table_name, table.sql],
+            'dimensions': [
+                [d, getattr(cols.get(d), 'expression', None)]
+                for d in self.dimension_names],
+            'metrics': [
+                [m, getattr(metrics.get(m), 'expression', None)]
+                for m in self.metric_names],
+        }
+        if self.time_grain:
+            dttm_col = cols.get(self.time_column)
+            definition['time'] = [
+                self.time_column,
+                getattr(dttm_col, 'expression', None),
+                getattr(dttm_col, 'python_date_format', None),
+                self.time_grain,
+            ]
+        return json.dumps(definition, sort_keys=True)
+
+    @property
+    def is_stale(self):
+        return self.definition != self.get_definition()
+
+    @property
+    def watermark(self):
+        """The end of the last bucket complete when the rollup was built
+
+        Rows of later buckets may have landed in the table since.
+        """
+        if not self.time_grain or not self.refreshed_on:
+            return None
+        return floor_dttm(self.refreshed_on, self.time_grain)
+
+    def validate(self):
+        try:
+            self.dimension_names, self.metric_names
+        except ValueError:
+            raise SupersetException(
+                _('Dimensions and metrics must be JSON lists of names'))
+        table = self.table
+        columns = {c.column_name for c in table.columns}
+        unknown = [d for d in self.dimension_names if d not in columns]
+        if unknown:
+            raise SupersetException(_(
+                'Unknown dimensions: %(dimensions)s', dimensions=', '.join(unknown)))
+        aggregates = self.get_rollup_aggregates()
+        if not aggregates:
+            raise SupersetException(_('A rollup needs metrics'))
+        non_additive = [m for m, aggregate in aggregates.items() if not aggregate]
+        if non_additive:
+            raise SupersetException(_(
+                'Only metrics made of a single SUM, COUNT, MIN or MAX can be '
+                'rolled up: %(metrics)s', metrics=', '.join(non_additive)))
+        if self.time_grain and (
+                not is_supported_grain(self.time_grain) or
+                not table.main_dttm_col or
+                self.time_grain not in table.database.grains_dict()):
+            raise SupersetException(_(
+                'The time grain of a rollup must be supported by its database, '
+                'and its table must have a main datetime column'))
+        if not table.database.db_engine_spec.supports_column_aliases:
+            raise SupersetException(_("Rollups need a database's column aliases"))
+
+    def get_column_expression(self, name):
+        """The reference to a column of the rollup's physical table"""
+        database = self.table.database
+        label = database.db_engine_spec.make_label_compatible(name)
+        return database.get_quoter()(label)
+
+    def get_select(self):
+        """Returns the query aggregating the rows of the table into the rollup"""
+        table = self.table
+        database = table.database
+        db_engine_spec = database.db_engine_spec
+        cols = {c.column_name: c for c in table.columns}
+        metrics = {m.metric_name: m for m in table.metrics}
+        groupby_exprs = [cols[d].get_sqla_col() for d in self.dimension_names]
+        if self.time_grain:
+            dttm_col = cols[self.time_column]
+            col = db_engine_spec.get_timestamp_column(
+                dttm_col.expression, dttm_col.column_name)
+            pdf = dttm_col.python_date_format
+            grain = database.grains_dict().get(self.time_grain)
+            timestamp = db_engine_spec.get_time_expr(col, pdf, None, None)
+            bucket = db_engine_spec.get_time_expr(col, pdf, self.time_grain, grain)
+            is_bucket_start = sa.case(
+                [(literal_column(timestamp) == literal_column(bucket), 1)], else_=0)
+            groupby_exprs += [
+                dttm_col.get_timestamp_expression(self.time_grain),
+                table.make_sqla_column_compatible(
+                    is_bucket_start, self.BUCKET_START_ALIAS),
+            ]
+        metrics_exprs = [metrics[m].get_sqla_col() for m in self.metric_names]
+        qry = sa.select(groupby_exprs + metrics_exprs)
+        qry = qry.select_from(table.get_from_clause(table.get_template_processor()))
+        return qry.group_by(*groupby_exprs)
+
+    def get_physical_table_name(self, name):
+        quote = self.table.database.get_quoter()
+        if self.table.schema:
+            return '{}.{}'.format(quote(self.table.schema), quote(name))
+        return quote(name)
+
+    def covers(self, query_obj):
+        """Whether querying the rollup gives the same result as the table"""
+        if self.is_stale:
+            return False
+        extras = query_obj.get('extras') or {}
+        if (
+                query_obj.get('columns') or
+                extras.get('where') or
+                extras.get('having') or
+                extras.get('time_windows')):
+            return False
+        metrics = list(query_obj.get('metrics') or [])
+        if not metrics:
+            return False
+        if query_obj.get('timeseries_limit_metric'):
+            metrics.append(query_obj['timeseries_limit_metric'])
+        metrics += [col for col, ascending in query_obj.get('orderby') or []]
+        if not all(isinstance(m, str) and m in self.metric_names for m in metrics):
+            return False
+        dimensions = self.dimension_names
+        if not set(query_obj.get('groupby') or []) <= set(dimensions):
+            return False
+        if any(flt.get('col') not in dimensions for flt in query_obj.get('filter') or []):
+            return False
+
+        from_dttm = query_obj.get('from_dttm')
+        to_dttm = query_obj.get('to_dttm')
+        is_timeseries = query_obj.get('is_timeseries')
+        if not self.time_grain:
+            # rollups without a time grain are snapshots of the whole table
+            return not is_timeseries and not from_dttm and not to_dttm
+        granularity = query_obj.get('granularity')
+        if granularity not in self.table.dttm_cols:
+            granularity = self.table.main_dttm_col
+        if granularity != self.time_column:
+            return False
+        # ranges have to end before the buckets the rollup may lack rows of
+        watermark = self.watermark
+        if not to_dttm or not watermark or to_dttm >= watermark:
+            return False
+        if self.table.database.db_engine_spec.time_secondary_columns:
+            return False
+        time_grain = extras.get('time_grain_sqla')
+        if is_timeseries and not (
+                time_grain and is_finer_grain(self.time_grain, time_grain)):
+            return False
+        if any(dttm and not is_aligned(dttm, self.time_grain)
+               for dttm in (from_dttm, to_dttm)):
+            return False
+        return (
+            query_obj.get('inner_from_dttm') in (None, from_dttm) and
+            query_obj.get('inner_to_dttm') in (None, to_dttm))
+
+    def get_proxy_table(self):
+        """Returns a transient table standing for the rollup in queries
+
+        Its columns and metrics have the names of the table's, so that the
+        rollup returns the same labels.
+        """
+        table = self.table
+        cols = {c.column_name: c for c in table.columns}
+        proxy = SqlaTable(
+            table_name=self.physical_table,
+            schema=table.schema,
+            main_dttm_col=self.time_column)
+        # setting the relationship would add the proxy to the session
+        set_committed_value(proxy, 'database', table.database)
+        proxy.columns = [
+            TableColumn(
+                column_name=d,
+                expression=self.get_column_expression(d),
+                type=cols[d].type,
+                groupby=True,
+                filterable=True)
+            for d in self.dimension_names
+        ]
+        if self.time_grain:
+            proxy.columns.append(TableColumn(
+                column_name=self.time_column,
+                expression=self.get_column_expression(utils.DTTM_ALIAS),
+                type='TIMESTAMP',
+                is_dttm=True))
+        proxy.metrics = [
+            SqlMetric(
+                metric_name=metric,
+                expression='{}({})'.format(
+                    aggregate, self.get_column_expression(metric)))
+            for metric, aggregate in self.get_rollup_aggregates().items()
+        ]
+        return proxy
+
+    def get_sqla_query(self, query_obj):
+        proxy = self.get_proxy_table()
+        to_dttm = query_obj.get('to_dttm')
+        if self.time_grain and to_dttm:
+            # a range ending at a bucket only covers its start
+            dttm_col = proxy.get_col(self.time_column)
+            where = '({} < {} OR {} = 1)'.format(
+                dttm_col.expression,
+                dttm_col.dttm_sql_literal(
+                    to_dttm, config.get('IS_EPOCH_S_TRULY_UTC', False)),
+                self.get_column_expression(self.BUCKET_START_ALIAS))
+            query_obj = dict(
+                query_obj, extras=dict(query_obj.get('extras') or {}, where=where))
+        return proxy.get_sqla_query(**query_obj)
+
+    def is_due(self, now):
+        if not self.physical_table or not self.refreshed_on or self.is_stale:
+            return True
+        interval = self.refresh_interval or config.get('ROLLUP_REFRESH_INTERVAL')
+        return self.refreshed_on + timedelta(seconds=interval) <= now
+
+    def refresh(self):
+        """Builds the rollup anew, then drops its previous physical table"""
+        table = self.table
+        database = table.database
+        name = 'superset_rollup_{}_{}'.format(self.id, int(time.time()))
+        # rows landing in the table while it's read may be missing
+        refreshed_on = datetime.utcnow()
+        definition = self.get_definition()
+        sql = database.compile_sqla_query(self.get_select())
+        sql = ParsedQuery(sql).as_create_table(self.get_physical_table_name(name))
+        logging.info(sql)
+        engine = database.get_sqla_engine(schema=table.schema)
+        previous = self.physical_table
+        try:
+            engine.execute(sql)
+            row_count = engine.execute(
+                'SELECT COUNT(*) FROM {}'.format(self.get_physical_table_name(name)),
+            ).scalar()
+            self.physical_table = name
+            self.row_count = row_count
+            self.refreshed_on = refreshed_on
+            self.definition = definition
+            db.session.commit()
+        except Exception:
+            # don't leave behind a table nothing refers to
+            self.drop_physical_table(name)
+            raise
+        if previous:
+            self.drop_physical_table(previous)
+
+    def drop(self):
+        """Drops the physical table of the rollup, which stops routing to it"""
+        if self.physical_table:
+            self.drop_physical_table(self.physical_table)
+        self.physical_table = None
+        self.row_count = None
+        self.refreshed_on = None
+        self.definition = None
+
+    def drop_physical_table(self, name):
+        engine = self.table.database.get_sqla_engine(schema=self.table.schema)
+        try:
+            engine.execute(
+                'DROP TABLE IF EXISTS {}'.format(self.get_physical_table_name(name)))
+        except Exception as e:
+            logging.exception(e)
+
+    def get_refresh_lock(self):
+        """Keeps a rollup from being built by several workers at once"""
+        if not cache:
+            return None
+        return CacheLock(
+            cache, 'rollup/{}'.format(self.id), config.get('ROLLUP_REFRESH_TIMEOUT'))
+
+
+def invalidate_table_cache(mapper, connection, target):
+    """Invalidates the cached charts of a table when it, or one of its
+    columns or metrics, changes"""
+    table_id = target.id if isinstance(target, SqlaTable) else target.table_id
+    if table_id:
+        bump_generation(SqlaTable.type, table_id)
+
+
 sa.event.listen(SqlaTable, 'after_insert', security_manager.set_perm)
 sa.event.listen(SqlaTable, 'after_update', security_manager.set_perm)
+sa.event.listen(SqlaTable, 'after_update', invalidate_table_cache)
+for cls in (TableColumn, SqlMetric):
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        sa.event.listen(cls, event_name, invalidate_table_cache)
@@ -165,6 +165,63 @@ class SqlMetricInlineView(CompactCRUDMixin, SupersetModelView):  # noqa
 appbuilder.add_view_no_menu(SqlMetricInlineView)
 
 
+class SqlaRollupInlineView(CompactCRUDMixin, SupersetModelView):  # noqa
+    datamodel = SQLAInterface(models.SqlaRollup)
+
+    list_title = _('Rollups')
+    show_title = _('Show Rollup')
+    add_title = _('Add Rollup')
+    edit_title = _('Edit Rollup')
+
+    list_columns = ['name', 'time_grain', 'row_count', 'refreshed_on']
+    edit_columns = [
+        'name', 'table', 'dimensions', 'metrics', 'time_grain', 'refresh_interval']
+    show_columns = edit_columns + ['physical_table', 'row_count', 'refreshed_on']
+    description_columns = {
+        'dimensions': utils.markdown(
+            'a JSON list of the names of the columns to group by, for instance '
+            '`["country", "gender"]`', True),
+        'metrics': utils.markdown(
+            'a JSON list of the names of the metrics to aggregate. Only '
+            'metrics made of a single `SUM`, `COUNT`, `MIN` or `MAX` can be '
+            'rolled up', True),
+        'time_grain': _(
+            'The time grain the main datetime column is truncated to, as '
+            'in the time grains of the database. Queries at this grain or a '
+            'coarser one, on ranges aligned on it, are routed to the rollup'),
+        'refresh_interval': _(
+            'How often the rollup is built again, in seconds. Defaults to '
+            'the ROLLUP_REFRESH_INTERVAL of the configuration'),
+    }
+    add_columns = edit_columns
+    page_size = 500
+    label_columns = {
+        'name': _('Name'),
+        'table': _('Table'),
+        'dimensions': _('Dimensions'),
+        'metrics': _('Metrics'),
+        'time_grain': _('Time Grain'),
+        'refresh_interval': _('Refresh Interval'),
+        'physical_table': _('Physical Table'),
+        'row_count': _('Row Count'),
+        'refreshed_on': _('Refreshed On'),
+    }
+
+    def pre_add(self, rollup):
+        rollup.validate()
+
+    def pre_update(self, rollup):
+        rollup.validate()
+        # it's built again with its new definition by the next refreshes
+        rollup.drop()
+
+    def pre_delete(self, rollup):
+        rollup.drop()
+
+
+appbuilder.add_view_no_menu(SqlaRollupInlineView)
+
+
 class TableModelView(DatasourceModelView, DeleteMixin, YamlExportMixin):  # noqa
     datamodel = SQLAInterface(models.SqlaTable)
 
@@ -183,11 +240,12 @@ class TableModelView(DatasourceModelView, DeleteMixin, YamlExportMixin):  # noqa
         'fetch_values_predicate', 'database', 'schema',
         'description', 'owners',
         'main_dttm_col', 'default_endpoint', 'offset', 'cache_timeout',
-        'is_sqllab_view', 'template_params',
+        'is_sqllab_view', 'template_params', 'approximate',
     ]
     base_filters = [['id', DatasourceFilter, lambda: []]]
     show_columns = edit_columns + ['perm', 'slices']
-    related_views = [TableColumnInlineView, SqlMetricInlineView]
+    related_views = [
+        TableColumnInlineView, SqlMetricInlineView, SqlaRollupInlineView]
     base_order = ('changed_on', 'desc')
     search_columns = (
         'database', 'schema', 'table_name', 'owners', 'is_sqllab_view',
@@ -233,6 +291,10 @@ class TableModelView(DatasourceModelView, DeleteMixin, YamlExportMixin):  # noqa
         'template_params': _(
             'A set of parameters that become available in the query using '
             'Jinja templating syntax'),
+        'approximate': _(
+            'Whether charts use the approximate COUNT DISTINCT and percentile '
+            'aggregates of the database, when it has some, unless their '
+            "dashboard or their own 'approximate' parameter says otherwise"),
         'cache_timeout': _(
             'Duration (in seconds) of the caching timeout for this table. '
             'A timeout of 0 indicates that the cache never expires. '
@@ -257,6 +319,7 @@ class TableModelView(DatasourceModelView, DeleteMixin, YamlExportMixin):  # noqa
         'description': _('Description'),
         'is_sqllab_view': _('SQL Lab View'),
         'template_params': _('Template parameters'),
+        'approximate': _('Approximate Aggregates'),
         'modified': _('Modified'),
     }
 
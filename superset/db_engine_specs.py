@@ -31,7 +31,9 @@ The general idea is to use static classes and an inheritance scheme.
 from collections import namedtuple
 import hashlib
 import inspect
+import json
 import logging
+import math
 import os
 import re
 import textwrap
@@ -58,6 +60,18 @@ QueryStatus = utils.QueryStatus
 config = app.config
 
 tracking_url_trans = conf.get('TRACKING_URL_TRANSFORMER')
+
+# exact aggregates with approximate equivalents on some engines, over a single
+# expression with at most one level of parentheses
+COUNT_DISTINCT_EXPRESSION = re.compile(
+    r'\b(APPROXIMATE\s+)?COUNT\s*\(\s*DISTINCT\s+((?:[^(),]|\([^()]*\))+?)\s*\)',
+    re.IGNORECASE)
+PERCENTILE_EXPRESSION = re.compile(
+    r'\b(APPROXIMATE\s+)?PERCENTILE_(?:CONT|DISC)\s*\(\s*([^()]+?)\s*\)\s*'
+    r'WITHIN\s+GROUP\s*\(\s*ORDER\s+BY\s+((?:[^()]|\([^()]*\))+?)\s*\)'
+    r'(?!\s*OVER\b)',
+    re.IGNORECASE)
+ORDER_DIRECTION = re.compile(r'\b(ASC|DESC|NULLS)\b', re.IGNORECASE)
 hive_poll_interval = conf.get('HIVE_POLL_INTERVAL')
 
 Grain = namedtuple('Grain', 'name label function duration')
@@ -111,10 +125,20 @@ class BaseEngineSpec(object):
     time_secondary_columns = False
     inner_joins = True
     allows_subquery = True
+    # whether GROUP BY GROUPING SETS and the GROUPING function are supported
+    allows_grouping_sets = False
+    # whether connections can be pooled and handed over to other threads
+    allows_connection_pooling = True
     supports_column_aliases = True
     force_column_alias_quotes = False
     arraysize = None
     max_column_name_length = None
+    # SQL templates of the approximate equivalents of exact aggregates, used
+    # when charts accept approximate results: the `COUNT_DISTINCT` template
+    # formats a `{col}`, the `PERCENTILE` one a `{col}` and a `{fraction}`
+    approximate_aggregates = {}
+    # whether `estimate_statement_cost` can tell what a query reads
+    supports_cost_estimate = False
 
     @classmethod
     def get_time_expr(cls, expr, pdf, time_grain, grain):
@@ -309,6 +333,45 @@ class BaseEngineSpec(object):
         query object"""
         pass
 
+    @classmethod
+    def estimate_statement_cost(cls, statement, cursor):
+        """Estimates what a SELECT statement reads, without running it
+
+        :param statement: the SQL of the statement
+        :param cursor: a cursor of a connection to the database
+        :return: a dict of the estimated `rows` and `bytes`, either of them
+            None when the engine doesn't tell
+        """
+        raise NotImplementedError()
+
+    @classmethod
+    def estimate_query_cost(cls, cursor, sql):
+        """Sums the estimates of the SELECT statements of a query
+
+        Returns None when the engine can't estimate the query.
+        """
+        if not cls.supports_cost_estimate:
+            return None
+        estimates = [
+            cls.estimate_statement_cost(statement, cursor)
+            for statement in sql_parse.ParsedQuery(sql).get_statements()
+            if sql_parse.ParsedQuery(statement).is_select()
+        ]
+        if not estimates:
+            return None
+        return {
+            measure: None if any(e.get(measure) is None for e in estimates)
+            else sum(e[measure] for e in estimates)
+            for measure in ('rows', 'bytes')
+        }
+
+    @classmethod
+    def cancel_query(cls, cursor, conn):
+        """Cancels the query running on a cursor, from another thread
+
+        Returns whether the query could be cancelled."""
+        return False
+
     @classmethod
     def extract_error_message(cls, e):
         """Extract error message for queries"""
@@ -420,6 +483,46 @@ class BaseEngineSpec(object):
             cursor.arraysize = cls.arraysize
         cursor.execute(query)
 
+    @classmethod
+    def approximate_aggregate(cls, aggregate, col):
+        """Returns the approximate equivalent of an aggregate of `col`
+
+        :param aggregate: the name of the aggregate, e.g. `COUNT_DISTINCT`
+        :param col: the SQL expression aggregated
+        :return: the SQL expression of the approximation, or None if the
+            engine has none
+        """
+        template = cls.approximate_aggregates.get(aggregate)
+        return template.format(col=col) if template else None
+
+    @classmethod
+    def approximate_expression(cls, expression):
+        """Replaces the exact aggregates of an SQL metric by approximations
+
+        `COUNT(DISTINCT ...)` and `PERCENTILE_CONT|DISC(...) WITHIN GROUP
+        (ORDER BY ...)` are replaced, unless they're already approximate or
+        ordered explicitly. Returns None if nothing was replaced.
+        """
+        def count_distinct(match):
+            approximation = None
+            if not match.group(1):
+                approximation = cls.approximate_aggregate(
+                    'COUNT_DISTINCT', match.group(2))
+            return approximation or match.group(0)
+
+        def percentile(match):
+            template = cls.approximate_aggregates.get('PERCENTILE')
+            col = match.group(3)
+            if not template or match.group(1) or ORDER_DIRECTION.search(col):
+                return match.group(0)
+            return template.format(col=col, fraction=match.group(2))
+
+        if not expression:
+            return None
+        approximation = COUNT_DISTINCT_EXPRESSION.sub(count_distinct, expression)
+        approximation = PERCENTILE_EXPRESSION.sub(percentile, approximation)
+        return approximation if approximation != expression else None
+
     @classmethod
     def make_label_compatible(cls, label):
         """
@@ -517,6 +620,31 @@ class PostgresBaseEngineSpec(BaseEngineSpec):
 class PostgresEngineSpec(PostgresBaseEngineSpec):
     engine = 'postgresql'
     max_column_name_length = 63
+    allows_grouping_sets = True
+    supports_cost_estimate = True
+
+    @classmethod
+    def estimate_statement_cost(cls, statement, cursor):
+        """Sums the rows the planner expects the scans of a query to return"""
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + statement)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        rows = 0
+        width = 0
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            nodes += node.get('Plans') or []
+            if 'Relation Name' in node:
+                rows += node['Plan Rows']
+                width += node['Plan Rows'] * node['Plan Width']
+        return {'rows': rows, 'bytes': width}
+
+    @classmethod
+    def cancel_query(cls, cursor, conn):
+        conn.cancel()
+        return True
 
     @classmethod
     def get_table_names(cls, inspector, schema):
@@ -540,6 +668,11 @@ class SnowflakeEngineSpec(PostgresBaseEngineSpec):
     engine = 'snowflake'
     force_column_alias_quotes = True
     max_column_name_length = 256
+    allows_grouping_sets = True
+    approximate_aggregates = {
+        'COUNT_DISTINCT': 'APPROX_COUNT_DISTINCT({col})',
+        'PERCENTILE': 'APPROX_PERCENTILE({col}, {fraction})',
+    }
 
     time_grain_functions = {
         None: '{col}',
@@ -573,11 +706,24 @@ class SnowflakeEngineSpec(PostgresBaseEngineSpec):
 
 class VerticaEngineSpec(PostgresBaseEngineSpec):
     engine = 'vertica'
+    approximate_aggregates = {
+        'COUNT_DISTINCT': 'APPROXIMATE_COUNT_DISTINCT({col})',
+    }
 
 
 class RedshiftEngineSpec(PostgresBaseEngineSpec):
     engine = 'redshift'
     max_column_name_length = 127
+    approximate_aggregates = {
+        'COUNT_DISTINCT': 'APPROXIMATE COUNT(DISTINCT {col})',
+        'PERCENTILE':
+            'APPROXIMATE PERCENTILE_DISC({fraction}) WITHIN GROUP (ORDER BY {col})',
+    }
+
+    @classmethod
+    def cancel_query(cls, cursor, conn):
+        conn.cancel()
+        return True
 
     @staticmethod
     def mutate_label(label):
@@ -594,6 +740,11 @@ class OracleEngineSpec(PostgresBaseEngineSpec):
     limit_method = LimitMethod.WRAP_SQL
     force_column_alias_quotes = True
     max_column_name_length = 30
+    approximate_aggregates = {
+        'COUNT_DISTINCT': 'APPROX_COUNT_DISTINCT({col})',
+        'PERCENTILE': 'APPROX_PERCENTILE({fraction}) WITHIN GROUP (ORDER BY {col})',
+    }
+    allows_grouping_sets = True
 
     time_grain_functions = {
         None: '{col}',
@@ -656,6 +807,7 @@ class Db2EngineSpec(BaseEngineSpec):
 
 class SqliteEngineSpec(BaseEngineSpec):
     engine = 'sqlite'
+    allows_connection_pooling = False
 
     time_grain_functions = {
         None: '{col}',
@@ -696,6 +848,11 @@ class SqliteEngineSpec(BaseEngineSpec):
             '{}.{}'.format(schema, t) for t in all_datasource_names]
         return all_result_sets
 
+    @classmethod
+    def cancel_query(cls, cursor, conn):
+        conn.interrupt()
+        return True
+
     @classmethod
     def convert_dttm(cls, target_type, dttm):
         iso = dttm.isoformat().replace('T', ' ')
@@ -785,6 +942,11 @@ class MySQLEngineSpec(BaseEngineSpec):
 
 class PrestoEngineSpec(BaseEngineSpec):
     engine = 'presto'
+    allows_grouping_sets = True
+    approximate_aggregates = {
+        'COUNT_DISTINCT': 'APPROX_DISTINCT({col})',
+    }
+    supports_cost_estimate = True
 
     time_grain_functions = {
         None: '{col}',
@@ -814,6 +976,24 @@ class PrestoEngineSpec(BaseEngineSpec):
         """
         return []
 
+    @classmethod
+    def estimate_statement_cost(cls, statement, cursor):
+        """Sums the estimates of the table scans of an IO plan"""
+        cursor.execute('EXPLAIN (TYPE IO, FORMAT JSON) ' + statement)
+        plan = json.loads(cursor.fetchone()[0])
+        estimate = {'rows': 0, 'bytes': 0}
+        for table in plan.get('inputTableColumnInfos') or []:
+            table_estimate = table.get('estimate') or {}
+            for measure, key in (
+                    ('rows', 'outputRowCount'), ('bytes', 'outputSizeInBytes')):
+                value = table_estimate.get(key)
+                # unknown statistics come as NaN
+                if not isinstance(value, (int, float)) or math.isnan(value):
+                    estimate[measure] = None
+                elif estimate[measure] is not None:
+                    estimate[measure] += value
+        return estimate
+
     @classmethod
     def adjust_database_uri(cls, uri, selected_schema=None):
         database = uri.database
@@ -825,6 +1005,11 @@ class PrestoEngineSpec(BaseEngineSpec):
             uri.database = database
         return uri
 
+    @classmethod
+    def cancel_query(cls, cursor, conn):
+        cursor.cancel()
+        return True
+
     @classmethod
     def convert_dttm(cls, target_type, dttm):
         tt = target_type.upper()
@@ -1088,6 +1273,10 @@ class HiveEngineSpec(PrestoEngineSpec):
 
     engine = 'hive'
     max_column_name_length = 767
+    # the GROUPING function only comes with Hive 2.3
+    allows_grouping_sets = False
+    approximate_aggregates = {}
+    supports_cost_estimate = False
 
     # Scoping regex at class level to avoid recompiling
     # 17/02/07 19:36:38 INFO ql.Driver: Total jobs = 5
@@ -1397,6 +1586,7 @@ class MssqlEngineSpec(BaseEngineSpec):
     epoch_to_dttm = "dateadd(S, {col}, '1970-01-01')"
     limit_method = LimitMethod.WRAP_SQL
     max_column_name_length = 128
+    allows_grouping_sets = True
 
     time_grain_functions = {
         None: '{col}',
@@ -1440,6 +1630,9 @@ class MssqlEngineSpec(BaseEngineSpec):
 
 class AthenaEngineSpec(BaseEngineSpec):
     engine = 'awsathena'
+    approximate_aggregates = {
+        'COUNT_DISTINCT': 'APPROX_DISTINCT({col})',
+    }
 
     time_grain_functions = {
         None: '{col}',
@@ -1581,6 +1774,9 @@ class BQEngineSpec(BaseEngineSpec):
     https://github.com/mxmzdlv/pybigquery/blob/d214bb089ca0807ca9aaa6ce4d5a01172d40264e/pybigquery/sqlalchemy_bigquery.py#L102
     """
     arraysize = 5000
+    approximate_aggregates = {
+        'COUNT_DISTINCT': 'APPROX_COUNT_DISTINCT({col})',
+    }
 
     time_grain_functions = {
         None: '{col}',
@@ -1679,6 +1875,9 @@ class ImpalaEngineSpec(BaseEngineSpec):
     """Engine spec for Cloudera's Impala"""
 
     engine = 'impala'
+    approximate_aggregates = {
+        'COUNT_DISTINCT': 'NDV({col})',
+    }
 
     time_grain_functions = {
         None: '{col}',
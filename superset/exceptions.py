@@ -54,3 +54,19 @@ class SupersetTemplateException(SupersetException):
 
 class SpatialException(SupersetException):
     pass
+
+
+class QueryQueueTimeoutException(SupersetTimeoutException):
+    pass
+
+
+class QueryCancelledException(SupersetTimeoutException):
+    pass
+
+
+class QueryCostException(SupersetException):
+    status = 400
+
+    def __init__(self, msg, estimate):
+        super(QueryCostException, self).__init__(msg)
+        self.estimate = estimate
@@ -0,0 +1,59 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""add sqla rollups table
+
+Revision ID: b5a6e3c8d1f2
+Revises: e9df189e5c7e
+Create Date: 2026-10-18 07:16:53.512306
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b5a6e3c8d1f2'
+down_revision = 'e9df189e5c7e'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('sqla_rollups',
+    sa.Column('created_on', sa.DateTime(), nullable=True),
+    sa.Column('changed_on', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=250), nullable=False),
+    sa.Column('table_id', sa.Integer(), nullable=False),
+    sa.Column('dimensions', sa.Text(), nullable=True),
+    sa.Column('metrics', sa.Text(), nullable=True),
+    sa.Column('time_grain', sa.String(length=255), nullable=True),
+    sa.Column('refresh_interval', sa.Integer(), nullable=True),
+    sa.Column('physical_table', sa.String(length=250), nullable=True),
+    sa.Column('row_count', sa.Integer(), nullable=True),
+    sa.Column('refreshed_on', sa.DateTime(), nullable=True),
+    sa.Column('definition', sa.Text(), nullable=True),
+    sa.Column('created_by_fk', sa.Integer(), nullable=True),
+    sa.Column('changed_by_fk', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['changed_by_fk'], ['ab_user.id'], ),
+    sa.ForeignKeyConstraint(['created_by_fk'], ['ab_user.id'], ),
+    sa.ForeignKeyConstraint(['table_id'], ['tables.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('table_id', 'name')
+    )
+
+
+def downgrade():
+    op.drop_table('sqla_rollups')
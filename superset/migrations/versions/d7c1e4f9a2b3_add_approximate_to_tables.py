@@ -0,0 +1,39 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""add approximate to tables
+
+Revision ID: d7c1e4f9a2b3
+Revises: b5a6e3c8d1f2
+Create Date: 2026-10-18 07:20:43.238719
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd7c1e4f9a2b3'
+down_revision = 'b5a6e3c8d1f2'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('tables', sa.Column('approximate', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('tables') as batch_op:
+        batch_op.drop_column('approximate')
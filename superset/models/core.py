@@ -22,14 +22,14 @@ from datetime import datetime
 import functools
 import json
 import logging
+import re
 import textwrap
 
-from flask import escape, g, Markup, request
+from flask import escape, g, has_request_context, Markup, request
 from flask_appbuilder import Model
 from flask_appbuilder.models.decorators import renders
 from flask_appbuilder.security.sqla.models import User
 import numpy
-import pandas as pd
 import sqlalchemy as sqla
 from sqlalchemy import (
     Boolean, Column, create_engine, DateTime, ForeignKey, Integer,
@@ -44,16 +44,21 @@ from sqlalchemy.schema import UniqueConstraint
 from sqlalchemy_utils import EncryptedType
 import sqlparse
 
-from superset import app, db, db_engine_specs, security_manager
+from superset import app, cache, db, db_engine_specs, security_manager
 from superset.connectors.connector_registry import ConnectorRegistry
 from superset.legacy import update_time_range
 from superset.models.helpers import AuditMixinNullable, ImportMixin
 from superset.models.tags import ChartUpdater, DashboardUpdater, FavStarUpdater
 from superset.models.user_attributes import UserAttribute
 from superset.utils import (
+    admission,
     cache as cache_util,
     core as utils,
+    query_cancellation,
 )
+from superset.utils.connection_pools import get_pool_params, meter_pool
+from superset.utils.engine_registry import EngineRegistry
+from superset.utils.fetch import fetch_df
 from superset.viz import viz_types
 from urllib import parse  # noqa
 
@@ -61,9 +66,14 @@ config = app.config
 custom_password_store = config.get('SQLALCHEMY_CUSTOM_PASSWORD_STORE')
 stats_logger = config.get('STATS_LOGGER')
 log_query = config.get('QUERY_LOGGER')
+engine_registry = EngineRegistry(
+    config.get('DB_ENGINE_REGISTRY_SIZE'),
+    config.get('DB_ENGINE_REGISTRY_TTL'),
+    stats_logger)
 metadata = Model.metadata  # pylint: disable=no-member
 
 PASSWORD_MASK = 'X' * 10
+DASHBOARD_PATH = re.compile(r'/superset/dashboard(?:_data)?/([^/?#]+)')
 
 def set_related_perm(mapper, connection, target):  # noqa
     src_class = target.cls_model
@@ -455,18 +465,28 @@ class Dashboard(Model, AuditMixinNullable, ImportMixin):
         title = escape(self.dashboard_title or '<empty>')
         return Markup(f'<a href="{self.url}">{title}</a>')
 
+    def apply_form_data_defaults(self, form_data):
+        """Sets the form data fields charts inherit from their dashboard"""
+        if self.params_dict.get('approximate') is not None:
+            # charts that don't say otherwise follow their dashboard
+            form_data.setdefault('approximate', self.params_dict['approximate'])
+        return form_data
+
     @property
     def data(self):
         positions = self.position_json
         if positions:
             positions = json.loads(positions)
+        slices = [slc.data for slc in self.slices]
+        for slc in slices:
+            self.apply_form_data_defaults(slc['form_data'])
         return {
             'id': self.id,
             'metadata': self.params_dict,
             'css': self.css,
             'dashboard_title': self.dashboard_title,
             'slug': self.slug,
-            'slices': [slc.data for slc in self.slices],
+            'slices': slices,
             'position_json': positions,
         }
 
@@ -792,13 +812,110 @@ class Database(Model, AuditMixinNullable, ImportMixin):
                 effective_username = g.user.username
         return effective_username
 
-    @utils.memoized(
-        watch=('impersonate_user', 'sqlalchemy_uri_decrypted', 'extra'))
-    def get_sqla_engine(self, schema=None, nullpool=True, user_name=None, source=None):
+    @property
+    def connection_pool_settings(self):
+        """Settings of the pool of connections shared by this database's queries
+
+        `None` when each query opens its own connection, like the ones
+        impersonating users, which can't be handed over to other users.
+        """
+        if self.impersonate_user or not self.db_engine_spec.allows_connection_pooling:
+            return None
+        settings = config.get('DEFAULT_DB_CONNECTION_POOL')
         extra = self.get_extra()
+        if 'connection_pool' in extra:
+            if not isinstance(extra['connection_pool'], dict):
+                return None
+            settings = dict(settings or {}, **extra['connection_pool'])
+        return settings
+
+    @property
+    def admission_control_settings(self):
+        """Settings limiting the queries running at once against this database"""
+        settings = config.get('DEFAULT_DB_ADMISSION_CONTROL')
+        extra = self.get_extra()
+        if 'admission_control' in extra:
+            if not extra['admission_control']:
+                return None
+            settings = dict(settings or {}, **extra['admission_control'])
+        if not settings or not settings.get('max_queries'):
+            return None
+        return settings
+
+    @property
+    def cost_guardrails(self):
+        """Thresholds of the estimated cost of queries, by action"""
+        guardrails = config.get('DEFAULT_DB_COST_GUARDRAILS')
+        extra = self.get_extra()
+        if 'cost_guardrails' in extra:
+            guardrails = extra['cost_guardrails']
+        return guardrails or None
+
+    def estimate_cost(self, sql, schema=None, user_name=None):
+        """Estimates the rows and bytes a query reads, without running it
+
+        See `superset.utils.cost_estimates`, which caches the estimates.
+        """
+        engine = self.get_sqla_engine(schema=schema, user_name=user_name)
+        with closing(engine.raw_connection()) as conn:
+            with closing(conn.cursor()) as cursor:
+                return self.db_engine_spec.estimate_query_cost(cursor, sql)
+
+    @property
+    def query_timeout(self):
+        """Seconds after which chart queries are cancelled"""
+        timeout = self.get_extra().get('query_timeout')
+        if not isinstance(timeout, (int, float)):
+            timeout = config.get('CHART_QUERY_TIMEOUT')
+        return timeout
+
+    def get_admission_key(self, fair_by):
+        """The queue of the current query, per dashboard or user"""
+        if fair_by == 'dashboard' and has_request_context():
+            for path in (request.path, request.referrer or ''):
+                match = DASHBOARD_PATH.search(path)
+                if match:
+                    return 'dashboard/' + match.group(1)
+        return 'user/{}'.format(utils.get_username())
+
+    def admit_query(self):
+        """Waits for the turn of a query, yields how many seconds that took"""
+        settings = self.admission_control_settings
+        if not settings:
+            return admission.unlimited()
+        name = 'admission/{}'.format(self.id)
+        stats_key = 'admission.{}'.format(self.id)
+
+        def make_queue():
+            if settings.get('distributed') and cache:
+                slots = admission.CacheSlots(
+                    cache,
+                    name,
+                    settings['max_queries'],
+                    config.get('SUPERSET_WEBSERVER_TIMEOUT'))
+            else:
+                slots = admission.LocalSlots(settings['max_queries'])
+            return admission.AdmissionQueue(
+                slots, settings.get('max_wait'), stats_logger, stats_key)
+
+        queue = admission.get_queue(name, settings, make_queue)
+        return queue.admit(self.get_admission_key(settings.get('fair_by')))
+
+    def get_sqla_engine(self, schema=None, nullpool=False, user_name=None, source=None):
         url = make_url(self.sqlalchemy_uri_decrypted)
-        url = self.db_engine_spec.adjust_database_uri(url, schema)
         effective_username = self.get_effective_user(url, user_name)
+        return engine_registry.get(
+            self.id if self.id is not None else id(self),
+            (self.sqlalchemy_uri_decrypted, self.impersonate_user, self.extra),
+            (schema, nullpool, effective_username, source),
+            functools.partial(
+                self.create_sqla_engine, schema, nullpool, effective_username, source),
+        )
+
+    def create_sqla_engine(self, schema, nullpool, effective_username, source):
+        extra = self.get_extra()
+        url = make_url(self.sqlalchemy_uri_decrypted)
+        url = self.db_engine_spec.adjust_database_uri(url, schema)
         # If using MySQL or Presto for example, will set url.username
         # If using Hive, will not do anything yet since that relies on a
         # configuration parameter instead.
@@ -811,8 +928,11 @@ class Database(Model, AuditMixinNullable, ImportMixin):
         logging.info('Database.get_sqla_engine(). Masked URL: {0}'.format(masked_url))
 
         params = extra.get('engine_params', {})
-        if nullpool:
+        pool_settings = self.connection_pool_settings
+        if nullpool or (pool_settings is None and 'poolclass' not in params):
             params['poolclass'] = NullPool
+        elif pool_settings is not None and 'poolclass' not in params:
+            params.update(get_pool_params(pool_settings))
 
         # If using Hive, this will set hive.server2.proxy.user=$effective_username
         configuration = {}
@@ -830,7 +950,9 @@ class Database(Model, AuditMixinNullable, ImportMixin):
         if DB_CONNECTION_MUTATOR:
             url, params = DB_CONNECTION_MUTATOR(
                 url, params, effective_username, security_manager, source)
-        return create_engine(url, **params)
+        engine = create_engine(url, **params)
+        meter_pool(engine.pool, stats_logger, 'db_pool.{}'.format(self.id))
+        return engine
 
     def get_reserved_words(self):
         return self.get_dialect().preparer.reserved_words
@@ -862,7 +984,10 @@ class Database(Model, AuditMixinNullable, ImportMixin):
                 log_query(engine.url, sql, schema, username, __name__, security_manager)
 
         with closing(engine.raw_connection()) as conn:
-            with closing(conn.cursor()) as cursor:
+            with closing(conn.cursor()) as cursor, query_cancellation.track(
+                    functools.partial(self.db_engine_spec.cancel_query, cursor, conn),
+                    self.query_timeout,
+                    stats_logger):
                 for sql in sqls[:-1]:
                     _log_query(sql)
                     self.db_engine_spec.execute(cursor, sql)
@@ -870,17 +995,8 @@ class Database(Model, AuditMixinNullable, ImportMixin):
 
                 _log_query(sqls[-1])
                 self.db_engine_spec.execute(cursor, sqls[-1])
-
-                if cursor.description is not None:
-                    columns = [col_desc[0] for col_desc in cursor.description]
-                else:
-                    columns = []
-
-                df = pd.DataFrame.from_records(
-                    data=list(cursor.fetchall()),
-                    columns=columns,
-                    coerce_float=True,
-                )
+                df = fetch_df(
+                    cursor, engine.dialect.dbapi, self.db_engine_spec.arraysize)
 
                 if mutator:
                     df = mutator(df)
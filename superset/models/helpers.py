@@ -307,12 +307,18 @@ class QueryResult(object):
             query,
             duration,
             status=QueryStatus.SUCCESS,
-            error_message=None):
+            error_message=None,
+            queue_wait=0,
+            cost_estimate=None):
         self.df = df
         self.query = query
         self.duration = duration
         self.status = status
         self.error_message = error_message
+        # seconds spent waiting for the database to admit the query
+        self.queue_wait = queue_wait
+        # what the query was estimated to read, see `utils.cost_estimates`
+        self.cost_estimate = cost_estimate
 
 
 class ExtraJSONMixin:
@@ -30,9 +30,11 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 
 from superset import app, dataframe, db, results_backend, security_manager
+from superset.exceptions import QueryCostException
 from superset.models.sql_lab import Query
 from superset.sql_parse import ParsedQuery
 from superset.tasks.celery_app import app as celery_app
+from superset.utils import cost_estimates
 from superset.utils.core import (
     json_iso_dttm_ser,
     QueryStatus,
@@ -233,6 +235,20 @@ def execute_sql_statements(
     statements = parsed_query.get_statements()
     logging.info(f'Executing {len(statements)} statement(s)')
 
+    try:
+        cost_estimate = cost_estimates.enforce(
+            database,
+            rendered_query,
+            query.schema,
+            confirmed=query.extra.get('cost_confirmed'),
+            user_name=user_name)
+    except QueryCostException as e:
+        query.set_extra_json_key('cost_estimate', e.estimate)
+        payload['cost_estimate'] = e.estimate
+        return handle_query_error(str(e), query, session, payload)
+    if cost_estimate:
+        query.set_extra_json_key('cost_estimate', cost_estimate)
+
     logging.info("Set query to 'running'")
     query.status = QueryStatus.RUNNING
     query.start_running_time = now_as_float()
@@ -17,3 +17,5 @@
 # under the License.
 from . import schedules # noqa
 from . import cache # noqa
+from . import async_queries # noqa
+from . import rollups # noqa
@@ -0,0 +1,150 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Computing chart payloads on Celery workers
+
+`explore_json` and the `/api/v1/query/` endpoint hand the charts they're
+asked to compute asynchronously over to a worker, and answer with the id of
+a job the client polls for. Workers compute the payloads the way the web
+requests would, which caches their results under the usual cache keys: a
+job that succeeded is then served from the cache. Failed payloads aren't
+cached, so they're kept in the job record instead.
+
+Job records live in the cache too, for `ASYNC_QUERY_JOB_TIMEOUT` seconds.
+"""
+import logging
+import time
+import uuid
+
+from celery.utils.log import get_task_logger
+from flask import g
+import simplejson as json
+
+from superset import app, cache, security_manager
+from superset.common.query_context import QueryContext
+from superset.tasks.celery_app import app as celery_app
+from superset.utils.core import json_int_dttm_ser, QueryStatus
+from superset.utils.query_cancellation import get_request_queries
+from superset.utils.tiered_cache import has_key
+from superset.views.utils import get_viz
+
+logger = get_task_logger(__name__)
+logger.setLevel(logging.INFO)
+
+config = app.config
+JOB_KEY = 'async_job/{}'
+CHART = 'chart'
+QUERY_CONTEXT = 'query_context'
+
+
+def is_enabled():
+    return bool(config.get('ASYNC_CHART_QUERIES')) and bool(cache)
+
+
+def get_job(job_id):
+    return cache.get(JOB_KEY.format(job_id))
+
+
+def update_job(job_id, job, **kwargs):
+    job = dict(job, **kwargs)
+    cache.set(
+        JOB_KEY.format(job_id), job, timeout=config.get('ASYNC_QUERY_JOB_TIMEOUT'))
+    return job
+
+
+def submit_job(kind, params):
+    """Records a job computing a chart payload and queues it
+
+    `params` are the keyword arguments of `get_viz` for charts, and those of
+    `QueryContext` for query contexts. Returns the id of the job.
+    """
+    job_id = str(uuid.uuid4())
+    update_job(job_id, {
+        'kind': kind,
+        'params': params,
+        'status': QueryStatus.PENDING,
+        'username': getattr(g.user, 'username', None),
+        'payload_json': None,
+    })
+    compute_payload.delay(job_id)
+    return job_id
+
+
+def wait_for_job(job_id, timeout):
+    """Polls a job until it's done or `timeout` seconds have passed"""
+    deadline = time.time() + timeout
+    job = get_job(job_id)
+    while (
+            job and
+            job['status'] in (QueryStatus.PENDING, QueryStatus.RUNNING) and
+            time.time() < deadline):
+        time.sleep(config.get('ASYNC_QUERY_POLL_INTERVAL'))
+        job = get_job(job_id)
+    return job
+
+
+def is_cached(viz_obj):
+    """Whether the main query of a chart is cached, so it's quick to serve"""
+    query_obj = viz_obj.query_obj()
+    return bool(query_obj) and has_key(cache, viz_obj.cache_key(query_obj))
+
+
+def get_datasource(kind, params):
+    if kind == CHART:
+        return get_viz(**params).datasource
+    return QueryContext(**params).datasource
+
+
+def build_payload(kind, params, force):
+    """Computes the payload of a job, returns its json and whether it failed"""
+    if kind == CHART:
+        viz_obj = get_viz(**dict(params, force=force))
+        return viz_obj.payload_json_and_has_error(viz_obj.get_payload())
+    query_context = QueryContext(**dict(params, force=force))
+    payload = query_context.get_payload()
+    has_error = any(p.get('status') == QueryStatus.FAILED for p in payload)
+    return (
+        json.dumps(payload, default=json_int_dttm_ser, ignore_nan=True),
+        has_error,
+    )
+
+
+@celery_app.task(name='async_queries.compute_payload',
+                 bind=True,
+                 soft_time_limit=config.get('ASYNC_QUERY_TIMEOUT'))
+def compute_payload(ctask, job_id):
+    job = get_job(job_id)
+    if not job:
+        logger.warning('Job {} expired before it ran'.format(job_id))
+        return
+    job = update_job(job_id, job, status=QueryStatus.RUNNING)
+    with app.test_request_context():
+        g.user = security_manager.find_user(username=job['username'])
+        # nobody waits on the request, so queries get the job's deadline
+        get_request_queries().timeout = config.get('ASYNC_QUERY_TIMEOUT')
+        try:
+            payload_json, has_error = build_payload(
+                job['kind'], job['params'], job['params'].get('force', False))
+        except Exception as e:
+            logger.exception(e)
+            payload_json = json.dumps({'error': '{}'.format(e)})
+            has_error = True
+    if has_error:
+        update_job(
+            job_id, job, status=QueryStatus.FAILED, payload_json=payload_json)
+    else:
+        update_job(job_id, job, status=QueryStatus.SUCCESS)
@@ -0,0 +1,62 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Refreshing the rollups of tables on Celery workers"""
+from datetime import datetime
+import logging
+
+from celery.utils.log import get_task_logger
+
+from superset import app, db
+from superset.connectors.sqla.models import SqlaRollup
+from superset.tasks.celery_app import app as celery_app
+
+logger = get_task_logger(__name__)
+logger.setLevel(logging.INFO)
+
+config = app.config
+
+
+@celery_app.task(name='rollups.refresh',
+                 soft_time_limit=config.get('ROLLUP_REFRESH_TIMEOUT'))
+def refresh(rollup_id):
+    rollup = db.session.query(SqlaRollup).get(rollup_id)
+    if not rollup:
+        logger.warning('Rollup {} was deleted before it was built'.format(rollup_id))
+        return
+    lock = rollup.get_refresh_lock()
+    if lock and not lock.acquire():
+        logger.info('Rollup {} is already being built'.format(rollup))
+        return
+    try:
+        logger.info('Building the {} rollup of {}'.format(rollup, rollup.table))
+        rollup.refresh()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(e)
+    finally:
+        if lock:
+            lock.release()
+
+
+@celery_app.task(name='rollups.schedule_refreshes')
+def schedule_refreshes():
+    """Queues the refresh of the rollups that are due"""
+    now = datetime.utcnow()
+    for rollup in db.session.query(SqlaRollup).all():
+        if rollup.is_due(now):
+            refresh.delay(rollup.id)
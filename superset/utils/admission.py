@@ -0,0 +1,170 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Admission control of the queries sent to a database
+
+A database runs up to `max_queries` queries at once. The other queries wait
+in a queue per fairness key, like their user or dashboard, and the queues
+take turns as slots free up, so that a burst of queries from one dashboard
+doesn't starve the others. Queries giving up after `max_wait` seconds fail
+with a `QueryQueueTimeoutException`.
+
+Slots are counted per process, or across processes when `distributed`: the
+slots are then cache keys taken for a lease with `cache.add`, which queued
+queries poll for.
+"""
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+import threading
+import time
+
+from superset.exceptions import QueryQueueTimeoutException
+from superset.utils.single_flight import CacheLock
+
+POLL_INTERVAL = 0.1
+
+
+class LocalSlots(object):
+
+    poll_interval = None
+
+    def __init__(self, max_queries):
+        self.max_queries = max_queries
+        self.running = 0
+
+    def try_acquire(self):
+        if self.running >= self.max_queries:
+            return None
+        self.running += 1
+        return True
+
+    def release(self, slot):
+        self.running -= 1
+
+
+class CacheSlots(object):
+
+    poll_interval = POLL_INTERVAL
+
+    def __init__(self, cache, name, max_queries, lease):
+        self.cache = cache
+        self.name = name
+        self.max_queries = max_queries
+        self.lease = lease
+
+    def try_acquire(self):
+        for i in range(self.max_queries):
+            lock = CacheLock(self.cache, '{}/{}'.format(self.name, i), self.lease)
+            if lock.acquire():
+                return lock
+        return None
+
+    def release(self, slot):
+        slot.release()
+
+
+class AdmissionQueue(object):
+    """Fair queues in front of a number of slots"""
+
+    def __init__(self, slots, max_wait, stats_logger=None, stats_key='admission'):
+        self.slots = slots
+        self.max_wait = max_wait
+        self.stats_logger = stats_logger
+        self.stats_key = stats_key
+        # fairness key -> tickets of the queries waiting, in turn order
+        self.queues = OrderedDict()
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def admit(self, key):
+        """Waits for a slot, yields how many seconds that took"""
+        start = time.time()
+        slot = self.acquire(key, start + self.max_wait if self.max_wait else None)
+        wait = time.time() - start
+        if self.stats_logger:
+            self.stats_logger.timing(self.stats_key + '.wait', wait * 1000)
+        try:
+            yield wait
+        finally:
+            with self.condition:
+                self.slots.release(slot)
+                self.condition.notify_all()
+
+    def acquire(self, key, deadline):
+        ticket = object()
+        with self.condition:
+            self.queues.setdefault(key, deque()).append(ticket)
+            try:
+                while True:
+                    if self.is_next(key, ticket):
+                        slot = self.slots.try_acquire()
+                        if slot is not None:
+                            self.take_turn(key)
+                            return slot
+                    timeout = self.slots.poll_interval
+                    if deadline is not None:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            raise QueryQueueTimeoutException(
+                                'The database is busy, the query waited more than '
+                                '{} seconds for its turn'.format(self.max_wait))
+                        timeout = min(timeout or remaining, remaining)
+                    self.condition.wait(timeout)
+            except BaseException:
+                self.leave(key, ticket)
+                if self.stats_logger:
+                    self.stats_logger.incr(self.stats_key + '.rejected')
+                raise
+
+    def is_next(self, key, ticket):
+        next_key = next(iter(self.queues))
+        return next_key == key and self.queues[key][0] is ticket
+
+    def take_turn(self, key):
+        """Pops the head of a queue, which goes to the back of the line"""
+        queue = self.queues.pop(key)
+        queue.popleft()
+        if queue:
+            self.queues[key] = queue
+        self.condition.notify_all()
+
+    def leave(self, key, ticket):
+        queue = self.queues.get(key)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self.queues[key]
+            self.condition.notify_all()
+
+
+@contextmanager
+def unlimited():
+    yield 0
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(name, settings, make_queue):
+    """Returns the queue of `name`, made anew when its settings change"""
+    with _queues_lock:
+        queue, queue_settings = _queues.get(name, (None, None))
+        if queue is None or queue_settings != settings:
+            queue = make_queue()
+            _queues[name] = (queue, settings)
+        return queue
@@ -0,0 +1,219 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Serialization of the dataframe payloads stored in the chart cache
+
+A cached payload is a dict holding a pandas DataFrame under ``df`` and a few
+small metadata fields (``query``, ``dttm``, ...). Codecs turn that dict into
+the bytes handed to the cache backend and back.
+
+Codec blobs are framed as::
+
+    MAGIC | uint32 header length | JSON header | body
+
+so that the metadata can be read with `decode_metadata` without touching the
+(potentially large) body. Blobs without the magic prefix are plain pickles
+written by older versions and are still readable.
+"""
+import logging
+import pickle as pkl
+import struct
+
+import simplejson as json
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+MAGIC = b'SSC\x01'
+HEADER_LENGTH = struct.Struct('>I')
+PREFIX_SIZE = len(MAGIC) + HEADER_LENGTH.size
+
+
+def _frame(header, body):
+    header_bytes = json.dumps(header).encode('utf-8')
+    return b''.join([MAGIC, HEADER_LENGTH.pack(len(header_bytes)), header_bytes, body])
+
+
+def _unframe(blob):
+    """Returns the header dict and a zero-copy view on the body"""
+    view = memoryview(blob)
+    (header_length,) = HEADER_LENGTH.unpack(view[len(MAGIC):PREFIX_SIZE])
+    body_offset = PREFIX_SIZE + header_length
+    header = json.loads(bytes(view[PREFIX_SIZE:body_offset]).decode('utf-8'))
+    return header, view[body_offset:]
+
+
+def encode_raw(header, body):
+    """Frames already serialized bytes behind a JSON `header`"""
+    return _frame(header, body)
+
+
+def decode_raw(blob):
+    """Returns the header and body of a blob built by `encode_raw`"""
+    header, body = _unframe(blob)
+    return header, bytes(body)
+
+
+def is_framed(blob):
+    return bytes(blob[:len(MAGIC)]) == MAGIC
+
+
+def _pickle_df(df):
+    return 'pickle', pkl.dumps(df, protocol=pkl.HIGHEST_PROTOCOL), {}
+
+
+class BaseCacheCodec(object):
+    """Encodes a cached payload dict into bytes and back"""
+
+    name = None
+
+    def encode_df(self, df):
+        """Returns a tuple of (format, body bytes, extra header fields)"""
+        raise NotImplementedError()
+
+    def encode(self, value):
+        header = {k: v for k, v in value.items() if k != 'df'}
+        df = value.get('df')
+        body = b''
+        if df is not None:
+            try:
+                fmt, body, extra = self.encode_df(df)
+            except Exception as e:
+                # some frames (mixed-type object columns, exotic dtypes)
+                # can't be represented in every format, pickle always works
+                logging.warning(
+                    'Could not encode dataframe with the {} cache codec, '
+                    'falling back to pickle: {}'.format(self.name, e))
+                fmt, body, extra = _pickle_df(df)
+            header.update(extra)
+            header['format'] = fmt
+        return _frame(header, body)
+
+    def decode(self, blob):
+        return decode(blob)
+
+    def decode_metadata(self, blob):
+        return decode_metadata(blob)
+
+
+class PickleCacheCodec(BaseCacheCodec):
+    """The historical format: the whole payload dict is pickled
+
+    Blobs are left unframed so that they stay readable by older workers
+    sharing the same cache during a rolling upgrade.
+    """
+
+    name = 'pickle'
+
+    def encode_df(self, df):
+        return _pickle_df(df)
+
+    def encode(self, value):
+        return pkl.dumps(value, protocol=pkl.HIGHEST_PROTOCOL)
+
+
+class ArrowCacheCodec(BaseCacheCodec):
+    """Stores the dataframe as a compressed Arrow IPC stream
+
+    Reading an uncompressed stream is zero-copy with regards to the cache
+    blob; compressed streams are decompressed once into a single buffer.
+    """
+
+    name = 'arrow'
+
+    def __init__(self, compression='lz4'):
+        if pa is None:
+            raise Exception(
+                'The `arrow` cache codec requires the `pyarrow` package')
+        self.compression = compression
+
+    def encode_df(self, df):
+        table = pa.Table.from_pandas(df)
+        sink = pa.BufferOutputStream()
+        writer = pa.RecordBatchStreamWriter(sink, table.schema)
+        writer.write_table(table)
+        writer.close()
+        buf = sink.getvalue()
+        extra = {'raw_size': buf.size}
+        if self.compression:
+            buf = pa.compress(buf, codec=self.compression, asbytes=False)
+            extra['compression'] = self.compression
+        return 'arrow', buf.to_pybytes(), extra
+
+
+def _decode_df(header, body):
+    fmt = header.get('format')
+    if fmt is None:
+        return None
+    if fmt == 'pickle':
+        return pkl.loads(body)
+    if fmt == 'arrow':
+        if pa is None:
+            raise Exception(
+                'Reading Arrow-encoded cache entries requires `pyarrow`')
+        buf = pa.py_buffer(body)
+        if header.get('compression'):
+            buf = pa.decompress(
+                buf,
+                decompressed_size=header['raw_size'],
+                codec=header['compression'],
+                asbytes=False)
+        return pa.ipc.open_stream(buf).read_all().to_pandas()
+    raise Exception('Unknown cache payload format: {}'.format(fmt))
+
+
+def decode(blob):
+    """Decodes a blob written by any of the codecs, or a legacy pickle"""
+    if not is_framed(blob):
+        return pkl.loads(blob)
+    header, body = _unframe(blob)
+    value = {
+        k: v for k, v in header.items()
+        if k not in ('format', 'compression', 'raw_size')
+    }
+    value['df'] = _decode_df(header, body)
+    return value
+
+
+def decode_metadata(blob):
+    """Returns the payload without its `df`, decoding as little as possible"""
+    if not is_framed(blob):
+        value = pkl.loads(blob)
+        value.pop('df', None)
+        return value
+    header, _ = _unframe(blob)
+    for k in ('format', 'compression', 'raw_size'):
+        header.pop(k, None)
+    return header
+
+
+CACHE_CODECS = {
+    PickleCacheCodec.name: PickleCacheCodec,
+    ArrowCacheCodec.name: ArrowCacheCodec,
+}
+
+
+def get_cache_codec(cache_config):
+    """Instantiates the codec selected by `CACHE_CODEC` in a cache config"""
+    cache_config = cache_config or {}
+    name = cache_config.get('CACHE_CODEC') or PickleCacheCodec.name
+    if name not in CACHE_CODECS:
+        raise Exception('Unknown CACHE_CODEC: {}'.format(name))
+    kwargs = cache_config.get('CACHE_CODEC_OPTIONS') or {}
+    return CACHE_CODECS[name](**kwargs)
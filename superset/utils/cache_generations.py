@@ -0,0 +1,72 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Per-datasource generations of the chart cache
+
+Every datasource has a random generation token stored in the shared cache and
+folded into the cache keys of its charts. Replacing the token invalidates all
+of the datasource's cached payloads at once, without scanning keys; the old
+entries just stop being read and expire on their own.
+"""
+import logging
+import uuid
+
+from superset import cache
+from superset.utils.tiered_cache import shared_tier
+
+
+def generation_key(datasource_type, datasource_id):
+    return 'datasource_generation/{}/{}'.format(datasource_type, datasource_id)
+
+
+def _new_generation():
+    return uuid.uuid4().hex[:12]
+
+
+def get_generation(datasource_type, datasource_id):
+    """Returns the current generation of a datasource's cached payloads
+
+    A generation that went missing from the cache (evicted for instance) is
+    replaced by a new one rather than reverting to a previous value, so that
+    payloads cached before an invalidation can never be served again.
+    """
+    # the local tier could hold a generation replaced by another process
+    backend = shared_tier(cache)
+    if not backend:
+        return None
+    key = generation_key(datasource_type, datasource_id)
+    try:
+        generation = backend.get(key)
+        if generation is None:
+            backend.add(key, _new_generation(), timeout=0)
+            generation = backend.get(key)
+        return generation
+    except Exception as e:
+        logging.warning('Could not read cache generation: {}'.format(e))
+        return None
+
+
+def bump_generation(datasource_type, datasource_id):
+    """Invalidates all the cached payloads of a datasource"""
+    backend = shared_tier(cache)
+    if not backend:
+        return
+    key = generation_key(datasource_type, datasource_id)
+    try:
+        backend.set(key, _new_generation(), timeout=0)
+    except Exception as e:
+        logging.warning('Could not bump cache generation: {}'.format(e))
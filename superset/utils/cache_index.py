@@ -0,0 +1,48 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Small indexes of cached results, stored in the cache itself
+
+Some queries can be answered from the cached results of other, related
+queries. Those results are listed in an index stored under a key derived
+from what the related queries have in common, so that finding them never
+requires scanning the keys of the cache backend. Entries are dicts that must
+at least hold the `key` of the cached result they describe.
+"""
+import logging
+
+
+def get_index(cache, index_key):
+    try:
+        return cache.get(index_key) or []
+    except Exception as e:
+        logging.warning('Could not read cache index: {}'.format(e))
+        return []
+
+
+def register(cache, index_key, entry, max_entries, timeout):
+    """Adds an entry to an index, evicting the oldest ones
+
+    Concurrent registrations may overwrite each other, which only makes
+    some results unavailable for reuse.
+    """
+    entries = [e for e in get_index(cache, index_key) if e['key'] != entry['key']]
+    entries.append(entry)
+    try:
+        cache.set(index_key, entries[-max_entries:], timeout=timeout)
+    except Exception as e:
+        logging.warning('Could not update cache index: {}'.format(e))
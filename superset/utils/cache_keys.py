@@ -0,0 +1,140 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Canonical forms of query objects for building cache keys
+
+Queries that only differ by the order of their groupby, columns, filters or
+secondary metrics, by empty clauses or by the UI state of their adhoc metrics
+return the same rows, possibly with their columns in another order. They
+share the same cache key, and `project_columns` puts the columns of a frame
+cached for one of them in the order the others expect.
+"""
+from collections import OrderedDict
+
+import simplejson as json
+
+from superset.utils.core import get_metric_names
+
+# fields with no effect when falsy, whatever their falsy value is
+NOOP_WHEN_EMPTY = (
+    'columns',
+    'filter',
+    'groupby',
+    'orderby',
+    'prequeries',
+    'timeseries_limit',
+    'timeseries_limit_metric',
+)
+
+ADHOC_METRIC_KEYS = {
+    'SIMPLE': ('expressionType', 'aggregate', 'column', 'label'),
+    'SQL': ('expressionType', 'sqlExpression', 'label'),
+}
+ADHOC_COLUMN_KEYS = ('column_name', 'type')
+
+
+def _sort_key(obj):
+    return json.dumps(obj, sort_keys=True, default=str)
+
+
+def _is_empty(value):
+    return value is None or value == '' or value == [] or value == {}
+
+
+def normalize_metric(metric):
+    """Strips an adhoc metric of the fields that don't change its SQL"""
+    if not isinstance(metric, dict):
+        return metric
+    keys = ADHOC_METRIC_KEYS.get(metric.get('expressionType'))
+    if not keys:
+        return metric
+    metric = {k: metric.get(k) for k in keys}
+    if isinstance(metric.get('column'), dict):
+        metric['column'] = {
+            k: metric['column'].get(k) for k in ADHOC_COLUMN_KEYS
+            if metric['column'].get(k) is not None
+        }
+    return metric
+
+
+def normalize_filter(flt):
+    if not isinstance(flt, dict):
+        return flt
+    flt = {k: v for k, v in flt.items() if not _is_empty(v) or k == 'val'}
+    if flt.get('op') in ('in', 'not in') and isinstance(flt.get('val'), list):
+        flt['val'] = sorted(flt['val'], key=_sort_key)
+    return flt
+
+
+def canonicalize(query_obj):
+    """Returns a copy of a query object dict in its canonical form
+
+    The first metric keeps its position as queries are ordered by it.
+    """
+    query_obj = {
+        k: v for k, v in query_obj.items()
+        if not (k in NOOP_WHEN_EMPTY and not v)
+    }
+    for key in ('groupby', 'columns'):
+        if key in query_obj:
+            query_obj[key] = sorted(query_obj[key], key=_sort_key)
+    if query_obj.get('filter'):
+        query_obj['filter'] = sorted(
+            (normalize_filter(flt) for flt in query_obj['filter']), key=_sort_key)
+    metrics = [normalize_metric(m) for m in query_obj.get('metrics') or []]
+    if metrics:
+        query_obj['metrics'] = metrics[:1] + sorted(metrics[1:], key=_sort_key)
+    if query_obj.get('timeseries_limit_metric'):
+        query_obj['timeseries_limit_metric'] = normalize_metric(
+            query_obj['timeseries_limit_metric'])
+    if query_obj.get('orderby'):
+        query_obj['orderby'] = [
+            [normalize_metric(col), ascending]
+            for col, ascending in query_obj['orderby']
+        ]
+    if isinstance(query_obj.get('extras'), dict):
+        extras = {
+            k: v for k, v in query_obj['extras'].items() if not _is_empty(v)
+        }
+        if extras.get('having_druid'):
+            extras['having_druid'] = sorted(
+                (normalize_filter(flt) for flt in extras['having_druid']),
+                key=_sort_key)
+        query_obj['extras'] = extras
+    return query_obj
+
+
+def project_columns(df, query_obj):
+    """Orders the columns of `df` the way `query_obj` lists them
+
+    Only the columns of a same kind (groupby, metrics or columns) swap
+    places, so that the ones added by the database engine stay in place.
+    """
+    columns = list(df.columns)
+    for requested in (
+            query_obj.get('groupby') or [],
+            get_metric_names(query_obj.get('metrics') or []),
+            query_obj.get('columns') or []):
+        requested = [c for c in OrderedDict.fromkeys(requested) if c in columns]
+        positions = [i for i, c in enumerate(columns) if c in requested]
+        if len(positions) != len(requested):
+            continue
+        for i, c in zip(positions, requested):
+            columns[i] = c
+    if columns == list(df.columns):
+        return df
+    return df[columns]
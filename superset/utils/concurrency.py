@@ -0,0 +1,73 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Helpers to run work from Flask handlers in other threads"""
+from concurrent.futures import as_completed, ThreadPoolExecutor
+import functools
+
+from flask import copy_current_request_context, current_app, g, has_request_context
+
+
+def with_app_context(func):
+    """Wraps `func` to run in a copy of the current request or app context
+
+    Must be called from the thread owning the context, the returned function
+    can then be called from any thread. The current user is carried over, as
+    queries run on their behalf when the database impersonates users.
+    """
+    user = getattr(g, 'user', None)
+
+    @functools.wraps(func)
+    def with_user(*args, **kwargs):
+        if getattr(g, 'user', None) is None:
+            g.user = user
+        return func(*args, **kwargs)
+
+    if has_request_context():
+        return copy_current_request_context(with_user)
+    app = current_app._get_current_object()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with app.app_context():
+            return with_user(*args, **kwargs)
+    return wrapper
+
+
+def run_in_pools(tasks, pool_sizes):
+    """Runs functions in one thread pool per key, yields results as they come
+
+    `tasks` is a list of `(pool_key, func)` and `pool_sizes` maps pool keys
+    to their number of threads. Yields the `(index, result)` of each task,
+    in the order they complete. Closing the generator cancels the tasks
+    that didn't start yet.
+    """
+    executors = {}
+    futures = {}
+    try:
+        for i, (pool_key, func) in enumerate(tasks):
+            if pool_key not in executors:
+                executors[pool_key] = ThreadPoolExecutor(
+                    max_workers=max(pool_sizes.get(pool_key) or 1, 1))
+            futures[executors[pool_key].submit(func)] = i
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        for executor in executors.values():
+            executor.shutdown(wait=False)
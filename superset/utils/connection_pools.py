@@ -0,0 +1,94 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Connection pools to analytics databases
+
+Engines are kept in a bounded `EngineRegistry` (see
+`superset.utils.engine_registry`), so their pools outlive requests and are
+shared by the threads of a worker process, until the registry evicts their
+engine and disposes of their connections. A `MeteredQueuePool` reports to
+the stats logger how long checkouts wait for a connection, how many of them
+time out and how many connections are checked out.
+"""
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from superset.utils.dates import now_as_float
+
+# pool settings of a database, mapped to their `create_engine` arguments
+POOL_SETTINGS = {
+    'pool_size': 'pool_size',
+    'max_overflow': 'max_overflow',
+    'pool_recycle': 'pool_recycle',
+    'pool_timeout': 'pool_timeout',
+    'pre_ping': 'pool_pre_ping',
+}
+
+
+def get_pool_params(settings):
+    """Returns the `create_engine` arguments of pool settings"""
+    params = {'poolclass': MeteredQueuePool}
+    for key, param in POOL_SETTINGS.items():
+        if settings.get(key) is not None:
+            params[param] = settings[key]
+    return params
+
+
+def meter_pool(pool, stats_logger, stats_key):
+    if isinstance(pool, MeteredQueuePool):
+        pool.stats_logger = stats_logger
+        pool.stats_key = stats_key
+
+
+class MeteredQueuePool(QueuePool):
+    """A queue pool reporting its checkouts to a stats logger"""
+
+    stats_logger = None
+    stats_key = 'db_pool'
+
+    def _do_get(self):
+        if not self.stats_logger:
+            return super()._do_get()
+        start = now_as_float()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.stats_logger.incr(self.stats_key + '.checkout_timeout')
+            raise
+        self.stats_logger.timing(
+            self.stats_key + '.checkout_wait', now_as_float() - start)
+        self.report_usage()
+        return conn
+
+    def _do_return_conn(self, conn):
+        super()._do_return_conn(conn)
+        if self.stats_logger:
+            self.report_usage()
+
+    def report_usage(self):
+        checked_out = self.checkedout()
+        self.stats_logger.gauge(self.stats_key + '.checked_out', checked_out)
+        capacity = self.size() + self._max_overflow
+        # pools without a size limit have no utilization
+        if self._max_overflow >= 0 and capacity > 0:
+            self.stats_logger.gauge(
+                self.stats_key + '.utilization', 100 * checked_out // capacity)
+
+    def recreate(self):
+        pool = super().recreate()
+        meter_pool(pool, self.stats_logger, self.stats_key)
+        return pool
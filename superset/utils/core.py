@@ -58,12 +58,17 @@ from sqlalchemy.types import TEXT, TypeDecorator
 
 from superset.exceptions import SupersetException, SupersetTimeoutException
 from superset.utils.dates import datetime_to_epoch, EPOCH
+from superset.utils.tiered_cache import setup_tiered_cache
 
 
 logging.getLogger('MARKDOWN').setLevel(logging.INFO)
 
 PY3K = sys.version_info >= (3, 0)
 DTTM_ALIAS = '__timestamp'
+# prefix of the GROUPING(column) labels of grouping sets queries
+GROUPING_PREFIX = '__grouping__'
+# label of the bitmask of the time windows rows fall in
+TIME_WINDOWS_ALIAS = '__time_windows'
 ADHOC_METRIC_EXPRESSION_TYPES = {
     'SIMPLE': 'SIMPLE',
     'SQL': 'SQL',
@@ -702,7 +707,11 @@ def choicify(values):
 def setup_cache(app: Flask, cache_config) -> Optional[Cache]:
     """Setup the flask-cache on a flask app"""
     if cache_config and cache_config.get('CACHE_TYPE') != 'null':
-        return Cache(app, config=cache_config)
+        return setup_tiered_cache(
+            Cache(app, config=cache_config),
+            cache_config,
+            app.config.get('STATS_LOGGER'),
+        )
 
     return None
 
@@ -0,0 +1,149 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Estimating what queries read before running them
+
+Databases whose engine can tell (see `BaseEngineSpec.estimate_statement_cost`)
+estimate the rows and bytes chart and SQL Lab queries read before they run.
+The `cost_guardrails` of a database then map actions to thresholds of those
+estimates, for instance
+`{"warn": {"bytes": 1e10}, "confirm": {"bytes": 1e11}, "refuse": {"rows": 1e10}}`:
+
+- `warn`: the query runs, and its payload carries the estimate;
+- `confirm`: the query only runs when it's confirmed;
+- `refuse`: the query doesn't run.
+
+Estimates are cached under the normalized SQL of their query, without its
+comments, so charts refreshed again aren't estimated again.
+"""
+import hashlib
+import logging
+
+from flask_babel import lazy_gettext as _
+import sqlparse
+
+from superset import app, cache
+from superset.exceptions import QueryCostException
+
+config = app.config
+stats_logger = config.get('STATS_LOGGER')
+
+WARN = 'warn'
+CONFIRM = 'confirm'
+REFUSE = 'refuse'
+BYTE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
+
+def normalize(sql):
+    """Returns the SQL of a query without its comments and extra whitespace"""
+    sql = sqlparse.format(
+        sql, strip_comments=True, strip_whitespace=True, keyword_case='upper')
+    return sql.strip().rstrip(';').strip()
+
+
+def get_cache_key(database, sql, schema=None):
+    key = '{}/{}/{}'.format(database.id, schema, normalize(sql))
+    return 'cost_estimate_' + hashlib.md5(key.encode('utf-8')).hexdigest()
+
+
+def get_estimate(database, sql, schema=None, user_name=None):
+    """Returns the estimated `rows` and `bytes` a query reads, if known"""
+    if not database.db_engine_spec.supports_cost_estimate:
+        return None
+    cache_key = get_cache_key(database, sql, schema)
+    if cache:
+        estimate = cache.get(cache_key)
+        if estimate is not None:
+            stats_logger.incr('cost_estimate_cache_hit')
+            return estimate
+    try:
+        estimate = database.estimate_cost(sql, schema, user_name)
+    except Exception as e:
+        logging.exception(e)
+        stats_logger.incr('cost_estimate_error')
+        return None
+    if cache and estimate is not None:
+        try:
+            cache.set(
+                cache_key, estimate, timeout=config.get('COST_ESTIMATE_CACHE_TIMEOUT'))
+        except Exception as e:
+            logging.warning('Could not cache key {}'.format(cache_key))
+            logging.exception(e)
+    return estimate
+
+
+def get_verdict(estimate, guardrails):
+    """Returns the strictest action whose thresholds an estimate exceeds"""
+    for action in (REFUSE, CONFIRM, WARN):
+        thresholds = guardrails.get(action) or {}
+        if any(
+                estimate.get(measure) is not None and estimate[measure] > threshold
+                for measure, threshold in thresholds.items()):
+            return action
+    return None
+
+
+def evaluate(database, sql, schema=None, user_name=None):
+    """Returns the estimate of a query along with its `verdict`, if known"""
+    estimate = get_estimate(database, sql, schema, user_name)
+    if estimate is None:
+        return None
+    guardrails = database.cost_guardrails or {}
+    return dict(estimate, verdict=get_verdict(estimate, guardrails))
+
+
+def format_estimate(estimate):
+    parts = []
+    if estimate.get('rows') is not None:
+        parts.append(_('%(rows)s rows', rows='{:,}'.format(int(estimate['rows']))))
+    if estimate.get('bytes') is not None:
+        size = float(estimate['bytes'])
+        unit = BYTE_UNITS[0]
+        for unit in BYTE_UNITS:
+            if size < 1024 or unit == BYTE_UNITS[-1]:
+                break
+            size /= 1024
+        parts.append('{:.1f} {}'.format(size, unit))
+    return ', '.join(str(part) for part in parts)
+
+
+def enforce(database, sql, schema=None, confirmed=False, user_name=None):
+    """Applies the guardrails of a database to a query before it runs
+
+    Returns the estimate of the query with its verdict, or None when the
+    database has no guardrails or the query no estimate. Raises
+    `QueryCostException` when the query is refused, or when it needs a
+    confirmation it didn't get.
+    """
+    if not database.cost_guardrails:
+        return None
+    estimate = evaluate(database, sql, schema, user_name)
+    if not estimate:
+        return None
+    verdict = estimate['verdict']
+    if verdict:
+        stats_logger.incr('cost_guardrail_{}'.format(verdict))
+    if verdict == REFUSE:
+        raise QueryCostException(_(
+            'This query is estimated to read %(estimate)s, more than this '
+            'database allows', estimate=format_estimate(estimate)), estimate)
+    if verdict == CONFIRM and not confirmed:
+        raise QueryCostException(_(
+            'This query is estimated to read %(estimate)s, run it again with '
+            '`confirm_cost` to confirm it', estimate=format_estimate(estimate)),
+            estimate)
+    return estimate
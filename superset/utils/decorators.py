@@ -87,6 +87,10 @@ def etag_cache(max_age, check_perms=bool):
             if response is None:
                 response = f(*args, **kwargs)
 
+                # the payloads computed asynchronously are cached once done
+                if response.status_code == 202:
+                    return response
+
                 # add headers for caching: Last Modified, Expires and ETag
                 response.cache_control.public = True
                 response.last_modified = datetime.utcnow()
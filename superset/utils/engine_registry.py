@@ -0,0 +1,98 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""A bounded registry of the SQLAlchemy engines of analytics databases
+
+Each engine holds a pool of connections, so engines are shared rather than
+created per query. There is an engine per database and combination of
+schema, pooling, impersonated user and source though, so the registry only
+keeps the most recently used ones, up to a number and for a time, and
+disposes of the connections of the engines it evicts. Engines of a database
+whose connection settings changed are evicted at once.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class EngineRegistry(object):
+
+    def __init__(self, max_engines=None, ttl=None, stats_logger=None):
+        self.max_engines = max_engines
+        self.ttl = ttl
+        self.stats_logger = stats_logger
+        # (database key, engine key) -> (engine, creation time)
+        self._engines = OrderedDict()
+        # database key -> settings the engines of the database were created with
+        self._settings = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._engines)
+
+    def get(self, database_key, settings, engine_key, create_engine):
+        """Returns the engine of a database, calling `create_engine` if needed
+
+        `settings` are whatever the engines of a database depend on, and
+        `engine_key` the arguments telling its engines apart.
+        """
+        evicted = []
+        created = False
+        with self._lock:
+            if self._settings.get(database_key, settings) != settings:
+                evicted += self._pop_all(lambda key: key[0] == database_key)
+            self._settings[database_key] = settings
+
+            key = (database_key, engine_key)
+            now = time.time()
+            if self.ttl:
+                evicted += self._pop_all(
+                    lambda k: now - self._engines[k][1] > self.ttl)
+            if key in self._engines:
+                self._engines.move_to_end(key)
+                engine = self._engines[key][0]
+            else:
+                engine = create_engine()
+                created = True
+                self._engines[key] = (engine, now)
+                if self.max_engines:
+                    while len(self._engines) > self.max_engines:
+                        evicted.append(self._engines.popitem(last=False)[1][0])
+            size = len(self._engines)
+        if evicted or created:
+            self._dispose(evicted, size)
+        return engine
+
+    def clear(self):
+        with self._lock:
+            evicted = self._pop_all(lambda key: True)
+            self._settings.clear()
+        self._dispose(evicted, 0)
+
+    def _pop_all(self, predicate):
+        keys = [key for key in self._engines if predicate(key)]
+        return [self._engines.pop(key)[0] for key in keys]
+
+    def _dispose(self, engines, size):
+        # connections checked out of a disposed engine's pool are closed once
+        # returned, so engines still in use by other threads keep working
+        for engine in engines:
+            engine.dispose()
+        if self.stats_logger:
+            for _ in engines:
+                self.stats_logger.incr('db_engines.evicted')
+            self.stats_logger.gauge('db_engines.count', size)
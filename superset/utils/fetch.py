@@ -0,0 +1,129 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Fetching query results into data frames, a chunk of rows at a time
+
+Building a frame with `DataFrame.from_records(cursor.fetchall())` keeps
+every row around as a tuple of Python objects until the frame is built,
+which takes several times the memory of the frame itself. Instead, rows are
+fetched with `fetchmany` and their values appended to an array per column.
+The columns the DB-API driver describes as numbers get int64 or float64
+arrays, so their values don't outlive their chunk as Python objects, unless
+they only hold NULLs, which `from_records` keeps as objects. Other columns,
+or numeric ones holding an unexpected value, get arrays of objects, whose
+types pandas infers the same way `from_records` does.
+"""
+from collections import OrderedDict
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from pandas._libs import lib
+
+DEFAULT_CHUNK_SIZE = 10000
+INITIAL_CAPACITY = 1024
+
+INT_TYPES = {int, np.int64, np.int32}
+FLOAT_TYPES = INT_TYPES | {float, np.float64, np.float32, Decimal, type(None)}
+
+
+def is_number(type_code, dbapi):
+    """Whether a `cursor.description` type code is the DB-API's NUMBER"""
+    number = getattr(dbapi, 'NUMBER', None)
+    if number is None or type_code is None:
+        return False
+    try:
+        return bool(type_code == number)
+    except Exception:
+        return False
+
+
+class ColumnBuffer(object):
+    """The values of a column, in an array growing as chunks are appended"""
+
+    def __init__(self, is_number, capacity):
+        self.values = np.empty(capacity, dtype=np.int64 if is_number else object)
+        self.size = 0
+        self.has_value = False
+
+    def extend(self, values):
+        end = self.size + len(values)
+        if end > len(self.values):
+            self.resize(max(end, 2 * len(self.values)), self.values.dtype)
+        if not self.has_value:
+            self.has_value = any(v is not None for v in values)
+        chunk = None
+        if self.values.dtype != object:
+            types = {type(v) for v in values}
+            dtype = self.values.dtype
+            if not types <= INT_TYPES:
+                dtype = np.float64 if types <= FLOAT_TYPES else object
+            try:
+                chunk = np.array(values, dtype=dtype) if dtype != object else None
+            except (TypeError, ValueError, OverflowError):
+                dtype = object
+            if dtype != self.values.dtype:
+                self.resize(len(self.values), dtype)
+        if chunk is not None:
+            self.values[self.size:end] = chunk
+        else:
+            # assigned one by one, as numpy would unpack values being sequences
+            for i, value in enumerate(values, self.size):
+                self.values[i] = value
+        self.size = end
+
+    def resize(self, capacity, dtype):
+        values = np.empty(capacity, dtype=dtype)
+        values[:self.size] = self.values[:self.size].astype(dtype)
+        self.values = values
+
+    def to_array(self):
+        values = self.values[:self.size]
+        if values.dtype != object and not self.has_value:
+            # numeric columns of NULLs only are objects for `from_records`
+            return np.full(self.size, None, dtype=object)
+        if values.dtype == object:
+            values = lib.maybe_convert_objects(values, try_float=True)
+        return values
+
+
+def fetch_df(cursor, dbapi=None, chunk_size=None):
+    """Builds a data frame out of the rows of an executed cursor"""
+    if cursor.description is None:
+        return pd.DataFrame()
+    columns = [col_desc[0] for col_desc in cursor.description]
+    rowcount = getattr(cursor, 'rowcount', None)
+    capacity = rowcount if rowcount and rowcount > 0 else INITIAL_CAPACITY
+    buffers = [
+        ColumnBuffer(is_number(col_desc[1], dbapi), capacity)
+        for col_desc in cursor.description
+    ]
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for buffer, values in zip(buffers, zip(*rows)):
+            buffer.extend(values)
+        del rows
+    if not buffers or not buffers[0].size:
+        return pd.DataFrame.from_records([], columns=columns)
+    # keyed by position, as result sets may have duplicate column names
+    df = pd.DataFrame(OrderedDict(
+        (i, buffer.to_array()) for i, buffer in enumerate(buffers)))
+    df.columns = columns
+    return df
@@ -0,0 +1,118 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Time bucket arithmetic for the incremental caching of time series
+
+A time series query grouped by a time grain returns one row per bucket of
+that grain (and per group), so the rows of a bucket that is entirely within
+the queried range and that is over can be cached and reused by any later
+query covering that bucket, whatever its time range. Only the buckets that
+aren't cached, the ones still open and the partial ones at the edges of the
+range need to be queried.
+
+Buckets are half-open `[start, end)` intervals of naive datetimes. Only the
+grains whose buckets are labeled with their start and whose boundaries don't
+depend on the database engine are supported.
+"""
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+EPOCH = datetime(1970, 1, 1)
+
+FIXED_GRAINS = {
+    'PT1S': (EPOCH, timedelta(seconds=1)),
+    'PT1M': (EPOCH, timedelta(minutes=1)),
+    'PT5M': (EPOCH, timedelta(minutes=5)),
+    'PT10M': (EPOCH, timedelta(minutes=10)),
+    'PT15M': (EPOCH, timedelta(minutes=15)),
+    'PT0.5H': (EPOCH, timedelta(minutes=30)),
+    'PT1H': (EPOCH, timedelta(hours=1)),
+    'P1D': (EPOCH, timedelta(days=1)),
+    '1969-12-28T00:00:00Z/P1W': (datetime(1969, 12, 28), timedelta(weeks=1)),
+    '1969-12-29T00:00:00Z/P1W': (datetime(1969, 12, 29), timedelta(weeks=1)),
+}
+
+CALENDAR_GRAINS = {
+    'P1M': 1,
+    'P0.25Y': 3,
+    'P1Y': 12,
+}
+
+
+def is_supported_grain(time_grain):
+    return time_grain in FIXED_GRAINS or time_grain in CALENDAR_GRAINS
+
+
+def floor_dttm(dttm, time_grain):
+    """Returns the start of the bucket `dttm` falls in"""
+    if time_grain in FIXED_GRAINS:
+        anchor, duration = FIXED_GRAINS[time_grain]
+        return dttm - (dttm - anchor) % duration
+    months = CALENDAR_GRAINS[time_grain]
+    month = (dttm.month - 1) // months * months + 1
+    return datetime(dttm.year, month, 1)
+
+
+def is_aligned(dttm, time_grain):
+    return floor_dttm(dttm, time_grain) == dttm
+
+
+def next_bucket(start, time_grain):
+    """Returns the start of the bucket following the one starting at `start`"""
+    if time_grain in FIXED_GRAINS:
+        return start + FIXED_GRAINS[time_grain][1]
+    return start + relativedelta(months=CALENDAR_GRAINS[time_grain])
+
+
+def get_buckets(from_dttm, to_dttm, time_grain, closed_before, max_buckets):
+    """Returns the cacheable buckets of a time range as `(start, end)` tuples
+
+    Those are the buckets entirely within `[from_dttm, to_dttm]` that ended
+    before `closed_before`. Returns `None` when there are more than
+    `max_buckets` of them, as looking them all up would cost more than it
+    saves.
+    """
+    buckets = []
+    start = floor_dttm(from_dttm, time_grain)
+    if start < from_dttm:
+        start = next_bucket(start, time_grain)
+    end = next_bucket(start, time_grain)
+    while end <= to_dttm and end <= closed_before:
+        if len(buckets) >= max_buckets:
+            return None
+        buckets.append((start, end))
+        start, end = end, next_bucket(end, time_grain)
+    return buckets
+
+
+def get_fetch_ranges(from_dttm, to_dttm, cached_buckets):
+    """Returns the `(from, to)` ranges of a time range not covered by cache
+
+    `cached_buckets` are sorted `(start, end)` tuples within the time range.
+    Ranges are inclusive of both bounds like the time filters of queries, so
+    that rows at the upper bound of a range belong to the next bucket and
+    have to be dropped, except for the last range.
+    """
+    ranges = []
+    cursor = from_dttm
+    for start, end in cached_buckets:
+        if start > cursor:
+            ranges.append((cursor, start))
+        cursor = end
+    ranges.append((cursor, to_dttm))
+    return ranges
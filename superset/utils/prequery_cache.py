@@ -0,0 +1,84 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Caching the top groups selected by the prequeries of time series
+
+Time series limited to their top series first query the top groups over the
+inner time range, then the series of those groups. The charts of a dashboard
+often share the same top groups, and the time comparisons of a chart query
+them over the same inner range, so the results of prequeries are cached on
+their own, keyed by the text of the prequery. The text covers the groupby,
+the limit metric, the filters and the inner time range.
+"""
+import hashlib
+import logging
+
+from superset import app, cache
+from superset.utils.cache_codecs import get_cache_codec
+
+config = app.config
+stats_logger = config.get('STATS_LOGGER')
+cache_codec = get_cache_codec(config.get('CACHE_CONFIG'))
+
+
+def is_enabled():
+    return bool(cache) and bool(
+        (config.get('CACHE_CONFIG') or {}).get('CACHE_PREQUERIES'))
+
+
+def get_cache_key(datasource, query):
+    key = '{}/{}/{}'.format(datasource.uid, datasource.cache_generation, query)
+    return 'prequery_' + hashlib.md5(key.encode('utf-8')).hexdigest()
+
+
+def get_timeout(datasource):
+    if datasource.cache_timeout is not None:
+        return datasource.cache_timeout
+    database = getattr(datasource, 'database', None)
+    if getattr(database, 'cache_timeout', None) is not None:
+        return database.cache_timeout
+    return config.get('CACHE_DEFAULT_TIMEOUT')
+
+
+def get_df(datasource, query, run):
+    """Returns the frame of a prequery, from the cache when it's there
+
+    `query` is the text of the prequery, and `run` runs it and returns its
+    frame.
+    """
+    if not is_enabled():
+        return run()
+    cache_key = get_cache_key(datasource, query)
+    try:
+        cache_value = cache.get(cache_key)
+        if cache_value:
+            stats_logger.incr('prequery_cache_hit')
+            return cache_codec.decode(cache_value)['df']
+    except Exception as e:
+        logging.exception(e)
+    stats_logger.incr('prequery_cache_miss')
+    df = run()
+    if df is not None:
+        try:
+            cache.set(
+                cache_key,
+                cache_codec.encode({'df': df}),
+                timeout=get_timeout(datasource))
+        except Exception as e:
+            logging.warning('Could not cache key {}'.format(cache_key))
+            logging.exception(e)
+    return df
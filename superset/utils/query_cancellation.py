@@ -0,0 +1,157 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Cancelling the chart queries nobody waits for anymore
+
+Chart queries run within web requests, and the warehouse keeps running them
+when the request goes away. The queries running on behalf of a request are
+tracked in its WSGI environ, which the copies of the request context handed
+to worker threads share, so that they can all be cancelled at once when the
+client disconnects. Only the streaming `dashboard_data` endpoint notices
+disconnects, as the others only write their response once their queries
+are done. A query is also cancelled once its deadline passes, if it has
+one (see `CHART_QUERY_TIMEOUT`), and
+when the worker process exits in the middle of it, as gunicorn has its
+timed out workers do. Jobs computing charts on Celery workers set their own
+deadline on the request context they run in.
+
+Queries are cancelled by their engine spec's `cancel_query`, from another
+thread than the one running them, which then fails with a
+`QueryCancelledException`.
+"""
+from contextlib import contextmanager
+import logging
+import threading
+
+from flask import has_request_context, request
+
+from superset.exceptions import QueryCancelledException
+
+ENVIRON_KEY = 'superset.running_queries'
+
+
+class RunningQuery(object):
+
+    def __init__(self, cancel, stats_logger=None):
+        self._cancel = cancel
+        self.stats_logger = stats_logger
+        self._reason = None
+        self.done = False
+        self.lock = threading.Lock()
+
+    @property
+    def reason(self):
+        """Why the query was cancelled, `None` if it wasn't"""
+        with self.lock:
+            return self._reason
+
+    def cancel(self, reason):
+        with self.lock:
+            if self.done or self._reason:
+                return
+            # set beforehand, as the query may fail before `_cancel` returns
+            self._reason = reason
+            try:
+                cancelled = self._cancel()
+            except Exception as e:
+                logging.exception(e)
+                cancelled = False
+            if not cancelled:
+                self._reason = None
+        if cancelled and self.stats_logger:
+            self.stats_logger.incr('chart_query.cancelled.' + reason)
+
+    def finish(self):
+        with self.lock:
+            self.done = True
+
+
+class RequestQueries(object):
+    """The queries running on behalf of a request"""
+
+    def __init__(self):
+        self.queries = set()
+        self.cancelled = None
+        # overrides the deadline of the queries, if set
+        self.timeout = None
+        self.lock = threading.Lock()
+
+    def add(self, query):
+        with self.lock:
+            if self.cancelled:
+                raise QueryCancelledException(get_message(self.cancelled, None))
+            self.queries.add(query)
+
+    def remove(self, query):
+        with self.lock:
+            self.queries.discard(query)
+
+    def cancel(self, reason):
+        with self.lock:
+            self.cancelled = reason
+            queries = list(self.queries)
+        for query in queries:
+            query.cancel(reason)
+
+
+def get_request_queries():
+    """Returns the queries of the current request, `None` outside of one"""
+    if not has_request_context():
+        return None
+    return request.environ.setdefault(ENVIRON_KEY, RequestQueries())
+
+
+def get_message(reason, timeout):
+    if reason == 'deadline':
+        return 'The query was cancelled after running for {} seconds'.format(timeout)
+    return 'The query was cancelled as its results were no longer awaited'
+
+
+@contextmanager
+def track(cancel, timeout=None, stats_logger=None):
+    """Tracks a running query so that it can be cancelled
+
+    `cancel` is called from another thread, and returns whether the query
+    could be cancelled.
+    """
+    query = RunningQuery(cancel, stats_logger)
+    request_queries = get_request_queries()
+    if request_queries is not None:
+        request_queries.add(query)
+        timeout = request_queries.timeout or timeout
+    timer = None
+    if timeout:
+        timer = threading.Timer(timeout, query.cancel, args=('deadline',))
+        timer.daemon = True
+        timer.start()
+    try:
+        yield query
+    except Exception as e:
+        reason = query.reason
+        if reason:
+            raise QueryCancelledException(get_message(reason, timeout)) from e
+        raise
+    except BaseException:
+        # the process is exiting, or the generator running the query is closed
+        query.cancel('exit')
+        raise
+    finally:
+        query.finish()
+        if timer:
+            timer.cancel()
+        if request_queries is not None:
+            request_queries.remove(query)
@@ -0,0 +1,176 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Answering queries by rolling up cached results of finer queries
+
+A cached result grouped by more columns, or by a finer time grain, than a
+query can answer it when all of the query's metrics are additive: the rows of
+the cached frame are grouped again and their metrics aggregated with the
+function that rolls up their SQL aggregate (a `COUNT` of counts is a `SUM`).
+
+Cached results that can serve as roll-up sources are listed in a small index
+stored in the cache, under a key shared by all the queries that only differ
+by their groupby, metrics and time grain, so finding one never requires
+scanning keys.
+"""
+from collections import OrderedDict
+import re
+
+import pandas as pd
+import simplejson as json
+
+from superset.utils.cache_index import get_index
+from superset.utils.cache_keys import normalize_metric
+from superset.utils.core import DTTM_ALIAS
+from superset.utils.incremental_cache import (
+    CALENDAR_GRAINS,
+    EPOCH,
+    FIXED_GRAINS,
+    floor_dttm,
+)
+
+ROLLUP_AGGREGATES = {
+    'SUM': 'sum',
+    'COUNT': 'sum',
+    'MIN': 'min',
+    'MAX': 'max',
+}
+
+# a single aggregate over a column or an expression without parentheses
+AGGREGATE_EXPRESSION = re.compile(
+    r'^\s*(SUM|COUNT|MIN|MAX)\s*\(\s*(?!DISTINCT\b)[^()]*\)\s*$', re.IGNORECASE)
+
+
+def get_rollup_aggregate(metric, metric_expressions):
+    """Returns the pandas function rolling up a metric, `None` if it can't be
+
+    `metric` is either an adhoc metric or the name of a saved one, whose SQL
+    expression is looked up in `metric_expressions`.
+    """
+    if isinstance(metric, dict):
+        if metric.get('expressionType') == 'SIMPLE':
+            return ROLLUP_AGGREGATES.get((metric.get('aggregate') or '').upper())
+        expression = metric.get('sqlExpression')
+    else:
+        expression = metric_expressions.get(metric)
+    match = AGGREGATE_EXPRESSION.match(expression or '')
+    if not match:
+        return None
+    return ROLLUP_AGGREGATES[match.group(1).upper()]
+
+
+def get_metric_definition(metric, metric_expressions):
+    """Returns what identifies the SQL of a metric, as a string
+
+    Adhoc metrics are identified by their normalized form, and saved ones by
+    their name and expression, so that metrics sharing a label but not their
+    SQL never roll up from one another.
+    """
+    if isinstance(metric, dict):
+        definition = normalize_metric(metric)
+    else:
+        definition = {
+            'metric_name': metric,
+            'expression': metric_expressions.get(metric),
+        }
+    return json.dumps(definition, sort_keys=True, default=str)
+
+
+def is_finer_grain(source, target):
+    """Whether each bucket of the `target` grain is a union of `source` ones
+
+    A `None` source grain stands for raw timestamps, which roll up to any
+    grain.
+    """
+    if source == target or source is None:
+        return True
+    if source in FIXED_GRAINS and target in FIXED_GRAINS:
+        source_anchor, source_duration = FIXED_GRAINS[source]
+        target_anchor, target_duration = FIXED_GRAINS[target]
+        return (
+            not target_duration % source_duration and
+            not (target_anchor - source_anchor) % source_duration)
+    if source in FIXED_GRAINS and target in CALENDAR_GRAINS:
+        anchor, duration = FIXED_GRAINS[source]
+        return not FIXED_GRAINS['P1D'][1] % duration and \
+            not (EPOCH - anchor) % duration
+    if source in CALENDAR_GRAINS and target in CALENDAR_GRAINS:
+        return not CALENDAR_GRAINS[target] % CALENDAR_GRAINS[source]
+    return False
+
+
+def can_roll_up(entry, groupby, metrics, is_timeseries, time_grain):
+    """Whether the cached result described by an index `entry` can answer
+
+    `metrics` are the definitions of the query's metrics (see
+    `get_metric_definition`), which the entry lists as well.
+    """
+    if not set(groupby) <= set(entry['groupby']):
+        return False
+    if not set(metrics) <= set(entry['metrics']):
+        return False
+    if not is_timeseries:
+        return True
+    return entry['is_timeseries'] and is_finer_grain(entry['time_grain'], time_grain)
+
+
+def aggregate(values, func):
+    """Aggregates a series or grouped series like its SQL aggregate would
+
+    Unlike pandas, SQL sums of NULLs only are NULL.
+    """
+    if func == 'sum':
+        return values.sum(min_count=1)
+    return values.agg(func)
+
+
+def roll_up(df, groupby, aggregates, is_timeseries, time_grain, label_shift):
+    """Groups `df` again by `groupby` (and the time grain) and aggregates
+
+    `aggregates` maps metric labels to pandas aggregation functions.
+    `label_shift` is the offset between the timestamps of `df` and the ones
+    of the database, which the time grain applies to. Returns `None` when the
+    result wouldn't match the one of the database.
+    """
+    # SQL groups NULLs together while pandas drops them
+    if groupby and df[groupby].isnull().values.any():
+        return None
+    df = df.copy()
+    keys = list(groupby)
+    if is_timeseries:
+        df[DTTM_ALIAS] = df[DTTM_ALIAS].map(
+            lambda dttm: floor_dttm(dttm - label_shift, time_grain) + label_shift)
+        keys.append(DTTM_ALIAS)
+    if not keys:
+        # unlike pandas, SQL aggregates of no rows are NULL
+        if df.empty:
+            return None
+        return pd.DataFrame(OrderedDict(
+            (col, [aggregate(df[col], func)]) for col, func in aggregates.items()))
+    grouped = df.groupby(keys, sort=False)
+    return pd.DataFrame(OrderedDict(
+        (col, aggregate(grouped[col], func)) for col, func in aggregates.items()
+    )).reset_index()
+
+
+def find_sources(cache, index_key, groupby, metrics, is_timeseries, time_grain):
+    """Returns the index entries that can answer a query, smallest first"""
+    entries = [
+        e for e in get_index(cache, index_key)
+        if can_roll_up(e, groupby, metrics, is_timeseries, time_grain)
+    ]
+    return sorted(entries, key=lambda e: (len(e['groupby']), e['rowcount']))
@@ -0,0 +1,166 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Coalescing of identical chart queries on cache miss
+
+When many requests miss on the same cache key at once, only the one holding
+the key's lock runs the query; the others wait for it to populate the cache.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from superset.utils.tiered_cache import shared_tier
+
+
+class CacheLock(object):
+    """A best-effort distributed lock relying on the atomicity of `cache.add`"""
+
+    def __init__(self, cache, key, timeout):
+        self.cache = shared_tier(cache)
+        self.key = 'single_flight/' + key
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+
+    def acquire(self):
+        return bool(self.cache.add(self.key, self.token, timeout=self.timeout))
+
+    def is_held(self):
+        return self.cache.get(self.key) is not None
+
+    def release(self):
+        # the lock may have expired and been taken over by another process
+        if self.cache.get(self.key) == self.token:
+            self.cache.delete(self.key)
+
+
+class LocalLock(object):
+    """A per-process stand-in for `CacheLock`, mostly useful in tests"""
+
+    _held = {}
+    _mutex = threading.Lock()
+
+    def __init__(self, cache, key, timeout):
+        self.key = key
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+
+    def acquire(self):
+        with self._mutex:
+            token, expires_at = self._held.get(self.key, (None, 0))
+            if token is not None and expires_at > time.time():
+                return False
+            self._held[self.key] = (self.token, time.time() + self.timeout)
+            return True
+
+    def is_held(self):
+        with self._mutex:
+            _, expires_at = self._held.get(self.key, (None, 0))
+            return expires_at > time.time()
+
+    def release(self):
+        with self._mutex:
+            if self._held.get(self.key, (None,))[0] == self.token:
+                del self._held[self.key]
+
+
+LOCK_BACKENDS = {
+    'cache': CacheLock,
+    'local': LocalLock,
+}
+
+
+class SingleFlight(object):
+    """Makes sure a single process computes the value for a cache key
+
+    Usage::
+
+        flight = SingleFlight(cache, cache_key, cache_config)
+        value = flight.wait()
+        if value is None:
+            try:
+                value = compute_and_cache()
+            finally:
+                flight.release()
+
+    `wait` returns immediately with `None` when this process is the leader
+    (or when coalescing is disabled), returns the value cached by the leader
+    once it is there, or gives up with `None` after `timeout` seconds or when
+    the leader released its lock without caching anything, in which case the
+    caller runs the query itself.
+    """
+
+    def __init__(self, cache, key, cache_config, stats_logger=None):
+        cache_config = cache_config or {}
+        self.cache = cache
+        self.key = key
+        self.timeout = cache_config.get('CACHE_SINGLE_FLIGHT_TIMEOUT') or 0
+        self.poll_interval = cache_config.get(
+            'CACHE_SINGLE_FLIGHT_POLL_INTERVAL', 0.2)
+        self.stats_logger = stats_logger
+        self.lock = None
+        if self.enabled:
+            lock_class = LOCK_BACKENDS[
+                cache_config.get('CACHE_SINGLE_FLIGHT_LOCK', 'cache')]
+            # the lock outlives the wait so that waiters give up before a
+            # leader that got stuck loses it
+            lock_timeout = cache_config.get(
+                'CACHE_SINGLE_FLIGHT_LOCK_TIMEOUT', 2 * self.timeout)
+            self.lock = lock_class(cache, key, lock_timeout)
+        self.is_leader = False
+
+    @property
+    def enabled(self):
+        return bool(self.cache and self.key and self.timeout)
+
+    def _incr(self, key):
+        if self.stats_logger:
+            self.stats_logger.incr(key)
+
+    def wait(self):
+        if not self.enabled:
+            return None
+        try:
+            self.is_leader = self.lock.acquire()
+        except Exception as e:
+            logging.warning('Could not acquire single flight lock: {}'.format(e))
+            return None
+        if self.is_leader:
+            return None
+
+        self._incr('single_flight_wait')
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            time.sleep(self.poll_interval)
+            value = self.cache.get(self.key)
+            if value:
+                self._incr('single_flight_coalesced')
+                return value
+            if not self.lock.is_held():
+                break
+        self._incr('single_flight_fallback')
+        return None
+
+    def release(self):
+        if self.is_leader:
+            try:
+                self.lock.release()
+            except Exception as e:
+                logging.warning(
+                    'Could not release single flight lock: {}'.format(e))
+            self.is_leader = False
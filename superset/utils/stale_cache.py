@@ -0,0 +1,82 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Stale-while-revalidate support for the chart dataframe cache
+
+Payloads are kept in the cache for `cache_timeout + stale_timeout` seconds
+and carry a `fresh_until` timestamp. A payload read past that timestamp is
+still served, while a single background thread recomputes it.
+"""
+import logging
+import threading
+import time
+
+from superset.utils.concurrency import with_app_context
+from superset.utils.single_flight import CacheLock
+
+
+def get_stale_timeout(datasource, default=None):
+    """Reads `cache_stale_timeout` from the datasource params or db extra"""
+    timeout = datasource.params_dict.get('cache_stale_timeout')
+    # druid clusters don't have extra settings
+    database = getattr(datasource, 'database', None)
+    if timeout is None and hasattr(database, 'get_extra'):
+        timeout = database.get_extra().get('cache_stale_timeout')
+    return timeout if timeout is not None else default
+
+
+def set_freshness(cache_value, cache_timeout, stale_timeout):
+    """Marks `cache_value` fresh for `cache_timeout` seconds
+
+    Returns the timeout to store the value with in the cache backend.
+    """
+    if not stale_timeout or not cache_timeout:
+        return cache_timeout
+    cache_value['fresh_until'] = time.time() + cache_timeout
+    return cache_timeout + stale_timeout
+
+
+def is_stale(cache_value):
+    fresh_until = cache_value.get('fresh_until')
+    return fresh_until is not None and fresh_until < time.time()
+
+
+def refresh_in_background(cache, cache_key, refresh, lock_timeout):
+    """Calls `refresh` in a thread unless a refresh of `cache_key` is running
+
+    The lock is the one used to coalesce queries on cache misses, so that a
+    refresh and a regular query for the same key never run concurrently.
+    Returns whether a refresh was started.
+    """
+    lock = CacheLock(cache, cache_key, lock_timeout)
+    try:
+        if not lock.acquire():
+            return False
+    except Exception as e:
+        logging.warning('Could not acquire refresh lock: {}'.format(e))
+        return False
+
+    def run():
+        try:
+            refresh()
+        except Exception as e:
+            logging.exception(e)
+        finally:
+            lock.release()
+
+    threading.Thread(target=with_app_context(run), daemon=True).start()
+    return True
@@ -0,0 +1,182 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Answering queries from cached results of broader queries
+
+A cached result subsumes a query identical but for:
+
+- its row limit, if the cached result wasn't truncated or if the query's row
+  limit is lower: rows come ordered by the main metric, so the first ones are
+  the same;
+- equality or IN filters on grouped dimensions, if the cached result wasn't
+  truncated and filtered those dimensions on a superset of the values (or
+  not at all): masking its rows gives the same result as filtering them in
+  the database, where filters apply before the grouping.
+
+Cached results are listed in an index (see `superset.utils.cache_index`)
+under the cache key of their query minus the row limit and those filters.
+Value comparisons are done in pandas, so databases comparing strings with
+case or accent insensitive collations may disagree on what matches. Boolean
+and temporal values have too many textual forms to compare that way, so
+filters on those dimensions always go to the database.
+"""
+import pandas as pd
+
+from superset.utils.cache_index import get_index
+
+NULL_STRING = '<NULL>'
+
+# inferred types of object columns whose values don't compare as strings
+UNMASKABLE_TYPES = {
+    'boolean', 'date', 'datetime', 'datetime64', 'mixed', 'period', 'time',
+    'timedelta', 'timedelta64',
+}
+
+
+def split_filters(query_obj):
+    """Splits the filters of `query_obj` into the ones that can be relaxed
+
+    Returns a dict of the grouped dimensions filtered with a single equality
+    or IN filter, mapped to their values, and the list of other filters.
+    """
+    dimensions = set(query_obj.get('groupby') or []) | \
+        set(query_obj.get('columns') or [])
+    relaxable = {}
+    others = []
+    cols = [flt.get('col') for flt in query_obj.get('filter') or []]
+    for flt in query_obj.get('filter') or []:
+        col = flt.get('col')
+        if (
+                col in dimensions and
+                cols.count(col) == 1 and
+                flt.get('op') in ('in', '==')):
+            val = flt.get('val')
+            relaxable[col] = list(val) if isinstance(val, (list, tuple)) else [val]
+        else:
+            others.append(flt)
+    return relaxable, others
+
+
+def relax(query_obj):
+    """Returns `query_obj` without its row limit and relaxable filters"""
+    _, others = split_filters(query_obj)
+    return dict(query_obj, row_limit=None, filter=others)
+
+
+def is_eligible(query_obj):
+    """Whether a query's results only depend on its rows, not on ranking
+
+    The rows of grouping sets queries don't carry the values of all the
+    grouped dimensions, so they can't be filtered further.
+    """
+    return not (
+        query_obj.get('timeseries_limit') or
+        query_obj.get('prequeries') or
+        query_obj.get('is_prequery') or
+        (query_obj.get('extras') or {}).get('grouping_sets'))
+
+
+def _values(values):
+    return {str(v) for v in values}
+
+
+def make_entry(cache_key, query_obj, df):
+    filters, _ = split_filters(query_obj)
+    return {
+        'key': cache_key,
+        'row_limit': query_obj.get('row_limit'),
+        'rowcount': len(df.index),
+        'filters': {col: sorted(_values(vals)) for col, vals in filters.items()},
+    }
+
+
+def match(entry, filters, row_limit):
+    """Returns how `entry` subsumes a query, `None` if it doesn't
+
+    That's either `'row_limit'` when only the row limits differ, or
+    `'filter'` when the query filters the cached rows further.
+    """
+    is_complete = not entry['row_limit'] or entry['rowcount'] < entry['row_limit']
+    cached_filters = entry['filters']
+    if set(cached_filters) - set(filters):
+        return None
+    if not all(
+            _values(filters[col]) <= set(vals)
+            for col, vals in cached_filters.items()):
+        return None
+    same_filters = set(filters) == set(cached_filters) and all(
+        _values(filters[col]) == set(vals)
+        for col, vals in cached_filters.items())
+    if same_filters:
+        if is_complete or (row_limit and row_limit <= entry['row_limit']):
+            return 'row_limit'
+        return None
+    return 'filter' if is_complete else None
+
+
+def find_source(cache, index_key, query_obj):
+    """Returns the smallest cached result subsuming a query and how it does"""
+    filters, _ = split_filters(query_obj)
+    entries = sorted(get_index(cache, index_key), key=lambda e: e['rowcount'])
+    for entry in entries:
+        kind = match(entry, filters, query_obj.get('row_limit'))
+        if kind:
+            return entry, kind
+    return None, None
+
+
+def is_maskable(series):
+    """Whether filter values compare to a column as they do in the database"""
+    if (
+            pd.api.types.is_bool_dtype(series) or
+            pd.api.types.is_datetime64_any_dtype(series) or
+            pd.api.types.is_timedelta64_dtype(series)):
+        return False
+    if series.dtype == object:
+        return pd.api.types.infer_dtype(series, skipna=True) not in UNMASKABLE_TYPES
+    return True
+
+
+def _mask(series, values):
+    has_null = NULL_STRING in values
+    values = [v for v in values if v != NULL_STRING]
+    if pd.api.types.is_numeric_dtype(series):
+        mask = series.isin(pd.to_numeric(pd.Series(values), errors='coerce'))
+    else:
+        mask = series.astype(str).isin(_values(values)) & series.notnull()
+    if has_null:
+        mask |= series.isnull()
+    return mask
+
+
+def apply(df, query_obj):
+    """Filters and limits a subsuming cached frame to answer `query_obj`
+
+    Returns `None` if the frame lacks one of the filtered dimensions, or if
+    one of them can't be filtered in pandas (see `is_maskable`).
+    """
+    filters, _ = split_filters(query_obj)
+    if not set(filters) <= set(df.columns):
+        return None
+    if not all(is_maskable(df[col]) for col in filters):
+        return None
+    for col, values in filters.items():
+        df = df[_mask(df[col], values)]
+    row_limit = query_obj.get('row_limit')
+    if row_limit:
+        df = df.head(row_limit)
+    return df.reset_index(drop=True)
@@ -0,0 +1,202 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""An in-process LRU tier in front of a shared Flask-Caching backend"""
+from collections import OrderedDict
+import pickle as pkl
+import threading
+import time
+
+
+class LocalLRUCache(object):
+    """A thread-safe LRU cache bounded both in entries and in bytes
+
+    Values are stored as bytes so that callers never share (and mutate) the
+    same object, which matches the semantics of the remote backends.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024,
+                 max_timeout=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_timeout = max_timeout
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _pop(self, key):
+        blob, _, _ = self._entries.pop(key)
+        self._size -= len(blob)
+
+    def get(self, key):
+        """Returns a tuple of (found, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            blob, is_pickled, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._pop(key)
+                return False, None
+            self._entries.move_to_end(key)
+        return True, pkl.loads(blob) if is_pickled else blob
+
+    def set(self, key, value, timeout=None):
+        """Stores `value` for `timeout` seconds, capped to `max_timeout`
+
+        Returns the number of entries evicted to make room for it.
+        """
+        is_pickled = not isinstance(value, bytes)
+        blob = pkl.dumps(value, protocol=pkl.HIGHEST_PROTOCOL) \
+            if is_pickled else value
+        timeouts = [t for t in (timeout, self.max_timeout) if t]
+        expires_at = time.time() + min(timeouts) if timeouts else None
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            if len(blob) > self.max_bytes:
+                return evicted
+            while self._entries and (
+                    len(self._entries) >= self.max_entries or
+                    self._size + len(blob) > self.max_bytes):
+                self._pop(next(iter(self._entries)))
+                evicted += 1
+            self._entries[key] = (blob, is_pickled, expires_at)
+            self._size += len(blob)
+        return evicted
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class TieredCache(object):
+    """Serves reads from a `LocalLRUCache` before hitting the shared backend
+
+    Writes go to both tiers. Any attribute not defined here is proxied to the
+    Flask-Caching object, so this can stand in wherever `superset.cache` is
+    used. Entries cached in other processes' local tiers can't be invalidated
+    from here, which is why local TTLs are capped by `max_timeout`.
+    """
+
+    def __init__(self, backend, local, stats_logger=None):
+        self.backend = backend
+        self.local = local
+        self.stats_logger = stats_logger
+
+    def _incr(self, key):
+        if self.stats_logger:
+            self.stats_logger.incr(key)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def get(self, key):
+        found, value = self.local.get(key)
+        if found:
+            self._incr('l1_cache_hit')
+            return value
+        self._incr('l1_cache_miss')
+        value = self.backend.get(key)
+        if value is not None:
+            self._set_local(key, value)
+        return value
+
+    def _set_local(self, key, value, timeout=None):
+        for _ in range(self.local.set(key, value, timeout)):
+            self._incr('l1_cache_evict')
+
+    def set(self, key, value, timeout=None):
+        result = self.backend.set(key, value, timeout=timeout)
+        if result:
+            self._set_local(key, value, timeout)
+        else:
+            # other processes can't see the value, so this one doesn't serve it
+            self.local.delete(key)
+        return result
+
+    def add(self, key, value, timeout=None):
+        result = self.backend.add(key, value, timeout=timeout)
+        if result:
+            self._set_local(key, value, timeout)
+        return result
+
+    def delete(self, key):
+        self.local.delete(key)
+        return self.backend.delete(key)
+
+    def delete_local(self, key):
+        self.local.delete(key)
+
+    def clear(self):
+        self.local.clear()
+        return self.backend.clear()
+
+
+def setup_tiered_cache(backend, cache_config, stats_logger=None):
+    """Wraps `backend` in a `TieredCache` if `CACHE_L1_MAX_ENTRIES` is set"""
+    max_entries = cache_config.get('CACHE_L1_MAX_ENTRIES')
+    if not max_entries:
+        return backend
+    local = LocalLRUCache(
+        max_entries=max_entries,
+        max_bytes=cache_config.get('CACHE_L1_MAX_BYTES', 64 * 1024 * 1024),
+        max_timeout=cache_config.get('CACHE_L1_MAX_TIMEOUT', 300),
+    )
+    return TieredCache(backend, local, stats_logger)
+
+
+def shared_tier(cache):
+    """Returns the backend shared across processes, bypassing the local tier"""
+    if isinstance(cache, TieredCache):
+        return cache.backend
+    return cache
+
+
+def evict_local(cache, key):
+    """Drops `key` from this process' local tier, if there's one"""
+    if isinstance(cache, TieredCache):
+        cache.delete_local(key)
+
+
+def has_key(cache, key):
+    """Whether `key` is cached, without fetching its value when possible"""
+    if isinstance(cache, TieredCache):
+        found, _ = cache.local.get(key)
+        if found:
+            return True
+        cache = cache.backend
+    # Flask-Caching objects don't proxy `has` to their werkzeug cache
+    backend = getattr(cache, 'cache', cache)
+    try:
+        return bool(backend.has(key))
+    except (AttributeError, NotImplementedError):
+        return cache.get(key) is not None
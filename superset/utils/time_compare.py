@@ -0,0 +1,70 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Answering the time comparisons of a time series with a single query
+
+A time series compared to the same series shifted in time runs a query per
+time window, which only differ by their time filter. When the windows are
+close together or overlap, a single query over their union reads fewer rows.
+It tags each row with the bitmask of the windows it falls in, and groups by
+that tag too, so that the rows of each window can be told apart. A time
+bucket straddling the bound of a window gets a row per tag, which are rolled
+up again, so only queries whose metrics are all additive qualify.
+"""
+from datetime import timedelta
+
+from superset.utils.core import DTTM_ALIAS, TIME_WINDOWS_ALIAS
+from superset.utils.rollup import roll_up
+
+
+def is_worth_scanning_together(windows, max_scan_ratio):
+    """Whether a single query over the union of `(start, end)` windows pays
+
+    That's when the union spans at most `max_scan_ratio` times the total
+    duration of the windows.
+    """
+    if len(windows) < 2 or not max_scan_ratio:
+        return False
+    span = max(end for _, end in windows) - min(start for start, _ in windows)
+    total = sum((end - start for start, end in windows), timedelta())
+    return span <= total * max_scan_ratio
+
+
+def split_windows(df, windows_count, groupby, aggregates, row_limit, order_desc):
+    """Splits the frame of a query over the union of windows per window
+
+    `aggregates` maps metric labels to the pandas functions rolling them up,
+    the first one being the main metric rows are ordered by. A window's frame
+    is `None` when it may differ from the one of the window's own query: when
+    it has more rows than `row_limit`, or when its rows can't be rolled up.
+    """
+    main_metric = next(iter(aggregates))
+    keys = list(groupby) + [DTTM_ALIAS]
+    tags = df[TIME_WINDOWS_ALIAS].astype('int64')
+    frames = []
+    for i in range(windows_count):
+        frame = df[(tags & (1 << i)) != 0].drop(TIME_WINDOWS_ALIAS, axis=1)
+        if frame.duplicated(keys).any():
+            frame = roll_up(frame, keys, aggregates, False, None, None)
+        if frame is not None and row_limit and len(frame.index) > row_limit:
+            frame = None
+        if frame is not None:
+            frame = frame.sort_values(
+                main_metric, ascending=not order_desc, kind='mergesort')
+            frame = frame.reset_index(drop=True)
+        frames.append(frame)
+    return frames
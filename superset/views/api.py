@@ -25,8 +25,9 @@ from superset.common.query_context import QueryContext
 from superset.legacy import update_time_range
 import superset.models.core as models
 from superset.models.core import Log
+from superset.tasks import async_queries
 from superset.utils import core as utils
-from .base import api, BaseSupersetView, handle_api_exception
+from .base import api, async_job_response, BaseSupersetView, handle_api_exception
 
 
 class Api(BaseSupersetView):
@@ -40,9 +41,15 @@ class Api(BaseSupersetView):
         Takes a query_obj constructed in the client and returns payload data response
         for the given query_obj.
         params: query_context: json_blob
+        params: async: 'true' to compute the payload on a Celery worker, see
+            `Superset.async_job`
         """
-        query_context = QueryContext(**json.loads(request.form.get('query_context')))
+        params = json.loads(request.form.get('query_context'))
+        query_context = QueryContext(**params)
         security_manager.assert_datasource_permission(query_context.datasource)
+        if request.form.get('async') == 'true' and async_queries.is_enabled():
+            job_id = async_queries.submit_job(async_queries.QUERY_CONTEXT, params)
+            return async_job_response(job_id, utils.QueryStatus.PENDING)
         payload_json = query_context.get_payload()
         return json.dumps(
             payload_json,
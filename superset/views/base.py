@@ -21,7 +21,9 @@ import logging
 import traceback
 from typing import Any, Dict
 
-from flask import abort, flash, g, get_flashed_messages, redirect, Response
+from flask import (
+    abort, flash, g, get_flashed_messages, redirect, Response, url_for,
+)
 from flask_appbuilder import BaseView, ModelView
 from flask_appbuilder.actions import action
 from flask_appbuilder.forms import DynamicForm
@@ -84,6 +86,15 @@ def data_payload_response(payload_json, has_error=False):
     return json_success(payload_json, status=status)
 
 
+def async_job_response(job_id, status):
+    """Points the client of a chart computed asynchronously to its results"""
+    return json_success(json.dumps({
+        'job_id': job_id,
+        'status': status,
+        'results_url': url_for('Superset.async_job', job_id=job_id),
+    }), status=202)
+
+
 def generate_download_headers(extension, filename=None):
     filename = filename if filename else datetime.now().strftime('%Y%m%d_%H%M%S')
     content_disp = 'attachment; filename={}.{}'.format(filename, extension)
@@ -15,8 +15,12 @@
 # specific language governing permissions and limitations
 # under the License.
 # pylint: disable=C,R,W
+from collections import OrderedDict
+import copy
 from datetime import datetime, timedelta
+from functools import partial
 import inspect
+import itertools
 import logging
 import os
 import re
@@ -26,7 +30,8 @@ from typing import List  # noqa: F401
 from urllib import parse
 
 from flask import (
-    abort, flash, g, Markup, redirect, render_template, request, Response, url_for,
+    abort, flash, g, Markup, redirect, render_template, request, Response,
+    stream_with_context, url_for,
 )
 from flask_appbuilder import expose, SimpleFormView
 from flask_appbuilder.actions import action
@@ -56,18 +61,25 @@ import superset.models.core as models
 from superset.models.sql_lab import Query
 from superset.models.user_attributes import UserAttribute
 from superset.sql_parse import ParsedQuery
+from superset.tasks import async_queries
 from superset.utils import core as utils
+from superset.utils import cost_estimates
 from superset.utils import dashboard_import_export
+from superset.utils.concurrency import run_in_pools, with_app_context
 from superset.utils.dates import now_as_float
 from superset.utils.decorators import etag_cache
+from superset.utils.query_cancellation import get_request_queries
 from .base import (
-    api, BaseSupersetView,
+    api, async_job_response, BaseSupersetView,
     check_ownership,
     CsvResponse, data_payload_response, DeleteMixin, generate_download_headers,
     get_error_msg, handle_api_exception, json_error_response, json_success,
     SupersetFilter, SupersetModelView, YamlExportMixin,
 )
-from .utils import bootstrap_user_data, get_datasource_info, get_form_data, get_viz
+from .utils import (
+    bootstrap_user_data, get_dashboard_form_data, get_datasource_info, get_form_data,
+    get_viz,
+)
 
 config = app.config
 CACHE_DEFAULT_TIMEOUT = config.get('CACHE_DEFAULT_TIMEOUT', 0)
@@ -143,6 +155,59 @@ def check_slice_perms(self, slice_id):
     security_manager.assert_datasource_permission(viz_obj.datasource)
 
 
+def chart_payload_json(slice_id, payload_json, has_error):
+    return json.dumps({
+        'slice_id': slice_id,
+        'has_error': has_error,
+        'payload': json.RawJSON(payload_json),
+    })
+
+
+def error_payload_json(e):
+    return json.dumps({
+        'error': utils.error_msg_from_exception(e),
+        'status': QueryStatus.FAILED,
+        'stacktrace': traceback.format_exc(),
+    })
+
+
+def get_pool_key(datasource):
+    """Charts share a pool of threads per database"""
+    database = getattr(datasource, 'database', None)
+    if database:
+        return ('database', database.id)
+    return (datasource.type, datasource.id)
+
+
+def get_chart_payloads(charts):
+    """Returns the JSON payloads of charts running the same query
+
+    `charts` is a list of `(slice_id, viz_obj, query_obj)`. Meant to run in a
+    worker thread, so the datasource gets reloaded in the thread's own
+    database session. The query runs once, for all the charts, and extra
+    queries run one after the other so the thread pool of the database stays
+    the only bound on its concurrent queries.
+    """
+    datasource = charts[0][1].datasource
+    datasource = ConnectorRegistry.get_datasource(
+        datasource.type, datasource.id, db.session)
+    df_payload = None
+    results = []
+    for slice_id, viz_obj, query_obj in charts:
+        viz_obj.datasource = datasource
+        viz_obj.run_extras_concurrently = False
+        try:
+            if df_payload is None and len(charts) > 1:
+                df_payload = viz_obj.get_df_payload(copy.deepcopy(query_obj))
+            payload = viz_obj.get_payload(query_obj, df_payload)
+            payload_json, has_error = viz_obj.payload_json_and_has_error(payload)
+        except Exception as e:
+            logging.exception(e)
+            payload_json, has_error = error_payload_json(e), True
+        results.append(chart_payload_json(slice_id, payload_json, has_error))
+    return results
+
+
 class SliceFilter(SupersetFilter):
     def apply(self, query, func):  # noqa
         if security_manager.all_datasource_access():
@@ -269,7 +334,36 @@ class DatabaseView(SupersetModelView, DeleteMixin, YamlExportMixin):  # noqa
             'Specify it as **"schemas_allowed_for_csv_upload": '
             '["public", "csv_upload"]**. '
             'If database flavor does not support schema or any schema is allowed '
-            'to be accessed, just leave the list empty', True),
+            'to be accessed, just leave the list empty.<br/>'
+            '4. The ``cache_stale_timeout`` is the number of seconds cached chart '
+            'data keeps being served after its cache timeout, while it is '
+            'refreshed in the background. Specify it as '
+            '**"cache_stale_timeout": 3600**.<br/>'
+            '5. The ``query_concurrency`` is the number of queries of a same '
+            'chart (like the columns of a filter box) that can run at once '
+            'against this database. Specify it as **"query_concurrency": 4**.<br/>'
+            '6. The ``connection_pool`` makes the queries of a web server share a '
+            'pool of connections to this database, on top of the '
+            '``DEFAULT_DB_CONNECTION_POOL`` settings. Specify it as '
+            '**"connection_pool": {"pool_size": 5, "max_overflow": 10, '
+            '"pool_recycle": 3600, "pool_timeout": 30, "pre_ping": true}**, '
+            'or as **"connection_pool": null** to open a connection per query.<br/>'
+            '7. The ``admission_control`` limits how many chart queries run at once '
+            'against this database. The other queries wait for their turn, taken '
+            'per user or per dashboard, for up to ``max_wait`` seconds. Specify it '
+            'as **"admission_control": {"max_queries": 8, "max_wait": 30, '
+            '"fair_by": "dashboard", "distributed": true}**, where '
+            '``distributed`` counts the queries of all the web servers.<br/>'
+            '8. The ``query_timeout`` is the number of seconds after which chart '
+            'queries are cancelled, when the database supports it. Specify it as '
+            '**"query_timeout": 60**.<br/>'
+            '9. The ``cost_guardrails`` warn about, ask to confirm or refuse the '
+            'chart and SQL Lab queries estimated to read more rows or bytes than '
+            'their thresholds, when the database can estimate them (Presto and '
+            'Postgres). Specify them as **"cost_guardrails": '
+            '{"warn": {"bytes": 10000000000}, "confirm": {"bytes": 100000000000}, '
+            '"refuse": {"rows": 10000000000}}**.',
+            True),
         'impersonate_user': _(
             'If Presto, all the queries in SQL Lab are going to be executed as the '
             'currently logged on user who must have permission to run them.<br/>'
@@ -1245,6 +1339,7 @@ class Superset(BaseSupersetView):
         results = request.args.get('results') == 'true'
         samples = request.args.get('samples') == 'true'
         force = request.args.get('force') == 'true'
+        is_async = request.args.get('async') == 'true'
 
         form_data = get_form_data()[0]
         datasource_id, datasource_type = get_datasource_info(
@@ -1256,6 +1351,20 @@ class Superset(BaseSupersetView):
             force=force,
         )
 
+        # charts whose results are cached are served right away
+        if (
+                is_async and
+                async_queries.is_enabled() and
+                not (csv or query or results or samples) and
+                (force or not async_queries.is_cached(viz_obj))):
+            job_id = async_queries.submit_job(async_queries.CHART, {
+                'datasource_type': datasource_type,
+                'datasource_id': datasource_id,
+                'form_data': form_data,
+                'force': force,
+            })
+            return async_job_response(job_id, utils.QueryStatus.PENDING)
+
         return self.generate_json(
             viz_obj,
             csv=csv,
@@ -1264,6 +1373,39 @@ class Superset(BaseSupersetView):
             samples=samples,
         )
 
+    @api
+    @has_access_api
+    @handle_api_exception
+    @expose('/async_job/<job_id>/')
+    def async_job(self, job_id):
+        """Serves the payload of a chart computed asynchronously
+
+        Answers with a 202 while the job is still pending or running. With
+        `wait`, waits up to that many seconds for the job to finish first."""
+        job = async_queries.get_job(job_id)
+        if not job or job['username'] != getattr(g.user, 'username', None):
+            return json_error_response(
+                'Job {} not found, it may have expired'.format(job_id), status=404)
+        security_manager.assert_datasource_permission(
+            async_queries.get_datasource(job['kind'], job['params']))
+
+        wait = min(
+            float(request.args.get('wait') or 0),
+            config.get('ASYNC_QUERY_MAX_WAIT'))
+        job = async_queries.wait_for_job(job_id, wait) or job
+        if job['status'] in (utils.QueryStatus.PENDING, utils.QueryStatus.RUNNING):
+            return async_job_response(job_id, job['status'])
+
+        if job['status'] == utils.QueryStatus.FAILED:
+            payload_json, has_error = job['payload_json'], True
+        else:
+            # the job cached its results
+            payload_json, has_error = async_queries.build_payload(
+                job['kind'], job['params'], force=False)
+        if job['kind'] == async_queries.QUERY_CONTEXT:
+            return json_success(payload_json)
+        return data_payload_response(payload_json, has_error)
+
     @log_this
     @has_access
     @expose('/import_dashboards', methods=['GET', 'POST'])
@@ -2137,6 +2279,28 @@ class Superset(BaseSupersetView):
             [{'slice_id': slc.id, 'slice_name': slc.slice_name}
              for slc in slices]))
 
+    @api
+    @has_access_api
+    @handle_api_exception
+    @expose(
+        '/invalidate_cache/<datasource_type>/<datasource_id>/', methods=['POST'])
+    def invalidate_cache(self, datasource_type, datasource_id):
+        """Invalidates the cached data of all the charts of a datasource.
+
+        Meant to be called once the data of the datasource has been reloaded.
+        """
+        datasource = ConnectorRegistry.get_datasource(
+            datasource_type, datasource_id, db.session)
+        if not datasource:
+            return json_error_response(__(
+                'Datasource %(id)s not found', id=datasource_id), status=404)
+        security_manager.assert_datasource_permission(datasource)
+        datasource.invalidate_cache()
+        return json_success(json.dumps({
+            'datasource': datasource.uid,
+            'cache_generation': datasource.cache_generation,
+        }))
+
     @has_access_api
     @expose('/favstar/<class_name>/<obj_id>/<action>/')
     def favstar(self, class_name, obj_id, action):
@@ -2245,6 +2409,108 @@ class Superset(BaseSupersetView):
             bootstrap_data=json.dumps(bootstrap_data),
         )
 
+    @log_this
+    @api
+    @has_access_api
+    @handle_api_exception
+    @expose('/dashboard_data/<dashboard_id>/', methods=['GET', 'POST'])
+    def dashboard_data(self, dashboard_id):
+        """Streams the payloads of all the charts of a dashboard
+
+        Serves what `explore_json` would for each chart, in a single request.
+        Optional arguments, in the query string or the POST body:
+
+        - `filters`: the active dashboard filters, as in the `default_filters`
+          of the dashboard metadata, which they default to;
+        - `form_data`: form data overrides, as `{slice_id: form_data}`;
+        - `slice_ids`: the charts to compute, all of them by default;
+        - `force`: `true` to bypass the cache;
+        - `format`: `ndjson` to stream a line of JSON per chart, or `json` to
+          stream a JSON list.
+
+        Charts running the same query share a single run of it. Queries run
+        concurrently, up to the `query_concurrency` of their database, and
+        each chart is sent as soon as its payload is ready, as
+        `{"slice_id", "has_error", "payload"}`.
+        """
+        def get_json_arg(name, default=None):
+            value = request.form.get(name) or request.args.get(name)
+            return json.loads(value) if value else default
+
+        qry = db.session.query(models.Dashboard)
+        if dashboard_id.isdigit():
+            qry = qry.filter_by(id=int(dashboard_id))
+        else:
+            qry = qry.filter_by(slug=dashboard_id)
+        dash = qry.one_or_none()
+        if not dash:
+            return json_error_response(__('Dashboard not found'), status=404)
+
+        filters = get_json_arg('filters')
+        if filters is None:
+            filters = json.loads(dash.params_dict.get('default_filters') or '{}')
+        form_data_overrides = get_json_arg('form_data', {})
+        slice_ids = get_json_arg('slice_ids')
+        force = (request.form.get('force') or request.args.get('force')) == 'true'
+        ndjson = (request.form.get('format') or request.args.get('format')) != 'json'
+
+        errors = []
+        charts_by_query = OrderedDict()
+        for slc in dash.slices:
+            if slice_ids is not None and slc.id not in slice_ids:
+                continue
+            try:
+                datasource = slc.datasource
+                if not datasource:
+                    raise SupersetException(DATASOURCE_MISSING_ERR)
+                security_manager.assert_datasource_permission(datasource)
+                form_data = get_dashboard_form_data(
+                    dash, slc, filters, form_data_overrides.get(str(slc.id)))
+                viz_obj = viz.viz_types[form_data.get('viz_type')](
+                    datasource, form_data=form_data, force=force)
+                query_obj = viz_obj.query_obj()
+                key = viz_obj.cache_key(query_obj) if query_obj else slc.id
+            except Exception as e:
+                logging.exception(e)
+                errors.append(chart_payload_json(slc.id, error_payload_json(e), True))
+                continue
+            charts_by_query.setdefault(key, []).append((slc.id, viz_obj, query_obj))
+
+        tasks = []
+        pool_sizes = {}
+        for charts in charts_by_query.values():
+            viz_obj = charts[0][1]
+            pool_key = get_pool_key(viz_obj.datasource)
+            pool_sizes[pool_key] = viz_obj.query_concurrency
+            tasks.append(
+                (pool_key, with_app_context(partial(get_chart_payloads, charts))))
+
+        request_queries = get_request_queries()
+
+        def generate():
+            chunks = itertools.chain(errors, (
+                chunk
+                for index, results in run_in_pools(tasks, pool_sizes)
+                for chunk in results
+            ))
+            try:
+                if ndjson:
+                    for chunk in chunks:
+                        yield chunk + '\n'
+                else:
+                    yield '['
+                    for i, chunk in enumerate(chunks):
+                        yield (',' if i else '') + chunk
+                    yield ']'
+            except GeneratorExit:
+                # the client went away, its queries are cancelled
+                request_queries.cancel('disconnect')
+                raise
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson' if ndjson else 'application/json')
+
     @api
     @log_this
     @expose('/log/', methods=['POST'])
@@ -2516,6 +2782,35 @@ class Superset(BaseSupersetView):
             pass
         return self.json_response('OK')
 
+    @has_access_api
+    @expose('/estimate_query_cost/<database_id>/', methods=['POST'])
+    @log_this
+    def estimate_query_cost(self, database_id):
+        """Estimates what a SQL Lab query would read, along with the verdict
+        of the guardrails of its database"""
+        sql = request.form.get('sql')
+        schema = request.form.get('schema') or None
+        template_params = json.loads(request.form.get('templateParams') or '{}')
+        mydb = db.session.query(models.Database).filter_by(id=database_id).first()
+        if not mydb:
+            return json_error_response(
+                'Database with id {} is missing.'.format(database_id), status=404)
+        rejected_tables = security_manager.rejected_datasources(sql, mydb, schema)
+        if rejected_tables:
+            return json_error_response(
+                security_manager.get_table_access_error_msg(rejected_tables),
+                link=security_manager.get_table_access_link(rejected_tables),
+                status=403)
+        try:
+            template_processor = get_template_processor(database=mydb)
+            sql = template_processor.process_template(sql, **template_params)
+        except Exception as e:
+            return json_error_response(
+                'Template rendering failed: {}'.format(utils.error_msg_from_exception(e)))
+        estimate = cost_estimates.evaluate(
+            mydb, sql, schema, user_name=g.user.username if g.user else None)
+        return json_success(json.dumps({'estimate': estimate}))
+
     @has_access_api
     @expose('/sql_json/', methods=['POST', 'GET'])
     @log_this
@@ -2571,6 +2866,8 @@ class Superset(BaseSupersetView):
             user_id=g.user.get_id() if g.user else None,
             client_id=client_id,
         )
+        if request.form.get('confirm_cost') == 'true':
+            query.set_extra_json_key('cost_confirmed', True)
         session.add(query)
         session.flush()
         query_id = query.id
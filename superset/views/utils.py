@@ -184,3 +184,45 @@ def get_datasource_info(datasource_id, datasource_type, form_data):
             'The datasource associated with this chart no longer exists')
     datasource_id = int(datasource_id)
     return datasource_id, datasource_type
+
+
+def get_effective_extra_filters(dashboard_metadata, filters, slice_id):
+    """Returns the dashboard filters applying to a chart
+
+    `filters` maps the ids of the filtering charts to their `{col: values}`
+    selections, as in the `default_filters` of the dashboard metadata. Port
+    of `getEffectiveExtraFilters` in the dashboard javascript code.
+    """
+    immune_slices = dashboard_metadata.get('filter_immune_slices') or []
+    if slice_id in immune_slices:
+        return []
+    immune_fields = (
+        dashboard_metadata.get('filter_immune_slice_fields') or {}
+    ).get(str(slice_id)) or []
+    effective_filters = []
+    for filtering_slice_id, selection in filters.items():
+        # filters applied by the slice don't apply to itself
+        if filtering_slice_id == str(slice_id):
+            continue
+        for col, val in selection.items():
+            if col not in immune_fields:
+                effective_filters.append({'col': col, 'op': 'in', 'val': val})
+    return effective_filters
+
+
+def get_dashboard_form_data(dashboard, slc, filters, form_data=None):
+    """Returns the form data of a chart as the dashboard would query it
+
+    `form_data` overrides the form data saved with the chart, including the
+    `extra_filters` derived from the dashboard `filters`.
+    """
+    slice_form_data = dashboard.apply_form_data_defaults(slc.form_data.copy())
+    slice_form_data['extra_filters'] = get_effective_extra_filters(
+        dashboard.params_dict, filters, slc.id)
+    slice_form_data.update({
+        k: v
+        for k, v in (form_data or {}).items()
+        if k not in FORM_DATA_KEY_BLACKLIST
+    })
+    update_time_range(slice_form_data)
+    return slice_form_data
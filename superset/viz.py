@@ -21,15 +21,15 @@ These objects represent the backend of all the visualizations that
 Superset can render.
 """
 from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import copy
 from datetime import datetime, timedelta
-from functools import reduce
+from functools import partial, reduce
 import hashlib
 import inspect
 from itertools import product
 import logging
 import math
-import pickle as pkl
 import re
 import traceback
 import uuid
@@ -46,19 +46,46 @@ from pandas.tseries.frequencies import to_offset
 import polyline
 import simplejson as json
 
-from superset import app, cache, get_css_manifest_files
+from superset import app, cache, db, get_css_manifest_files
+from superset.connectors.connector_registry import ConnectorRegistry
 from superset.exceptions import NullValueException, SpatialException
-from superset.utils import core as utils
+from superset.utils import core as utils, subsumption
+from superset.utils.cache_codecs import decode_raw, encode_raw, get_cache_codec
+from superset.utils.cache_index import register
+from superset.utils.cache_keys import canonicalize, project_columns
+from superset.utils.concurrency import with_app_context
 from superset.utils.core import (
     DTTM_ALIAS,
     JS_MAX_INTEGER,
     merge_extra_filters,
     to_adhoc,
 )
+from superset.utils.incremental_cache import (
+    get_buckets,
+    get_fetch_ranges,
+    is_aligned,
+    is_supported_grain,
+)
+from superset.utils.rollup import (
+    find_sources,
+    get_metric_definition,
+    get_rollup_aggregate,
+    roll_up,
+)
+from superset.utils.single_flight import SingleFlight
+from superset.utils.stale_cache import (
+    get_stale_timeout,
+    is_stale,
+    refresh_in_background,
+    set_freshness,
+)
+from superset.utils.tiered_cache import evict_local, has_key
+from superset.utils.time_compare import is_worth_scanning_together, split_windows
 
 
 config = app.config
 stats_logger = config.get('STATS_LOGGER')
+cache_codec = get_cache_codec(config.get('CACHE_CONFIG'))
 relative_end = config.get('DEFAULT_RELATIVE_END_TIME', 'today')
 
 METRIC_KEYS = [
@@ -99,6 +126,10 @@ class BaseViz(object):
         self.results = None
         self.error_message = None
         self.force = force
+        # confirms queries the cost guardrails of the database ask to confirm
+        self.cost_confirmed = bool(self.form_data.get('confirm_cost'))
+        # False when the viz already runs in a pool of its database's threads
+        self.run_extras_concurrently = True
 
         # Keeping track of whether some data came from cache
         # this is useful to trigger the <CachedLabel /> when
@@ -107,7 +138,14 @@ class BaseViz(object):
         self._some_from_cache = False
         self._any_cache_key = None
         self._any_cached_dttm = None
+        self._any_stale = False
+        # seconds the queries waited for the database to admit them
+        self._queue_wait = 0
+        # what the main query was estimated to read, if it was
+        self._cost_estimate = None
         self._extra_chart_data = []
+        # frames fetched ahead of their queries, by cache key
+        self._prefetched_dfs = {}
 
         self.process_metrics()
 
@@ -160,9 +198,139 @@ class BaseViz(object):
         it with a bit of a hack. Note that the hack became necessary
         when moving from caching the visualization's data itself, to caching
         the underlying query(ies).
+
+        Visualizations can instead list their queries in `extra_queries` and
+        consume the resulting payloads in `process_extra_payloads`, which lets
+        `get_payload` run them concurrently with the main query.
         """
+        queries = self.extra_queries()
+        if queries:
+            self.process_extra_payloads(
+                queries, [self.get_df_payload(q, **kwargs) for q, kwargs in queries])
+
+    def extra_queries(self):
+        """Returns the `(query_obj, kwargs)` of the extra queries to run"""
+        return []
+
+    def process_extra_payloads(self, queries, payloads):
+        """Consumes the payloads of `extra_queries`, in the same order"""
         pass
 
+    @property
+    def query_concurrency(self):
+        """How many of the viz's queries can run at once"""
+        # druid clusters don't have extra settings
+        database = getattr(self.datasource, 'database', None)
+        concurrency = database.get_extra().get('query_concurrency') \
+            if hasattr(database, 'get_extra') else None
+        if not isinstance(concurrency, int):
+            concurrency = config.get('DEFAULT_QUERY_CONCURRENCY')
+        return max(concurrency or 1, 1)
+
+    def get_extra_df_payload(self, query_obj, **kwargs):
+        """Runs `get_df_payload` on a copy of the viz, from a worker thread
+
+        The datasource is reloaded in the worker's own database session, as
+        sessions can't be shared across threads.
+        """
+        viz_obj = copy.copy(self)
+        viz_obj.datasource = ConnectorRegistry.get_datasource(
+            self.datasource.type, self.datasource.id, db.session)
+        viz_obj._queue_wait = 0
+        try:
+            return viz_obj.get_df_payload(query_obj, **kwargs)
+        except Exception as e:
+            logging.exception(e)
+            return {
+                'cache_key': None,
+                'cached_dttm': None,
+                'df': None,
+                'error': utils.error_msg_from_exception(e),
+                'is_cached': False,
+                'is_stale': False,
+                'query': viz_obj.query,
+                'status': utils.QueryStatus.FAILED,
+                'stacktrace': traceback.format_exc(),
+            }
+
+    def merge_cache_metadata(self, payload, extra_payloads):
+        """Makes `payload` reflect that some extra payloads came from cache"""
+        for extra_payload in extra_payloads:
+            if extra_payload.get('is_cached') and self._any_cache_key is None:
+                self._any_cache_key = extra_payload['cache_key']
+                self._any_cached_dttm = extra_payload['cached_dttm']
+            self._any_stale = self._any_stale or bool(extra_payload.get('is_stale'))
+            self._queue_wait += extra_payload.get('queue_wait') or 0
+        payload.update({
+            'cache_key': self._any_cache_key,
+            'cached_dttm': self._any_cached_dttm,
+            'is_cached': self._any_cache_key is not None,
+            'is_stale': self._any_stale,
+            'queue_wait': self._queue_wait,
+        })
+
+    def adopt_df_payload(self, query_obj, df_payload):
+        """Takes over the main payload of a viz running the same query
+
+        The frame is copied, as `get_data` implementations may alter it.
+        """
+        if not query_obj:
+            query_obj = self.query_obj()
+        df = df_payload.get('df')
+        if df is not None:
+            df = project_columns(df.copy(), query_obj)
+        self.query = df_payload.get('query')
+        self.status = df_payload.get('status')
+        self.error_message = df_payload.get('error')
+        payload = dict(
+            df_payload,
+            cache_timeout=self.cache_timeout,
+            df=df,
+            form_data=self.form_data)
+        self.merge_cache_metadata(payload, [df_payload])
+        return payload
+
+    def get_df_payload_with_extras(self, query_obj=None, df_payload=None):
+        """Runs the extra queries and the main one, returns the main payload
+
+        When the database allows more than one query at once, the extra
+        queries run in a thread pool while the main one runs in the current
+        thread. Each worker gets its own copy of the viz, so that the state
+        `get_df_payload` keeps on it doesn't get mixed up between queries,
+        and failing extra queries only fail their own payload.
+
+        When the main payload is given, or when the viz already runs in a
+        pool of threads sized to the database (`run_extras_concurrently`),
+        the caller is in charge of the concurrency and the extra queries run
+        one after the other.
+        """
+        if df_payload is not None:
+            self.run_extra_queries()
+            return self.adopt_df_payload(query_obj, df_payload)
+        concurrency = self.query_concurrency if self.run_extras_concurrently else 1
+        extra_queries = self.extra_queries() if concurrency > 1 else []
+        if not extra_queries:
+            self.run_extra_queries()
+            return self.get_df_payload(query_obj)
+
+        if not query_obj:
+            query_obj = self.query_obj()
+        with ThreadPoolExecutor(
+                max_workers=min(concurrency - 1, len(extra_queries))) as executor:
+            futures = [
+                executor.submit(
+                    with_app_context(self.get_extra_df_payload), q, **kwargs)
+                for q, kwargs in extra_queries
+            ]
+            payload = self.get_df_payload(query_obj)
+            extra_payloads = [future.result() for future in futures]
+        for extra_payload in extra_payloads:
+            if extra_payload.get('error'):
+                logging.warning('Extra query failed: {}'.format(extra_payload['error']))
+        self.process_extra_payloads(extra_queries, extra_payloads)
+        self.merge_cache_metadata(payload, extra_payloads)
+        return payload
+
     def get_samples(self):
         query_obj = self.query_obj()
         query_obj.update({
@@ -190,10 +358,13 @@ class BaseViz(object):
                 timestamp_format = dttm_col.python_date_format
 
         # The datasource here can be different backend but the interface is common
-        self.results = self.datasource.query(query_obj)
+        self.results = self.datasource.query(
+            query_obj, cost_confirmed=self.cost_confirmed)
         self.query = self.results.query
         self.status = self.results.status
         self.error_message = self.results.error_message
+        self._queue_wait += self.results.queue_wait
+        self._cost_estimate = self.results.cost_estimate
 
         df = self.results.df
         # Transform the timestamp we received from database to pandas supported
@@ -296,6 +467,8 @@ class BaseViz(object):
             'having_druid': form_data.get('having_filters', []),
             'time_grain_sqla': form_data.get('time_grain_sqla', ''),
             'druid_time_origin': form_data.get('druid_time_origin', ''),
+            # None leaves it to the datasource
+            'approximate': form_data.get('approximate'),
         }
 
         d = {
@@ -328,6 +501,11 @@ class BaseViz(object):
             return self.datasource.database.cache_timeout
         return config.get('CACHE_DEFAULT_TIMEOUT')
 
+    @property
+    def cache_stale_timeout(self):
+        return get_stale_timeout(
+            self.datasource, config.get('CACHE_STALE_TIMEOUT'))
+
     def get_json(self):
         return json.dumps(
             self.get_payload(),
@@ -345,22 +523,449 @@ class BaseViz(object):
         The `extra` arguments are currently used by time shift queries, since
         different time shifts wil differ only in the `from_dttm` and `to_dttm`
         values which are stripped.
+
+        The datasource's cache generation is part of the key, so that all the
+        cached payloads of a datasource can be invalidated at once.
+
+        A `time_range` in `extra` overrides the user-provided one, which lets
+        time buckets be cached independently of the range they were queried
+        for.
+
+        Query objects are put in a canonical form first, so that queries only
+        differing by the order of their groupby, filters or metrics share the
+        same key. `get_df_payload` puts the columns of the frames it returns
+        back in the requested order.
         """
         cache_dict = copy.copy(query_obj)
         cache_dict.update(extra)
 
         for k in ['from_dttm', 'to_dttm']:
             del cache_dict[k]
+        cache_dict = canonicalize(cache_dict)
 
-        cache_dict['time_range'] = self.form_data.get('time_range')
+        cache_dict.setdefault('time_range', self.form_data.get('time_range'))
         cache_dict['datasource'] = self.datasource.uid
+        cache_dict['datasource_generation'] = self.datasource.cache_generation
         json_data = self.json_dumps(cache_dict, sort_keys=True)
         return hashlib.md5(json_data.encode('utf-8')).hexdigest()
 
-    def get_payload(self, query_obj=None):
-        """Returns a payload of metadata and data"""
-        self.run_extra_queries()
-        payload = self.get_df_payload(query_obj)
+    @property
+    def data_cache_enabled(self):
+        return bool(cache) and (
+            self.cache_type == 'get_data' or
+            (config.get('CACHE_CONFIG') or {}).get('CACHE_GET_DATA'))
+
+    def data_cache_key(self):
+        """
+        The cache key of the output of `get_data`.
+
+        Queries, including extra ones, are all derived from the `form_data`,
+        and `get_data` only reads the fields of `form_data` that don't make it
+        to the query objects, so the key is made out of the base query's cache
+        key plus the whole `form_data`.
+        """
+        try:
+            query_obj = BaseViz.query_obj(self)
+            return 'data_' + self.cache_key(query_obj, form_data=self.form_data)
+        except Exception as e:
+            logging.warning('Could not build data cache key: {}'.format(e))
+            return None
+
+    def get_data_payload_from_cache(self, data_cache_key):
+        """Returns the payload cached by `set_data_payload_cache`, if any"""
+        cache_value = cache.get(data_cache_key)
+        if not cache_value:
+            return None
+        try:
+            payload, data = decode_raw(cache_value)
+        except Exception as e:
+            logging.exception(e)
+            return None
+        stats_logger.incr('loaded_data_from_cache')
+        payload.update({
+            'data': json.RawJSON(data.decode('utf-8')),
+            'form_data': self.form_data,
+            'is_cached': True,
+        })
+        return payload
+
+    def set_data_payload_cache(self, data_cache_key, payload):
+        """Serializes `payload['data']` once, caching it when it is final"""
+        data = self.json_dumps(payload['data'])
+        payload['data'] = json.RawJSON(data)
+        if payload.get('error') or payload.get('is_stale'):
+            return
+        try:
+            cache_value = encode_raw(
+                {
+                    k: v for k, v in payload.items()
+                    if k not in ('data', 'form_data')
+                },
+                data.encode('utf-8'),
+            )
+            stats_logger.incr('set_data_cache_key')
+            cache.set(data_cache_key, cache_value, timeout=self.cache_timeout)
+        except Exception as e:
+            logging.warning('Could not cache key {}'.format(data_cache_key))
+            logging.exception(e)
+
+    @property
+    def incremental_cache_enabled(self):
+        return bool(cache) and bool(
+            (config.get('CACHE_CONFIG') or {}).get('CACHE_INCREMENTAL'))
+
+    def incremental_buckets(self, query_obj):
+        """Returns the time buckets of a query that can be cached separately
+
+        Only plain time series queries on tables qualify: limiting the number
+        of series or ordering on arbitrary columns requires the whole range to
+        be queried at once.
+        """
+        if not (
+                self.incremental_cache_enabled and
+                self.datasource.type == 'table' and
+                query_obj.get('is_timeseries') and
+                query_obj.get('granularity') and
+                query_obj.get('from_dttm') and
+                query_obj.get('to_dttm') and
+                not query_obj.get('timeseries_limit') and
+                not query_obj.get('orderby') and
+                not query_obj.get('columns') and
+                not query_obj.get('prequeries')):
+            return None
+        time_grain = (query_obj.get('extras') or {}).get('time_grain_sqla')
+        if not is_supported_grain(time_grain):
+            return None
+        cache_config = config.get('CACHE_CONFIG') or {}
+        # the latest buckets may still be receiving rows
+        closed_before = datetime.now() - timedelta(
+            seconds=cache_config.get('CACHE_INCREMENTAL_LAG', 0))
+        return get_buckets(
+            query_obj['from_dttm'],
+            query_obj['to_dttm'],
+            time_grain,
+            closed_before,
+            cache_config.get('CACHE_INCREMENTAL_MAX_BUCKETS', 1000))
+
+    @property
+    def label_shift(self):
+        """How much `get_df` moves the timestamps it gets from the database"""
+        return timedelta(hours=self.datasource.offset or 0) + self.time_shift
+
+    def bucket_cache_key(self, query_obj, start, end):
+        query_obj = {
+            k: v for k, v in query_obj.items()
+            if k not in ('inner_from_dttm', 'inner_to_dttm')
+        }
+        return 'bucket_' + self.cache_key(
+            query_obj,
+            time_range=None,
+            bucket=[start, end],
+            label_shift=self.label_shift.total_seconds())
+
+    def get_df_incremental(self, query_obj, buckets):
+        """Returns the same dataframe as `get_df`, reusing cached time buckets
+
+        The rows of the `buckets` found in the cache are concatenated with the
+        ones queried for the rest of the time range, and the buckets that were
+        queried are cached for the next time.
+        """
+        shift = self.label_shift
+        keys = dict(
+            (bucket, self.bucket_cache_key(query_obj, *bucket))
+            for bucket in buckets)
+        cached = OrderedDict()
+        if not self.force:
+            try:
+                values = cache.get_many(*keys.values())
+            except Exception as e:
+                logging.warning('Could not read time buckets: {}'.format(e))
+                values = []
+            for bucket, value in zip(keys, values):
+                if not value:
+                    continue
+                try:
+                    cached[bucket] = cache_codec.decode(value)['df']
+                except Exception as e:
+                    logging.exception(e)
+        if cached:
+            stats_logger.incr('loaded_from_incremental_cache')
+
+        from_dttm = query_obj['from_dttm']
+        to_dttm = query_obj['to_dttm']
+        row_limit = query_obj.get('row_limit')
+        cached_dttm = datetime.utcnow().isoformat().split('.')[0]
+        frames = list(cached.values())
+        queries = []
+        for range_from, range_to in get_fetch_ranges(from_dttm, to_dttm, cached):
+            df = self.get_df(dict(query_obj, from_dttm=range_from, to_dttm=range_to))
+            if self.status == utils.QueryStatus.FAILED:
+                return df
+            if df is None or DTTM_ALIAS not in df.columns:
+                return self.get_df(query_obj)
+            if row_limit and len(df.index) >= row_limit:
+                # the range got truncated, only the whole query is accurate
+                return self.get_df(query_obj)
+            queries.append(self.query)
+
+            groups = dict(list(df.groupby(DTTM_ALIAS)))
+            time_grain = query_obj['extras']['time_grain_sqla']
+            if not all(is_aligned(label - shift, time_grain) for label in groups):
+                logging.warning('Time buckets are not aligned on the time grain')
+                return self.get_df(query_obj)
+            if range_to != to_dttm:
+                # rows at the upper bound belong to the next bucket
+                df = df[df[DTTM_ALIAS] < range_to + shift]
+            frames.append(df)
+
+            for bucket, key in keys.items():
+                start, end = bucket
+                if bucket in cached or start < range_from or end > range_to:
+                    continue
+                bucket_df = groups.get(pd.Timestamp(start + shift), df.iloc[0:0])
+                try:
+                    cache.set(
+                        key,
+                        cache_codec.encode(dict(
+                            dttm=cached_dttm,
+                            df=bucket_df.reset_index(drop=True),
+                        )),
+                        timeout=self.cache_timeout)
+                except Exception as e:
+                    logging.warning('Could not cache key {}'.format(key))
+                    logging.exception(e)
+
+        self.query = ';\n\n'.join(queries)
+        return self.order_and_limit_df(
+            pd.concat(frames, ignore_index=True, sort=False), query_obj)
+
+    def order_and_limit_df(self, df, query_obj):
+        """Orders and limits a dataframe assembled in pandas like the database
+
+        Queries are ordered by their main metric when they have no explicit
+        `orderby`.
+        """
+        metrics = query_obj.get('metrics') or []
+        main_metric = utils.get_metric_name(metrics[0]) if metrics else None
+        if main_metric in df.columns:
+            df = df.sort_values(
+                main_metric,
+                ascending=not query_obj.get('order_desc', True),
+                kind='mergesort',
+            ).reset_index(drop=True)
+        row_limit = query_obj.get('row_limit')
+        if row_limit:
+            df = df.head(row_limit)
+        return df
+
+    @property
+    def rollup_cache_enabled(self):
+        return bool(cache) and bool(
+            (config.get('CACHE_CONFIG') or {}).get('CACHE_ROLLUP'))
+
+    def rollup_index_key(self, query_obj, **extra):
+        """The key of the roll-up index `query_obj` shares with its variants
+
+        It is the cache key of the query, minus its groupby, metrics and time
+        grain, along with the fields that don't change the rows returned.
+        """
+        query_obj = {
+            k: v for k, v in query_obj.items()
+            if k not in (
+                'groupby', 'metrics', 'is_timeseries', 'row_limit',
+                'order_desc', 'timeseries_limit_metric', 'inner_from_dttm',
+                'inner_to_dttm')
+        }
+        query_obj['extras'] = {
+            k: v for k, v in (query_obj.get('extras') or {}).items()
+            if k != 'time_grain_sqla'
+        }
+        return 'rollup_' + self.cache_key(
+            query_obj, label_shift=self.label_shift.total_seconds(), **extra)
+
+    @property
+    def metric_expressions(self):
+        return {m.metric_name: m.expression for m in self.datasource.metrics}
+
+    def metric_definitions(self, metrics):
+        """Returns what identifies the SQL of metrics in roll-up indexes"""
+        expressions = self.metric_expressions
+        return [get_metric_definition(m, expressions) for m in metrics]
+
+    def metric_aggregates(self, metrics):
+        """Returns how to roll up metrics, if they all can be"""
+        if not metrics:
+            return None
+        expressions = self.metric_expressions
+        aggregates = OrderedDict()
+        for metric in metrics:
+            aggregate = get_rollup_aggregate(metric, expressions)
+            if not aggregate:
+                return None
+            aggregates[utils.get_metric_name(metric)] = aggregate
+        return aggregates
+
+    def rollup_aggregates(self, query_obj):
+        """Returns how to roll up the metrics of a query, if they all can be"""
+        extras = query_obj.get('extras') or {}
+        if not (
+                self.rollup_cache_enabled and
+                self.datasource.type == 'table' and
+                query_obj.get('metrics') and
+                not query_obj.get('timeseries_limit') and
+                not query_obj.get('orderby') and
+                not query_obj.get('columns') and
+                not query_obj.get('prequeries') and
+                not extras.get('having') and
+                not extras.get('having_druid') and
+                not extras.get('grouping_sets')):
+            return None
+        return self.metric_aggregates(query_obj['metrics'])
+
+    def register_rollup_source(self, query_obj, cache_key, df, **kwargs):
+        """Makes a freshly cached result available for roll-ups"""
+        aggregates = self.rollup_aggregates(query_obj)
+        if df is None or not aggregates:
+            return
+        row_limit = query_obj.get('row_limit')
+        if row_limit and len(df.index) >= row_limit:
+            # the result may be truncated
+            return
+        cache_config = config.get('CACHE_CONFIG') or {}
+        register(
+            cache,
+            self.rollup_index_key(query_obj, **kwargs),
+            {
+                'key': cache_key,
+                'groupby': list(query_obj.get('groupby') or []),
+                'metrics': self.metric_definitions(query_obj['metrics']),
+                'is_timeseries': bool(query_obj.get('is_timeseries')),
+                'time_grain': query_obj['extras'].get('time_grain_sqla') or None,
+                'rowcount': len(df.index),
+            },
+            max_entries=cache_config.get('CACHE_ROLLUP_MAX_SOURCES', 10),
+            timeout=self.cache_timeout)
+
+    def get_df_rollup(self, query_obj, **kwargs):
+        """Returns the dataframe of a query rolled up from a cached one
+
+        Returns `None` when no cached result can answer the query, in which
+        case it has to run against the database.
+        """
+        aggregates = self.rollup_aggregates(query_obj)
+        if not aggregates:
+            return None
+        groupby = query_obj.get('groupby') or []
+        is_timeseries = bool(query_obj.get('is_timeseries'))
+        time_grain = query_obj['extras'].get('time_grain_sqla')
+        if is_timeseries and not is_supported_grain(time_grain):
+            return None
+        sources = find_sources(
+            cache,
+            self.rollup_index_key(query_obj, **kwargs),
+            groupby,
+            self.metric_definitions(query_obj['metrics']),
+            is_timeseries,
+            time_grain)
+        for source in sources:
+            cache_value = cache.get(source['key'])
+            if not cache_value:
+                continue
+            try:
+                cache_value = cache_codec.decode(cache_value)
+                df = roll_up(
+                    cache_value['df'], groupby, aggregates, is_timeseries,
+                    time_grain, self.label_shift)
+            except Exception as e:
+                logging.exception(e)
+                continue
+            if df is None:
+                continue
+            stats_logger.incr('loaded_from_rollup')
+            self.query = '-- rolled up from the cached result of:\n{}'.format(
+                cache_value['query'])
+            self.status = utils.QueryStatus.SUCCESS
+            self.error_message = None
+            return self.order_and_limit_df(df, query_obj)
+        return None
+
+    def get_df_prefetched(self, cache_key):
+        """Returns the frame of a query fetched ahead by a broader query"""
+        prefetched = self._prefetched_dfs.pop(cache_key, None)
+        if prefetched is None:
+            return None
+        df, self.query = prefetched
+        self.status = utils.QueryStatus.SUCCESS
+        self.error_message = None
+        return df
+
+    @property
+    def subsumption_cache_enabled(self):
+        return bool(cache) and bool(
+            (config.get('CACHE_CONFIG') or {}).get('CACHE_SUBSUMPTION'))
+
+    def subsumption_index_key(self, query_obj, **extra):
+        return 'subsumption_' + self.cache_key(subsumption.relax(query_obj), **extra)
+
+    def register_subsumption_source(self, query_obj, cache_key, df, **kwargs):
+        """Makes a freshly cached result available to narrower queries"""
+        if (
+                df is None or
+                not self.subsumption_cache_enabled or
+                not subsumption.is_eligible(query_obj)):
+            return
+        cache_config = config.get('CACHE_CONFIG') or {}
+        register(
+            cache,
+            self.subsumption_index_key(query_obj, **kwargs),
+            subsumption.make_entry(cache_key, query_obj, df),
+            max_entries=cache_config.get('CACHE_SUBSUMPTION_MAX_SOURCES', 10),
+            timeout=self.cache_timeout)
+
+    def get_df_subsumed(self, query_obj, **kwargs):
+        """Returns the dataframe of a query out of a broader cached result
+
+        Returns `None` when no cached result subsumes the query.
+        """
+        if not self.subsumption_cache_enabled or \
+                not subsumption.is_eligible(query_obj):
+            return None
+        entry, kind = subsumption.find_source(
+            cache, self.subsumption_index_key(query_obj, **kwargs), query_obj)
+        cache_value = cache.get(entry['key']) if entry else None
+        df = None
+        if cache_value:
+            try:
+                cache_value = cache_codec.decode(cache_value)
+                df = subsumption.apply(cache_value['df'], query_obj)
+            except Exception as e:
+                logging.exception(e)
+        if df is None:
+            stats_logger.incr('semantic_cache_miss')
+            return None
+        stats_logger.incr('semantic_cache_hit_{}'.format(kind))
+        self.query = '-- served from the cached result of:\n{}'.format(
+            cache_value['query'])
+        self.status = utils.QueryStatus.SUCCESS
+        self.error_message = None
+        return df
+
+    def get_payload(self, query_obj=None, df_payload=None):
+        """Returns a payload of metadata and data
+
+        When the `get_data` output is cached, `data` holds its serialized form
+        as a `simplejson.RawJSON`.
+
+        `df_payload` is the payload of the main query when it was already
+        fetched, for another chart running the same query for instance.
+        """
+        data_cache_key = self.data_cache_key() if self.data_cache_enabled else None
+        if data_cache_key and not self.force:
+            payload = self.get_data_payload_from_cache(data_cache_key)
+            if payload:
+                return payload
+
+        payload = self.get_df_payload_with_extras(query_obj, df_payload)
 
         df = payload.get('df')
         if self.status != utils.QueryStatus.FAILED:
@@ -370,6 +975,8 @@ class BaseViz(object):
                 payload['data'] = self.get_data(df)
         if 'df' in payload:
             del payload['df']
+        if data_cache_key and 'data' in payload:
+            self.set_data_payload_cache(data_cache_key, payload)
         return payload
 
     def get_df_payload(self, query_obj=None, **kwargs):
@@ -382,18 +989,33 @@ class BaseViz(object):
         stacktrace = None
         df = None
         cached_dttm = datetime.utcnow().isoformat().split('.')[0]
+        if cache_key and cache and self.force:
+            evict_local(cache, cache_key)
+        flight = SingleFlight(
+            cache, cache_key, config.get('CACHE_CONFIG'), stats_logger)
         if cache_key and cache and not self.force:
             cache_value = cache.get(cache_key)
+            if not cache_value:
+                # wait for an identical in-flight query to populate the cache
+                cache_value = flight.wait()
             if cache_value:
                 stats_logger.incr('loaded_from_cache')
                 try:
-                    cache_value = pkl.loads(cache_value)
+                    cache_value = cache_codec.decode(cache_value)
                     df = cache_value['df']
                     self.query = cache_value['query']
                     self._any_cached_dttm = cache_value['dttm']
                     self._any_cache_key = cache_key
                     self.status = utils.QueryStatus.SUCCESS
                     is_loaded = True
+                    if is_stale(cache_value):
+                        stats_logger.incr('loaded_from_stale_cache')
+                        self._any_stale = True
+                        refresh_in_background(
+                            cache,
+                            cache_key,
+                            partial(self.refresh_df_payload, query_obj, **kwargs),
+                            config.get('SUPERSET_WEBSERVER_TIMEOUT'))
                 except Exception as e:
                     logging.exception(e)
                     logging.error('Error reading cache: ' +
@@ -402,7 +1024,17 @@ class BaseViz(object):
 
         if query_obj and not is_loaded:
             try:
-                df = self.get_df(query_obj)
+                df = self.get_df_prefetched(cache_key)
+                if df is None:
+                    df = self.get_df_subsumed(query_obj, **kwargs)
+                if df is None:
+                    df = self.get_df_rollup(query_obj, **kwargs)
+                if df is None:
+                    buckets = self.incremental_buckets(query_obj)
+                    if buckets:
+                        df = self.get_df_incremental(query_obj, buckets)
+                    else:
+                        df = self.get_df(query_obj)
                 if self.status != utils.QueryStatus.FAILED:
                     stats_logger.incr('loaded_from_source')
                     is_loaded = True
@@ -424,8 +1056,9 @@ class BaseViz(object):
                         df=df if df is not None else None,
                         query=self.query,
                     )
-                    cache_value = pkl.dumps(
-                        cache_value, protocol=pkl.HIGHEST_PROTOCOL)
+                    timeout = set_freshness(
+                        cache_value, self.cache_timeout, self.cache_stale_timeout)
+                    cache_value = cache_codec.encode(cache_value)
 
                     logging.info('Caching {} chars at key {}'.format(
                         len(cache_value), cache_key))
@@ -434,27 +1067,46 @@ class BaseViz(object):
                     cache.set(
                         cache_key,
                         cache_value,
-                        timeout=self.cache_timeout)
+                        timeout=timeout)
+                    self.register_rollup_source(query_obj, cache_key, df, **kwargs)
+                    self.register_subsumption_source(
+                        query_obj, cache_key, df, **kwargs)
                 except Exception as e:
                     # cache.set call can fail if the backend is down or if
                     # the key is too large or whatever other reasons
                     logging.warning('Could not cache key {}'.format(cache_key))
                     logging.exception(e)
                     cache.delete(cache_key)
+            flight.release()
+        if df is not None and query_obj:
+            df = project_columns(df, query_obj)
         return {
             'cache_key': self._any_cache_key,
             'cached_dttm': self._any_cached_dttm,
             'cache_timeout': self.cache_timeout,
+            'cost_estimate': self._cost_estimate,
             'df': df,
             'error': self.error_message,
             'form_data': self.form_data,
             'is_cached': self._any_cache_key is not None,
+            'is_approximate': bool(
+                query_obj and self.datasource.is_approximate(query_obj)),
+            'is_stale': self._any_stale,
             'query': self.query,
+            'queue_wait': self._queue_wait,
             'status': self.status,
             'stacktrace': stacktrace,
             'rowcount': len(df.index) if df is not None else 0,
         }
 
+    def refresh_df_payload(self, query_obj, **kwargs):
+        """Recomputes and caches a payload, outside of the current request"""
+        viz_obj = copy.copy(self)
+        viz_obj.force = True
+        viz_obj.datasource = ConnectorRegistry.get_datasource(
+            self.datasource.type, self.datasource.id, db.session)
+        viz_obj.get_df_payload(copy.deepcopy(query_obj), **kwargs)
+
     def json_dumps(self, obj, sort_keys=False):
         return json.dumps(
             obj,
@@ -1197,7 +1849,14 @@ class NVD3TimeSeriesViz(NVD3Viz):
 
         return df
 
-    def run_extra_queries(self):
+    def extra_queries(self):
+        # computed once, so that their cache keys stay the same across lookups
+        # when the time range is relative to the current time
+        if getattr(self, '_time_compare_queries', None) is None:
+            self._time_compare_queries = self.time_compare_queries()
+        return self._time_compare_queries
+
+    def time_compare_queries(self):
         fd = self.form_data
 
         time_compare = fd.get('time_compare') or []
@@ -1205,6 +1864,7 @@ class NVD3TimeSeriesViz(NVD3Viz):
         if not isinstance(time_compare, list):
             time_compare = [time_compare]
 
+        queries = []
         for option in time_compare:
             query_object = self.query_obj()
             delta = utils.parse_human_timedelta(option)
@@ -1217,14 +1877,95 @@ class NVD3TimeSeriesViz(NVD3Viz):
                     'when using the `Time Shift` feature.'))
             query_object['from_dttm'] -= delta
             query_object['to_dttm'] -= delta
+            queries.append((query_object, {'time_compare': option}))
+        return queries
 
-            df2 = self.get_df_payload(query_object, time_compare=option).get('df')
+    def process_extra_payloads(self, queries, payloads):
+        for (query_obj, kwargs), payload in zip(queries, payloads):
+            option = kwargs['time_compare']
+            delta = utils.parse_human_timedelta(option)
+            df2 = payload.get('df')
             if df2 is not None and DTTM_ALIAS in df2:
                 label = '{} offset'. format(option)
                 df2[DTTM_ALIAS] += delta
                 df2 = self.process_data(df2)
                 self._extra_chart_data.append((label, df2))
 
+    def get_df_payload_with_extras(self, query_obj=None, df_payload=None):
+        if df_payload is None:
+            if not query_obj:
+                query_obj = self.query_obj()
+            self.prefetch_time_windows(query_obj)
+        return super().get_df_payload_with_extras(query_obj, df_payload)
+
+    def prefetch_time_windows(self, query_obj):
+        """Fetches the main query and its time comparisons in a single query
+
+        Only the queries that aren't cached take part, when their time
+        windows are close enough to scan together. `get_df_payload` then picks
+        up their frames as if they had run on their own, so they get cached
+        under their usual keys.
+        """
+        extras = query_obj.get('extras') or {}
+        max_scan_ratio = config.get('TIME_COMPARE_SINGLE_SCAN_RATIO')
+        if not (
+                max_scan_ratio and
+                self.datasource.type == 'table' and
+                query_obj.get('is_timeseries') and
+                query_obj.get('from_dttm') and
+                query_obj.get('to_dttm') and
+                not query_obj.get('columns') and
+                not query_obj.get('orderby') and
+                not extras.get('having') and
+                not extras.get('having_druid')):
+            return
+        aggregates = self.metric_aggregates(query_obj.get('metrics'))
+        if not aggregates:
+            return
+        queries = [(query_obj, {})] + self.extra_queries()
+        misses = [
+            (self.cache_key(qry, **kwargs), qry)
+            for qry, kwargs in queries
+        ]
+        if cache and not self.force:
+            misses = [(key, qry) for key, qry in misses if not has_key(cache, key)]
+        windows = [(qry['from_dttm'], qry['to_dttm']) for key, qry in misses]
+        if not is_worth_scanning_together(windows, max_scan_ratio):
+            return
+
+        row_limit = query_obj.get('row_limit')
+        union_query_obj = dict(
+            query_obj,
+            from_dttm=min(start for start, _ in windows),
+            to_dttm=max(end for _, end in windows),
+            # the series are limited on the main window, as in the comparisons
+            inner_from_dttm=query_obj['from_dttm'],
+            inner_to_dttm=query_obj['to_dttm'],
+            row_limit=row_limit * len(windows) if row_limit else row_limit,
+            extras=dict(extras, time_windows=windows),
+        )
+        viz_obj = copy.copy(self)
+        try:
+            df = viz_obj.get_df(union_query_obj)
+        except Exception as e:
+            logging.exception(e)
+            return
+        if viz_obj.status == utils.QueryStatus.FAILED or df is None:
+            return
+        if row_limit and len(df.index) >= union_query_obj['row_limit']:
+            return
+        frames = split_windows(
+            df,
+            len(windows),
+            query_obj.get('groupby') or [],
+            aggregates,
+            row_limit,
+            query_obj.get('order_desc', True))
+        stats_logger.incr('time_compare_single_scan')
+        for (key, qry), frame in zip(misses, frames):
+            if frame is not None:
+                self._prefetched_dfs[key] = (frame, viz_obj.query)
+
     def get_data(self, df):
         fd = self.form_data
         comparison_type = fd.get('comparison_type') or 'values'
@@ -1809,21 +2550,100 @@ class FilterBoxViz(BaseViz):
     def query_obj(self):
         return None
 
-    def run_extra_queries(self):
+    def filter_queries(self):
+        """Returns the `(query_obj, kwargs)` of the query of each filter"""
         qry = super().query_obj()
         filters = self.form_data.get('filter_configs') or []
         qry['row_limit'] = self.filter_row_limit
-        self.dataframes = {}
+        queries = []
         for flt in filters:
             col = flt.get('column')
             if not col:
                 raise Exception(_(
                     'Invalid filter configuration, please select a column'))
-            qry['groupby'] = [col]
             metric = flt.get('metric')
-            qry['metrics'] = [metric] if metric else []
-            df = self.get_df_payload(query_obj=qry).get('df')
-            self.dataframes[col] = df
+            queries.append((
+                dict(qry, groupby=[col], metrics=[metric] if metric else []),
+                {},
+            ))
+        return queries
+
+    @property
+    def allows_grouping_sets(self):
+        database = getattr(self.datasource, 'database', None)
+        db_engine_spec = getattr(database, 'db_engine_spec', None)
+        return bool(getattr(db_engine_spec, 'allows_grouping_sets', False))
+
+    def extra_queries(self):
+        queries = self.filter_queries()
+        if len(queries) > 1 and self.allows_grouping_sets:
+            return [(self.grouping_sets_query(queries), {})]
+        return queries
+
+    def grouping_sets_query(self, queries):
+        """Returns a query scanning the table once for all the filters
+
+        It has a grouping set per filter column and all the filters' metrics.
+        """
+        groupby = []
+        metrics = []
+        for qry, kwargs in queries:
+            groupby += [col for col in qry['groupby'] if col not in groupby]
+            metrics += [metric for metric in qry['metrics'] if metric not in metrics]
+        qry = queries[0][0]
+        return dict(
+            qry,
+            groupby=groupby,
+            metrics=metrics,
+            row_limit=self.filter_row_limit * len(groupby),
+            extras=dict(qry.get('extras') or {}, grouping_sets=True),
+        )
+
+    def split_grouping_sets(self, qry, df):
+        """Splits the frame of a grouping sets query into a frame per column
+
+        A frame is left out when it could differ from the one its own query
+        returns: when the result was truncated, or when the column has more
+        values than the filter row limit and no metric to rank them by.
+        """
+        if df is None or len(df.index) >= qry['row_limit']:
+            return {}
+        dataframes = {}
+        for filter_qry, kwargs in self.filter_queries():
+            col = filter_qry['groupby'][0]
+            grouping = utils.GROUPING_PREFIX + col
+            if col not in df.columns or grouping not in df.columns:
+                continue
+            metric_names = utils.get_metric_names(filter_qry['metrics'])
+            frame = df.loc[df[grouping] == 0, [col] + metric_names].copy()
+            if len(frame.index) > self.filter_row_limit:
+                if not metric_names:
+                    continue
+                frame = frame.sort_values(metric_names[0], ascending=False)
+                frame = frame.head(self.filter_row_limit)
+            # the NULLs of the other grouping sets turn integers into floats
+            column = self.datasource.get_col(col)
+            if (
+                    column is not None and
+                    'INT' in (column.type or '').upper() and
+                    pd.api.types.is_float_dtype(frame[col]) and
+                    frame[col].notnull().all()):
+                frame[col] = frame[col].astype('int64')
+            dataframes[col] = frame.reset_index(drop=True)
+        return dataframes
+
+    def process_extra_payloads(self, queries, payloads):
+        self.dataframes = {}
+        if len(queries) == 1 and queries[0][0]['extras'].get('grouping_sets'):
+            self.dataframes = self.split_grouping_sets(
+                queries[0][0], payloads[0].get('df'))
+            queries = [
+                (qry, kwargs) for qry, kwargs in self.filter_queries()
+                if qry['groupby'][0] not in self.dataframes
+            ]
+            payloads = [self.get_df_payload(qry, **kwargs) for qry, kwargs in queries]
+        for (qry, kwargs), payload in zip(queries, payloads):
+            self.dataframes[qry['groupby'][0]] = payload.get('df')
 
     def get_data(self, df):
         filters = self.form_data.get('filter_configs') or []
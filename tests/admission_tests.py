@@ -0,0 +1,75 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the admission control of database queries"""
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import Mock
+
+from werkzeug.contrib.cache import SimpleCache
+
+from superset.exceptions import QueryQueueTimeoutException
+from superset.utils.admission import AdmissionQueue, CacheSlots, LocalSlots
+
+
+class AdmissionTestCase(TestCase):
+
+    def test_fair_queues(self):
+        queue = AdmissionQueue(LocalSlots(1), max_wait=10)
+        admitted = []
+
+        def run(key, name):
+            with queue.admit(key):
+                admitted.append(name)
+
+        threads = []
+        with queue.admit('first'):
+            for key, name in (('a', 'a1'), ('a', 'a2'), ('b', 'b1')):
+                thread = threading.Thread(target=run, args=(key, name))
+                thread.start()
+                threads.append(thread)
+                # queued one after the other
+                while sum(len(q) for q in queue.queues.values()) < len(threads):
+                    time.sleep(0.01)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(['a1', 'b1', 'a2'], admitted)
+        self.assertEqual({}, queue.queues)
+
+    def test_max_wait(self):
+        stats_logger = Mock()
+        queue = AdmissionQueue(LocalSlots(1), max_wait=0.05, stats_logger=stats_logger)
+        with queue.admit('a') as wait:
+            self.assertLess(wait, 0.05)
+            with self.assertRaises(QueryQueueTimeoutException):
+                with queue.admit('b'):
+                    pass
+        stats_logger.incr.assert_called_once_with('admission.rejected')
+        self.assertEqual({}, queue.queues)
+        with queue.admit('b'):
+            pass
+
+    def test_cache_slots(self):
+        cache = SimpleCache()
+        queue = AdmissionQueue(CacheSlots(cache, 'admission/1', 1, 60), max_wait=0.05)
+        other = AdmissionQueue(CacheSlots(cache, 'admission/1', 1, 60), max_wait=0.05)
+        with queue.admit('a'):
+            with self.assertRaises(QueryQueueTimeoutException):
+                with other.admit('a'):
+                    pass
+        with other.admit('a'):
+            pass
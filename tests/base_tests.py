@@ -114,6 +114,8 @@ class SupersetTestCase(unittest.TestCase):
         results.status = Mock()
         results.error_message = None
         results.df = pd.DataFrame()
+        results.queue_wait = 0
+        results.cost_estimate = None
         datasource.type = 'table'
         datasource.query = Mock(return_value=results)
         mock_dttm_col = Mock()
@@ -0,0 +1,82 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the chart cache codecs"""
+import pickle as pkl
+from unittest import skipUnless, TestCase
+
+import pandas as pd
+
+from superset.utils import cache_codecs
+
+
+class CacheCodecsTestCase(TestCase):
+
+    def setUp(self):
+        self.value = {
+            'dttm': '2019-01-01T00:00:00',
+            'query': 'SELECT 1',
+            'df': pd.DataFrame({
+                '__timestamp': pd.date_range('2019-01-01', periods=3),
+                'name': ['a', 'b', 'c'],
+                'sum__num': [1.0, 2.0, 3.0],
+            }),
+        }
+
+    def assert_roundtrip(self, codec):
+        blob = codec.encode(self.value)
+        decoded = codec.decode(blob)
+        self.assertEqual(decoded['query'], 'SELECT 1')
+        self.assertEqual(decoded['dttm'], '2019-01-01T00:00:00')
+        pd.testing.assert_frame_equal(decoded['df'], self.value['df'])
+        self.assertEqual(
+            codec.decode_metadata(blob),
+            {'dttm': '2019-01-01T00:00:00', 'query': 'SELECT 1'})
+
+    def test_pickle_codec(self):
+        codec = cache_codecs.PickleCacheCodec()
+        self.assert_roundtrip(codec)
+        # blobs stay readable by workers expecting plain pickles
+        self.assertEqual(
+            pkl.loads(codec.encode(self.value))['query'], 'SELECT 1')
+
+    @skipUnless(cache_codecs.pa, 'pyarrow is not installed')
+    def test_arrow_codec(self):
+        self.assert_roundtrip(cache_codecs.ArrowCacheCodec())
+        self.assert_roundtrip(cache_codecs.ArrowCacheCodec(compression=None))
+
+    @skipUnless(cache_codecs.pa, 'pyarrow is not installed')
+    def test_arrow_codec_falls_back_to_pickle(self):
+        self.value['df'] = pd.DataFrame({'mixed': [1, 'a', 2.5]})
+        codec = cache_codecs.ArrowCacheCodec()
+        self.assert_roundtrip(codec)
+
+    def test_decode_legacy_pickle(self):
+        blob = pkl.dumps(self.value)
+        pd.testing.assert_frame_equal(
+            cache_codecs.decode(blob)['df'], self.value['df'])
+
+    def test_empty_df(self):
+        self.value['df'] = None
+        blob = cache_codecs.BaseCacheCodec().encode(self.value)
+        self.assertIsNone(cache_codecs.decode(blob)['df'])
+
+    def test_get_cache_codec(self):
+        self.assertIsInstance(
+            cache_codecs.get_cache_codec({'CACHE_TYPE': 'null'}),
+            cache_codecs.PickleCacheCodec)
+        with self.assertRaises(Exception):
+            cache_codecs.get_cache_codec({'CACHE_CODEC': 'foo'})
@@ -0,0 +1,80 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the canonical forms of cache keys"""
+from unittest import TestCase
+
+import pandas as pd
+
+from superset.utils.cache_keys import canonicalize, project_columns
+
+SUM_NUM = {
+    'expressionType': 'SIMPLE',
+    'aggregate': 'SUM',
+    'column': {'column_name': 'num', 'type': 'BIGINT', 'id': 12},
+    'label': 'SUM(num)',
+    'optionName': 'metric_1bxmx6q8xkg_5f1l7bqvcah',
+    'hasCustomLabel': False,
+    'sqlExpression': None,
+}
+
+
+class CacheKeysTestCase(TestCase):
+
+    def test_canonicalize(self):
+        query_obj = {
+            'groupby': ['gender', 'state'],
+            'metrics': ['count', SUM_NUM, 'avg__num'],
+            'filter': [
+                {'col': 'state', 'op': 'in', 'val': ['NY', 'CA']},
+                {'col': 'gender', 'op': '==', 'val': 'boy'},
+            ],
+            'extras': {'where': '', 'having': '', 'time_grain_sqla': 'P1D'},
+            'timeseries_limit': 0,
+        }
+        other = {
+            'groupby': ['state', 'gender'],
+            'metrics': [
+                'count',
+                'avg__num',
+                dict(SUM_NUM, optionName='metric_2', column={'column_name': 'num'}),
+            ],
+            'filter': [
+                {'col': 'gender', 'op': '==', 'val': 'boy'},
+                {'col': 'state', 'op': 'in', 'val': ['CA', 'NY']},
+            ],
+            'extras': {'time_grain_sqla': 'P1D'},
+        }
+        other['metrics'][2]['column']['type'] = 'BIGINT'
+        self.assertEqual(canonicalize(query_obj), canonicalize(other))
+        self.assertEqual({'time_grain_sqla': 'P1D'}, canonicalize(other)['extras'])
+
+        # the main metric drives the ordering of rows
+        other['metrics'] = other['metrics'][1:] + other['metrics'][:1]
+        self.assertNotEqual(canonicalize(query_obj), canonicalize(other))
+
+    def test_project_columns(self):
+        df = pd.DataFrame(
+            [['CA', 'boy', '2019-01-01', 1, 2]],
+            columns=['state', 'gender', '__timestamp', 'avg__num', 'count'])
+        query_obj = {
+            'groupby': ['gender', 'state'],
+            'metrics': ['count', 'avg__num'],
+        }
+        self.assertEqual(
+            ['gender', 'state', '__timestamp', 'count', 'avg__num'],
+            list(project_columns(df, query_obj).columns))
+        self.assertIs(df, project_columns(df, {'groupby': ['state', 'gender']}))
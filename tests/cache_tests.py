@@ -16,8 +16,10 @@
 # under the License.
 """Unit tests for Superset with caching"""
 import json
+from unittest.mock import patch
 
-from superset import cache, db
+from superset import app, cache, db, viz
+from superset.tasks import async_queries
 from superset.utils.core import QueryStatus
 from .base_tests import SupersetTestCase
 
@@ -50,3 +52,54 @@ class CacheTests(SupersetTestCase):
         self.assertEqual(resp_from_cache['status'], QueryStatus.SUCCESS)
         self.assertEqual(resp['data'], resp_from_cache['data'])
         self.assertEqual(resp['query'], resp_from_cache['query'])
+
+    def test_cache_data_payload(self):
+        self.login(username='admin')
+        slc = self.get_slice('Girls', db.session)
+
+        json_endpoint = (
+            '/superset/explore_json/{}/{}/'
+            .format(slc.datasource_type, slc.datasource_id)
+        )
+        with patch.dict(app.config['CACHE_CONFIG'], {'CACHE_GET_DATA': True}):
+            resp = self.get_json_resp(
+                json_endpoint, {'form_data': json.dumps(slc.viz.form_data)})
+            viz_class = viz.viz_types[slc.viz_type]
+            with patch.object(viz_class, 'get_data') as mock_get_data:
+                resp_from_cache = self.get_json_resp(
+                    json_endpoint, {'form_data': json.dumps(slc.viz.form_data)})
+                mock_get_data.assert_not_called()
+        self.assertFalse(resp['is_cached'])
+        self.assertTrue(resp_from_cache['is_cached'])
+        self.assertEqual(resp['data'], resp_from_cache['data'])
+        self.assertEqual(resp['query'], resp_from_cache['query'])
+
+    def test_async_explore_json(self):
+        self.login(username='admin')
+        slc = self.get_slice('Girls', db.session)
+        json_endpoint = (
+            '/superset/explore_json/{}/{}/?async=true'
+            .format(slc.datasource_type, slc.datasource_id)
+        )
+        data = {'form_data': json.dumps(slc.viz.form_data)}
+
+        with patch.dict(app.config, {'ASYNC_CHART_QUERIES': True}), \
+                patch.object(async_queries.compute_payload, 'delay') as delay:
+            resp = self.client.post(json_endpoint, data=data)
+            self.assertEqual(202, resp.status_code)
+            job = json.loads(resp.data.decode('utf-8'))
+            self.assertEqual(QueryStatus.PENDING, job['status'])
+            delay.assert_called_once_with(job['job_id'])
+
+            pending = self.client.get(job['results_url'])
+            self.assertEqual(202, pending.status_code)
+
+            async_queries.compute_payload(job['job_id'])
+            resp = self.get_json_resp(job['results_url'])
+            self.assertEqual(QueryStatus.SUCCESS, resp['status'])
+            self.assertTrue(resp['is_cached'])
+
+            # the results are cached by now, so they're served right away
+            resp = self.client.post(json_endpoint, data=data)
+            self.assertEqual(200, resp.status_code)
+            delay.assert_called_once()
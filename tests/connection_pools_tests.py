@@ -0,0 +1,66 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the connection pools to analytics databases"""
+from unittest import TestCase
+from unittest.mock import Mock
+
+from sqlalchemy import create_engine, exc
+
+from superset.utils.connection_pools import get_pool_params, meter_pool
+
+
+class ConnectionPoolsTestCase(TestCase):
+
+    def test_metered_pool(self):
+        engine = create_engine('sqlite://', **get_pool_params({
+            'pool_size': 1,
+            'max_overflow': 0,
+            'pool_timeout': 0.01,
+            'pre_ping': True,
+        }))
+        stats_logger = Mock()
+        meter_pool(engine.pool, stats_logger, 'db_pool.1')
+
+        conn = engine.raw_connection()
+        stats_logger.timing.assert_called_once()
+        self.assertEqual('db_pool.1.checkout_wait', stats_logger.timing.call_args[0][0])
+        stats_logger.gauge.assert_any_call('db_pool.1.checked_out', 1)
+        stats_logger.gauge.assert_any_call('db_pool.1.utilization', 100)
+
+        with self.assertRaises(exc.TimeoutError):
+            engine.raw_connection()
+        stats_logger.incr.assert_called_once_with('db_pool.1.checkout_timeout')
+
+        conn.close()
+        stats_logger.gauge.assert_any_call('db_pool.1.checked_out', 0)
+
+        engine.dispose()
+        self.assertIs(stats_logger, engine.pool.stats_logger)
+        self.assertEqual('db_pool.1', engine.pool.stats_key)
+
+    def test_metered_pool_without_capacity(self):
+        engine = create_engine('sqlite://', **get_pool_params({
+            'pool_size': 0,
+            'max_overflow': 0,
+        }))
+        stats_logger = Mock()
+        meter_pool(engine.pool, stats_logger, 'db_pool.1')
+        engine.pool.report_usage()
+        stats_logger.gauge.assert_called_once_with('db_pool.1.checked_out', 0)
+        self.assertNotIn(
+            'db_pool.1.utilization',
+            [args[0] for args, kwargs in stats_logger.gauge.call_args_list])
@@ -111,6 +111,20 @@ class CoreTests(SupersetTestCase):
         qobj['groupby'] = []
         self.assertNotEqual(cache_key, viz.cache_key(qobj))
 
+    def test_invalidate_cache(self):
+        self.login(username='admin')
+        slc = self.get_slice('Girls', db.session)
+
+        viz = slc.viz
+        qobj = viz.query_obj()
+        cache_key = viz.cache_key(qobj)
+        resp = self.get_json_resp(
+            '/superset/invalidate_cache/{}/{}/'.format(
+                slc.datasource_type, slc.datasource_id),
+            {'data': 'true'})
+        self.assertEqual(resp['datasource'], slc.datasource.uid)
+        self.assertNotEqual(cache_key, viz.cache_key(qobj))
+
     def test_api_v1_query_endpoint(self):
         self.login(username='admin')
         slc = self.get_slice('Name Cloud', db.session)
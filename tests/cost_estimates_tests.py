@@ -0,0 +1,107 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the estimates and guardrails of the cost of queries"""
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from werkzeug.contrib.cache import SimpleCache
+
+from superset.db_engine_specs import PostgresEngineSpec, PrestoEngineSpec
+from superset.exceptions import QueryCostException
+from superset.utils import cost_estimates
+
+
+class CostEstimatesTestCase(TestCase):
+
+    def get_database(self, estimate, guardrails):
+        database = Mock(id=1, cost_guardrails=guardrails)
+        database.db_engine_spec.supports_cost_estimate = True
+        database.estimate_cost = Mock(return_value=estimate)
+        return database
+
+    def test_normalize(self):
+        self.assertEqual(
+            cost_estimates.normalize('-- routed\nselect a\n  from  t;'),
+            cost_estimates.normalize('SELECT a FROM t'))
+
+    def test_get_estimate_is_cached(self):
+        database = self.get_database({'rows': 10, 'bytes': 100}, None)
+        with patch.object(cost_estimates, 'cache', SimpleCache()):
+            cost_estimates.get_estimate(database, 'SELECT a FROM t')
+            estimate = cost_estimates.get_estimate(database, '-- x\nselect a from t')
+            self.assertEqual({'rows': 10, 'bytes': 100}, estimate)
+            self.assertEqual(1, database.estimate_cost.call_count)
+            cost_estimates.get_estimate(database, 'SELECT a FROM t', 'other')
+            self.assertEqual(2, database.estimate_cost.call_count)
+
+    def test_enforce(self):
+        guardrails = {
+            'warn': {'bytes': 1000},
+            'confirm': {'bytes': 10000},
+            'refuse': {'rows': 1000},
+        }
+        with patch.object(cost_estimates, 'cache', None):
+            database = self.get_database({'rows': 10, 'bytes': 100}, guardrails)
+            estimate = cost_estimates.enforce(database, 'SELECT 1')
+            self.assertIsNone(estimate['verdict'])
+
+            database = self.get_database({'rows': 10, 'bytes': 5000}, guardrails)
+            estimate = cost_estimates.enforce(database, 'SELECT 1')
+            self.assertEqual(cost_estimates.WARN, estimate['verdict'])
+
+            database = self.get_database({'rows': 10, 'bytes': 50000}, guardrails)
+            with self.assertRaises(QueryCostException) as context:
+                cost_estimates.enforce(database, 'SELECT 1')
+            self.assertEqual(
+                cost_estimates.CONFIRM, context.exception.estimate['verdict'])
+            estimate = cost_estimates.enforce(database, 'SELECT 1', confirmed=True)
+            self.assertEqual(cost_estimates.CONFIRM, estimate['verdict'])
+
+            database = self.get_database({'rows': 5000, 'bytes': None}, guardrails)
+            with self.assertRaises(QueryCostException):
+                cost_estimates.enforce(database, 'SELECT 1', confirmed=True)
+
+            database = self.get_database({'rows': 5000, 'bytes': None}, None)
+            self.assertIsNone(cost_estimates.enforce(database, 'SELECT 1'))
+            database.estimate_cost.assert_not_called()
+
+    def test_postgres_estimate(self):
+        cursor = Mock()
+        cursor.fetchone.return_value = [[{'Plan': {
+            'Node Type': 'Hash Join',
+            'Plan Rows': 10,
+            'Plan Width': 8,
+            'Plans': [
+                {'Relation Name': 'a', 'Plan Rows': 100, 'Plan Width': 4},
+                {'Node Type': 'Hash', 'Plan Rows': 20, 'Plan Width': 8, 'Plans': [
+                    {'Relation Name': 'b', 'Plan Rows': 20, 'Plan Width': 8},
+                ]},
+            ],
+        }}]]
+        estimate = PostgresEngineSpec.estimate_query_cost(
+            cursor, 'SELECT * FROM a JOIN b USING (id); SET x = 1')
+        self.assertEqual({'rows': 120, 'bytes': 560}, estimate)
+        self.assertEqual(1, cursor.execute.call_count)
+
+    def test_presto_estimate(self):
+        cursor = Mock()
+        cursor.fetchone.return_value = [
+            '{"inputTableColumnInfos": ['
+            '{"estimate": {"outputRowCount": 100.0, "outputSizeInBytes": 800.0}}, '
+            '{"estimate": {"outputRowCount": 20.0, "outputSizeInBytes": NaN}}]}']
+        estimate = PrestoEngineSpec.estimate_query_cost(cursor, 'SELECT 1')
+        self.assertEqual({'rows': 120, 'bytes': None}, estimate)
@@ -17,6 +17,7 @@
 """Unit tests for Superset"""
 import json
 import unittest
+from unittest.mock import Mock
 
 from flask import escape
 from sqlalchemy import func
@@ -24,6 +25,7 @@ from sqlalchemy import func
 from superset import db, security_manager
 from superset.connectors.sqla.models import SqlaTable
 from superset.models import core as models
+from superset.views.utils import get_dashboard_form_data
 from .base_tests import SupersetTestCase
 
 
@@ -95,6 +97,41 @@ class DashboardTests(SupersetTestCase):
         self.assertIn('standalone_mode&#34;: true', resp)
         self.assertIn('<body class="standalone">', resp)
 
+    def test_dashboard_data(self):
+        self.login(username='admin')
+        dash = db.session.query(models.Dashboard).filter_by(slug='births').first()
+        slice_ids = {slc.id for slc in dash.slices}
+        url = '/superset/dashboard_data/{}/'.format(dash.id)
+
+        resp = self.get_resp(url)
+        charts = [json.loads(line) for line in resp.splitlines()]
+        self.assertEqual(slice_ids, {chart['slice_id'] for chart in charts})
+
+        filtering_slice_id, filtered_slice_id = sorted(slice_ids)[:2]
+        filters = {str(filtering_slice_id): {'gender': ['boy']}}
+        charts = self.get_json_resp(url, data={
+            'format': 'json',
+            'filters': json.dumps(filters),
+            'slice_ids': json.dumps([filtering_slice_id, filtered_slice_id]),
+        })
+        extra_filters = {
+            chart['slice_id']: chart['payload']['form_data']['extra_filters']
+            for chart in charts
+        }
+        self.assertEqual([], extra_filters[filtering_slice_id])
+        self.assertEqual(
+            [{'col': 'gender', 'op': 'in', 'val': ['boy']}],
+            extra_filters[filtered_slice_id])
+
+    def test_dashboard_form_data_follows_approximate(self):
+        dash = models.Dashboard(json_metadata=json.dumps({'approximate': True}))
+        slc = Mock(id=1, form_data={'viz_type': 'table'})
+        self.assertTrue(get_dashboard_form_data(dash, slc, {})['approximate'])
+        self.assertFalse(get_dashboard_form_data(
+            dash, slc, {}, {'approximate': False})['approximate'])
+        slc.form_data['approximate'] = False
+        self.assertFalse(get_dashboard_form_data(dash, slc, {})['approximate'])
+
     def test_save_dash(self, username='admin'):
         self.login(username=username)
         dash = db.session.query(models.Dashboard).filter_by(
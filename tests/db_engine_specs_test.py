@@ -24,7 +24,7 @@ from sqlalchemy.types import String, UnicodeText
 from superset import db_engine_specs
 from superset.db_engine_specs import (
     BaseEngineSpec, BQEngineSpec, HiveEngineSpec, MssqlEngineSpec,
-    MySQLEngineSpec, OracleEngineSpec, PrestoEngineSpec,
+    MySQLEngineSpec, OracleEngineSpec, PrestoEngineSpec, RedshiftEngineSpec,
 )
 from superset.models.core import Database
 from .base_tests import SupersetTestCase
@@ -380,3 +380,31 @@ class DbEngineSpecsTestCase(SupersetTestCase):
         query = str(sel.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
         query_expected = "SELECT col, unicode_col \nFROM tbl \nWHERE col = 'abc' AND unicode_col = N'abc'"  # noqa
         self.assertEqual(query, query_expected)
+
+    def test_approximate_expression(self):
+        self.assertEqual(
+            'APPROX_DISTINCT(user_id) / SUM(num)',
+            PrestoEngineSpec.approximate_expression(
+                'COUNT(DISTINCT user_id) / SUM(num)'))
+        self.assertEqual(
+            'APPROX_DISTINCT(COALESCE(a, b))',
+            PrestoEngineSpec.approximate_expression('count(distinct COALESCE(a, b))'))
+        self.assertEqual(
+            'APPROXIMATE PERCENTILE_DISC(0.9) WITHIN GROUP (ORDER BY latency)',
+            RedshiftEngineSpec.approximate_expression(
+                'PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY latency)'))
+        not_approximated = [
+            (PrestoEngineSpec, 'SUM(num)'),
+            (PrestoEngineSpec, 'COUNT(DISTINCT a, b)'),
+            (HiveEngineSpec, 'COUNT(DISTINCT user_id)'),
+            (MySQLEngineSpec, 'COUNT(DISTINCT user_id)'),
+            (RedshiftEngineSpec, 'APPROXIMATE COUNT(DISTINCT user_id)'),
+            (RedshiftEngineSpec,
+             'PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY latency DESC)'),
+        ]
+        for spec, expression in not_approximated:
+            self.assertIsNone(spec.approximate_expression(expression))
+        self.assertEqual(
+            'APPROX_COUNT_DISTINCT(user_id)',
+            BQEngineSpec.approximate_aggregate('COUNT_DISTINCT', 'user_id'))
+        self.assertIsNone(BQEngineSpec.approximate_aggregate('SUM', 'user_id'))
@@ -0,0 +1,55 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the registry of the engines of analytics databases"""
+import time
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from superset.utils.engine_registry import EngineRegistry
+
+
+class EngineRegistryTestCase(TestCase):
+
+    def test_lru(self):
+        stats_logger = Mock()
+        registry = EngineRegistry(max_engines=2, stats_logger=stats_logger)
+        first = registry.get(1, 'uri', 'a', Mock)
+        self.assertIs(first, registry.get(1, 'uri', 'a', Mock))
+        second = registry.get(1, 'uri', 'b', Mock)
+        registry.get(1, 'uri', 'a', Mock)
+        registry.get(2, 'uri', 'a', Mock)
+        self.assertEqual(2, len(registry))
+        second.dispose.assert_called_once_with()
+        first.dispose.assert_not_called()
+        stats_logger.incr.assert_called_once_with('db_engines.evicted')
+        stats_logger.gauge.assert_called_with('db_engines.count', 2)
+
+    def test_invalidation(self):
+        registry = EngineRegistry()
+        engine = registry.get(1, 'uri', 'a', Mock)
+        other = registry.get(2, 'uri', 'a', Mock)
+        changed = registry.get(1, 'other uri', 'a', Mock)
+        self.assertIsNot(engine, changed)
+        engine.dispose.assert_called_once_with()
+        self.assertIs(other, registry.get(2, 'uri', 'a', Mock))
+
+    def test_ttl(self):
+        registry = EngineRegistry(ttl=60)
+        engine = registry.get(1, 'uri', 'a', Mock)
+        with patch.object(time, 'time', return_value=time.time() + 61):
+            self.assertIsNot(engine, registry.get(1, 'uri', 'a', Mock))
+        engine.dispose.assert_called_once_with()
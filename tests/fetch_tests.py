@@ -0,0 +1,88 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for fetching query results into data frames"""
+from datetime import datetime
+from decimal import Decimal
+from unittest import TestCase
+
+import pandas as pd
+
+from superset.utils.fetch import fetch_df
+
+
+class NUMBER(object):
+    def __eq__(self, other):
+        return other == 'number'
+
+
+class DBAPI(object):
+    NUMBER = NUMBER()
+
+
+class Cursor(object):
+
+    def __init__(self, description, rows):
+        self.description = description
+        self.rows = rows
+        self.fetched = 0
+
+    def fetchmany(self, size):
+        rows = self.rows[self.fetched:self.fetched + size]
+        self.fetched += size
+        return rows
+
+
+class FetchTestCase(TestCase):
+
+    def assert_fetched(self, description, rows, dtypes):
+        df = fetch_df(Cursor(description, rows), DBAPI, chunk_size=2)
+        expected = pd.DataFrame.from_records(
+            rows, columns=[d[0] for d in description], coerce_float=True)
+        pd.testing.assert_frame_equal(expected, df)
+        self.assertEqual(dtypes, [str(df[col].dtype) for col in ('num', 'avg')])
+
+    def test_fetch_df(self):
+        description = [
+            ('name', 'string'),
+            ('num', 'number'),
+            ('avg', 'number'),
+            ('ds', 'datetime'),
+            ('name', 'string'),
+        ]
+        rows = [
+            ('a', 1, Decimal('1.5'), datetime(2019, 1, 1), 'x'),
+            ('b', 2, 2.5, datetime(2019, 1, 2), 'y'),
+            ('c', 3, None, datetime(2019, 1, 3), 'z'),
+        ]
+        self.assert_fetched(description, rows, ['int64', 'float64'])
+
+        # integers turn into floats with the first NULL, and into objects with
+        # the first value which isn't a number
+        rows[2] = ('c', None, None, datetime(2019, 1, 3), 'z')
+        self.assert_fetched(description, rows, ['float64', 'float64'])
+        rows[2] = ('c', 'NaN', 3.5, datetime(2019, 1, 3), 'z')
+        self.assert_fetched(description, rows, ['object', 'float64'])
+
+        # numeric columns of NULLs only stay objects
+        rows = [(name, num, None, ds, x) for name, num, avg, ds, x in rows]
+        self.assert_fetched(description, rows, ['object', 'object'])
+
+    def test_fetch_df_empty(self):
+        df = fetch_df(Cursor([('num', 'number')], []), DBAPI)
+        self.assertEqual(['num'], list(df.columns))
+        self.assertTrue(df.empty)
+        self.assertTrue(fetch_df(Cursor(None, []), DBAPI).empty)
@@ -0,0 +1,93 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the time bucket arithmetic of incremental caching"""
+from datetime import datetime
+from unittest import TestCase
+
+from superset.utils.incremental_cache import (
+    floor_dttm,
+    get_buckets,
+    get_fetch_ranges,
+    is_aligned,
+    is_supported_grain,
+    next_bucket,
+)
+
+
+class IncrementalCacheTestCase(TestCase):
+
+    def test_floor_dttm(self):
+        dttm = datetime(2019, 5, 15, 13, 47, 12)
+        self.assertEqual(floor_dttm(dttm, 'PT1H'), datetime(2019, 5, 15, 13))
+        self.assertEqual(floor_dttm(dttm, 'PT15M'), datetime(2019, 5, 15, 13, 45))
+        self.assertEqual(floor_dttm(dttm, 'P1D'), datetime(2019, 5, 15))
+        # 2019-05-15 is a Wednesday
+        self.assertEqual(
+            floor_dttm(dttm, '1969-12-29T00:00:00Z/P1W'), datetime(2019, 5, 13))
+        self.assertEqual(
+            floor_dttm(dttm, '1969-12-28T00:00:00Z/P1W'), datetime(2019, 5, 12))
+        self.assertEqual(floor_dttm(dttm, 'P1M'), datetime(2019, 5, 1))
+        self.assertEqual(floor_dttm(dttm, 'P0.25Y'), datetime(2019, 4, 1))
+        self.assertEqual(floor_dttm(dttm, 'P1Y'), datetime(2019, 1, 1))
+        self.assertTrue(is_aligned(datetime(2019, 4, 1), 'P0.25Y'))
+        self.assertFalse(is_aligned(datetime(2019, 5, 1), 'P0.25Y'))
+
+    def test_next_bucket(self):
+        self.assertEqual(
+            next_bucket(datetime(2019, 1, 31, 23), 'PT1H'), datetime(2019, 2, 1))
+        self.assertEqual(
+            next_bucket(datetime(2019, 10, 1), 'P0.25Y'), datetime(2020, 1, 1))
+
+    def test_supported_grains(self):
+        self.assertTrue(is_supported_grain('P1D'))
+        # week boundaries of `P1W` depend on the database engine
+        self.assertFalse(is_supported_grain('P1W'))
+        self.assertFalse(is_supported_grain('P1W/1970-01-03T00:00:00Z'))
+        self.assertFalse(is_supported_grain(None))
+
+    def test_get_buckets(self):
+        buckets = get_buckets(
+            datetime(2019, 5, 1, 12),
+            datetime(2019, 5, 5),
+            'P1D',
+            closed_before=datetime(2019, 5, 4, 6),
+            max_buckets=10)
+        # the first day is partial and the fourth one isn't over
+        self.assertEqual(buckets, [
+            (datetime(2019, 5, 2), datetime(2019, 5, 3)),
+            (datetime(2019, 5, 3), datetime(2019, 5, 4)),
+        ])
+        self.assertIsNone(get_buckets(
+            datetime(2019, 5, 1),
+            datetime(2019, 5, 5),
+            'PT1H',
+            closed_before=datetime(2019, 6, 1),
+            max_buckets=10))
+
+    def test_get_fetch_ranges(self):
+        from_dttm = datetime(2019, 5, 1, 12)
+        to_dttm = datetime(2019, 5, 5)
+        cached = [
+            (datetime(2019, 5, 2), datetime(2019, 5, 3)),
+            (datetime(2019, 5, 3), datetime(2019, 5, 4)),
+        ]
+        self.assertEqual(get_fetch_ranges(from_dttm, to_dttm, cached), [
+            (from_dttm, datetime(2019, 5, 2)),
+            (datetime(2019, 5, 4), to_dttm),
+        ])
+        self.assertEqual(
+            get_fetch_ranges(from_dttm, to_dttm, []), [(from_dttm, to_dttm)])
@@ -0,0 +1,42 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the caching of top groups prequeries"""
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+import pandas as pd
+from werkzeug.contrib.cache import SimpleCache
+
+from superset.utils import prequery_cache
+
+
+class PrequeryCacheTestCase(TestCase):
+
+    def test_get_df(self):
+        datasource = Mock(uid='1__table', cache_generation=0, cache_timeout=60)
+        run = Mock(return_value=pd.DataFrame({'gender': ['boy', 'girl']}))
+        with patch.object(prequery_cache, 'cache', SimpleCache()), \
+                patch.object(prequery_cache, 'is_enabled', return_value=True):
+            df = prequery_cache.get_df(datasource, 'SELECT gender', run)
+            cached = prequery_cache.get_df(datasource, 'SELECT gender', run)
+            self.assertEqual(1, run.call_count)
+            self.assertEqual(list(df['gender']), list(cached['gender']))
+
+            prequery_cache.get_df(datasource, 'SELECT state', run)
+            datasource.cache_generation = 1
+            prequery_cache.get_df(datasource, 'SELECT gender', run)
+            self.assertEqual(3, run.call_count)
@@ -0,0 +1,67 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for cancelling chart queries"""
+from contextlib import closing
+import sqlite3
+from unittest import TestCase
+from unittest.mock import Mock
+
+from superset.exceptions import QueryCancelledException
+from superset.utils.query_cancellation import RequestQueries, RunningQuery, track
+
+LONG_QUERY = """
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n)
+SELECT COUNT(*) FROM n
+"""
+
+
+def interrupt(conn):
+    conn.interrupt()
+    return True
+
+
+class QueryCancellationTestCase(TestCase):
+
+    def test_deadline(self):
+        stats_logger = Mock()
+        with closing(sqlite3.connect(':memory:', check_same_thread=False)) as conn:
+            with self.assertRaises(QueryCancelledException):
+                with track(lambda: interrupt(conn), 0.1, stats_logger):
+                    conn.execute(LONG_QUERY).fetchall()
+            stats_logger.incr.assert_called_once_with('chart_query.cancelled.deadline')
+
+            # queries done before their deadline are left alone
+            with track(lambda: interrupt(conn), 1, stats_logger) as query:
+                self.assertEqual([(1,)], conn.execute('SELECT 1').fetchall())
+            query.cancel('deadline')
+            self.assertIsNone(query.reason)
+
+    def test_request_queries(self):
+        cancel = Mock(return_value=True)
+        request_queries = RequestQueries()
+        query = RunningQuery(cancel)
+        request_queries.add(query)
+        request_queries.cancel('disconnect')
+        cancel.assert_called_once_with()
+        self.assertEqual('disconnect', query.reason)
+        with self.assertRaises(QueryCancelledException):
+            request_queries.add(RunningQuery(cancel))
+
+    def test_not_cancellable(self):
+        query = RunningQuery(Mock(return_value=False))
+        query.cancel('deadline')
+        self.assertIsNone(query.reason)
@@ -0,0 +1,162 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for answering queries from finer cached results"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+import pandas as pd
+from werkzeug.contrib.cache import SimpleCache
+
+from superset.utils.cache_index import register
+from superset.utils.core import DTTM_ALIAS
+from superset.utils.rollup import (
+    find_sources,
+    get_metric_definition,
+    get_rollup_aggregate,
+    is_finer_grain,
+    roll_up,
+)
+
+
+class RollupTestCase(TestCase):
+
+    def test_get_rollup_aggregate(self):
+        expressions = {
+            'count': 'COUNT(*)',
+            'sum__num': 'SUM(num)',
+            'ratio': 'SUM(a) / SUM(b)',
+            'count_distinct': 'COUNT(DISTINCT name)',
+        }
+        self.assertEqual('sum', get_rollup_aggregate('count', expressions))
+        self.assertEqual('sum', get_rollup_aggregate('sum__num', expressions))
+        self.assertIsNone(get_rollup_aggregate('ratio', expressions))
+        self.assertIsNone(get_rollup_aggregate('count_distinct', expressions))
+        self.assertIsNone(get_rollup_aggregate('unknown', expressions))
+        self.assertEqual('max', get_rollup_aggregate(
+            {'expressionType': 'SIMPLE', 'aggregate': 'MAX'}, expressions))
+        self.assertIsNone(get_rollup_aggregate(
+            {'expressionType': 'SIMPLE', 'aggregate': 'AVG'}, expressions))
+        self.assertEqual('min', get_rollup_aggregate(
+            {'expressionType': 'SQL', 'sqlExpression': 'min(price * qty)'},
+            expressions))
+
+    def test_get_metric_definition(self):
+        sum_a = {
+            'expressionType': 'SQL', 'sqlExpression': 'SUM(a)', 'label': 'm',
+            'optionName': 'metric_1',
+        }
+        sum_b = dict(sum_a, sqlExpression='SUM(b)', optionName='metric_2')
+        self.assertEqual(
+            get_metric_definition(sum_a, {}),
+            get_metric_definition(dict(sum_a, optionName='metric_3'), {}))
+        self.assertNotEqual(
+            get_metric_definition(sum_a, {}), get_metric_definition(sum_b, {}))
+        count = {
+            'expressionType': 'SIMPLE', 'aggregate': 'COUNT', 'label': 'count',
+            'column': {'column_name': 'id'},
+        }
+        self.assertNotEqual(
+            get_metric_definition('count', {'count': 'COUNT(*)'}),
+            get_metric_definition(count, {'count': 'COUNT(*)'}))
+        self.assertNotEqual(
+            get_metric_definition('count', {'count': 'COUNT(*)'}),
+            get_metric_definition('count', {'count': 'COUNT(id)'}))
+
+    def test_is_finer_grain(self):
+        self.assertTrue(is_finer_grain('PT1H', 'P1D'))
+        self.assertTrue(is_finer_grain('P1D', '1969-12-29T00:00:00Z/P1W'))
+        self.assertTrue(is_finer_grain('PT1H', 'P1M'))
+        self.assertTrue(is_finer_grain('P1M', 'P0.25Y'))
+        self.assertTrue(is_finer_grain(None, 'P1Y'))
+        self.assertFalse(is_finer_grain('P1D', 'PT1H'))
+        self.assertFalse(is_finer_grain('1969-12-29T00:00:00Z/P1W', 'P1M'))
+        self.assertFalse(is_finer_grain(
+            '1969-12-28T00:00:00Z/P1W', '1969-12-29T00:00:00Z/P1W'))
+
+    def test_roll_up(self):
+        df = pd.DataFrame({
+            'gender': ['boy', 'girl', 'boy', 'girl'],
+            'state': ['CA', 'CA', 'NY', 'NY'],
+            DTTM_ALIAS: pd.to_datetime([
+                '2019-05-01 10:00', '2019-05-01 11:00',
+                '2019-05-02 10:00', '2019-05-02 12:00',
+            ]),
+            'count': [1, 2, 3, 4],
+            'max__num': [5, 1, 2, 7],
+        })
+        aggregates = OrderedDict([('count', 'sum'), ('max__num', 'max')])
+        result = roll_up(df, ['gender'], aggregates, True, 'P1D', timedelta())
+        self.assertEqual(
+            ['gender', DTTM_ALIAS, 'count', 'max__num'], list(result.columns))
+        result = result.set_index(['gender', DTTM_ALIAS])
+        self.assertEqual(3, result.loc[('boy', datetime(2019, 5, 2)), 'count'])
+        self.assertEqual(7, result.loc[('girl', datetime(2019, 5, 2)), 'max__num'])
+
+        result = roll_up(df, [], aggregates, False, None, timedelta())
+        self.assertEqual([10], list(result['count']))
+        self.assertEqual([7], list(result['max__num']))
+
+        # as in SQL, sums of NULLs only are NULL
+        nulls = df.assign(count=[None, 2, None, 4])
+        result = roll_up(nulls, ['gender'], aggregates, False, None, timedelta())
+        result = result.set_index('gender')
+        self.assertTrue(pd.isnull(result.loc['boy', 'count']))
+        self.assertEqual(6, result.loc['girl', 'count'])
+        result = roll_up(
+            nulls.assign(count=None), [], aggregates, False, None, timedelta())
+        self.assertTrue(pd.isnull(result.loc[0, 'count']))
+
+        # NULLs are a group of their own in SQL
+        df.loc[0, 'gender'] = None
+        self.assertIsNone(
+            roll_up(df, ['gender'], aggregates, True, 'P1D', timedelta()))
+
+    def test_index(self):
+        cache = SimpleCache()
+        for key, groupby, time_grain, rowcount in (
+                ('hourly', ['gender', 'state'], 'PT1H', 100),
+                ('daily', ['gender', 'state'], 'P1D', 10),
+                ('monthly', ['gender'], 'P1M', 2)):
+            register(cache, 'index', {
+                'key': key,
+                'groupby': groupby,
+                'metrics': ['count'],
+                'is_timeseries': True,
+                'time_grain': time_grain,
+                'rowcount': rowcount,
+            }, max_entries=3, timeout=60)
+
+        def keys(*args):
+            return [e['key'] for e in find_sources(cache, 'index', *args)]
+
+        self.assertEqual(
+            ['daily', 'hourly'], keys(['state'], ['count'], True, 'P1D'))
+        self.assertEqual(
+            ['monthly', 'daily', 'hourly'], keys(['gender'], ['count'], False, None))
+        self.assertEqual([], keys(['gender'], ['sum__num'], True, 'P1D'))
+
+        register(cache, 'index', {
+            'key': 'yearly',
+            'groupby': [],
+            'metrics': ['count'],
+            'is_timeseries': True,
+            'time_grain': 'P1Y',
+            'rowcount': 1,
+        }, max_entries=3, timeout=60)
+        # the oldest entry got evicted
+        self.assertEqual(['daily'], keys(['state'], ['count'], True, 'P1D'))
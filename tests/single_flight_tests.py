@@ -0,0 +1,91 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the coalescing of identical chart queries"""
+import threading
+from unittest import TestCase
+from unittest.mock import Mock
+
+from werkzeug.contrib.cache import SimpleCache
+
+from superset.utils.single_flight import CacheLock, LocalLock, SingleFlight
+
+CACHE_CONFIG = {
+    'CACHE_SINGLE_FLIGHT_TIMEOUT': 1,
+    'CACHE_SINGLE_FLIGHT_POLL_INTERVAL': 0.01,
+}
+
+
+class SingleFlightTestCase(TestCase):
+
+    def setUp(self):
+        self.cache = SimpleCache()
+
+    def test_locks(self):
+        for lock_class in (CacheLock, LocalLock):
+            lock = lock_class(self.cache, 'key', 10)
+            other = lock_class(self.cache, 'key', 10)
+            self.assertTrue(lock.acquire())
+            self.assertFalse(other.acquire())
+            self.assertTrue(other.is_held())
+            other.release()
+            self.assertTrue(lock.is_held())
+            lock.release()
+            self.assertFalse(lock.is_held())
+            self.assertTrue(other.acquire())
+            other.release()
+
+    def test_disabled(self):
+        flight = SingleFlight(self.cache, 'key', {})
+        self.assertFalse(flight.enabled)
+        self.assertIsNone(flight.wait())
+        flight.release()
+
+    def test_waiter_gets_leader_value(self):
+        leader = SingleFlight(self.cache, 'key', CACHE_CONFIG)
+        self.assertIsNone(leader.wait())
+        self.assertTrue(leader.is_leader)
+
+        waiting = threading.Event()
+        stats_logger = Mock()
+        stats_logger.incr.side_effect = lambda key: waiting.set()
+        results = []
+        waiter = SingleFlight(self.cache, 'key', CACHE_CONFIG, stats_logger)
+        thread = threading.Thread(target=lambda: results.append(waiter.wait()))
+        thread.start()
+        waiting.wait()
+        self.cache.set('key', b'payload')
+        leader.release()
+        thread.join()
+        self.assertEqual(results, [b'payload'])
+        self.assertFalse(waiter.is_leader)
+        stats_logger.incr.assert_called_with('single_flight_coalesced')
+
+    def test_waiter_falls_back_when_leader_fails(self):
+        leader = SingleFlight(self.cache, 'key', CACHE_CONFIG)
+        leader.wait()
+        leader.release()
+        waiter = SingleFlight(self.cache, 'key', CACHE_CONFIG)
+        self.assertIsNone(waiter.wait())
+        self.assertTrue(waiter.is_leader)
+
+    def test_waiter_times_out(self):
+        config = dict(CACHE_CONFIG, CACHE_SINGLE_FLIGHT_TIMEOUT=0.05)
+        leader = SingleFlight(self.cache, 'key', config)
+        leader.wait()
+        waiter = SingleFlight(self.cache, 'key', config)
+        self.assertIsNone(waiter.wait())
+        self.assertFalse(waiter.is_leader)
@@ -14,8 +14,16 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
-from superset.connectors.sqla.models import TableColumn
+from datetime import datetime
+from unittest.mock import patch
+
+import pandas as pd
+from sqlalchemy.sql import column
+
+from superset import db
+from superset.connectors.sqla.models import SqlaRollup, TableColumn
 from superset.db_engine_specs import DruidEngineSpec
+from superset.exceptions import SupersetException
 from .base_tests import SupersetTestCase
 
 
@@ -40,3 +48,147 @@ class DatabaseModelTestCase(SupersetTestCase):
 
         col = TableColumn(column_name='foo', type='STRING')
         self.assertEquals(col.is_time, False)
+
+    def test_grouping_sets_query(self):
+        tbl = self.get_table_by_name('birth_names')
+        query_obj = {
+            'groupby': ['gender', 'state'],
+            'metrics': ['sum__num'],
+            'granularity': None,
+            'from_dttm': None,
+            'to_dttm': None,
+            'is_timeseries': False,
+            'filter': [],
+            'extras': {'grouping_sets': True},
+        }
+        with patch.object(
+                tbl.database.db_engine_spec, 'allows_grouping_sets', True):
+            sql = tbl.get_query_str(query_obj)
+            with self.assertRaises(Exception):
+                tbl.get_query_str(dict(query_obj, is_timeseries=True))
+        self.assertIn('GROUPING SETS((gender), (state))', sql)
+        self.assertIn('__grouping__gender', sql)
+        self.assertIn('__grouping__state', sql)
+
+    def test_time_windows_query(self):
+        tbl = self.get_table_by_name('birth_names')
+        query_obj = {
+            'groupby': ['gender'],
+            'metrics': ['sum__num'],
+            'granularity': 'ds',
+            'from_dttm': datetime(2000, 1, 1),
+            'to_dttm': datetime(2002, 1, 1),
+            'is_timeseries': True,
+            'filter': [],
+            'extras': {
+                'time_grain_sqla': 'P1Y',
+                'time_windows': [
+                    (datetime(2001, 1, 1), datetime(2002, 1, 1)),
+                    (datetime(2000, 1, 1), datetime(2001, 1, 1)),
+                ],
+            },
+        }
+        sql = tbl.get_query_str(query_obj)
+        self.assertIn('__time_windows', sql)
+        self.assertIn('CASE WHEN', sql.upper())
+
+    def test_get_top_groups(self):
+        tbl = self.get_table_by_name('birth_names')
+        df = pd.DataFrame({
+            'gender': ['boy', 'girl', 'boy', 'girl', None],
+            'state': ['CA', 'CA', 'NY', 'NY', 'TX'],
+            'sum__num': [5, 4, 3, 2, 1],
+        })
+        groupby_exprs = {'gender': column('gender'), 'state': column('state')}
+        predicate = tbl._get_top_groups(df, ['gender', 'state'], groupby_exprs)
+        sql = str(predicate.compile(compile_kwargs={'literal_binds': True}))
+        self.assertEqual(
+            "gender IN ('boy', 'girl') AND state IN ('CA', 'NY') OR "
+            "gender IS NULL AND state = 'TX'",
+            sql)
+        predicate = tbl._get_top_groups(df, ['state'], groupby_exprs)
+        sql = str(predicate.compile(compile_kwargs={'literal_binds': True}))
+        self.assertEqual("state IN ('CA', 'NY', 'TX')", sql)
+
+    def test_rollup_routing(self):
+        tbl = self.get_table_by_name('birth_names')
+        rollup = SqlaRollup(
+            name='daily_by_state',
+            dimensions='["gender", "state"]',
+            metrics='["sum__num"]',
+            time_grain='P1D',
+            physical_table='superset_rollup_1_1',
+            row_count=100,
+            refreshed_on=datetime(2019, 5, 1, 12))
+        query_obj = {
+            'groupby': ['gender'],
+            'metrics': ['sum__num'],
+            'granularity': 'ds',
+            'from_dttm': datetime(2000, 1, 1),
+            'to_dttm': datetime(2002, 1, 1),
+            'is_timeseries': True,
+            'filter': [{'col': 'state', 'op': 'in', 'val': ['CA']}],
+            'extras': {'time_grain_sqla': 'P1Y'},
+        }
+        tbl.rollups.append(rollup)
+        try:
+            rollup.validate()
+            rollup.definition = rollup.get_definition()
+            sql = tbl.get_query_str(query_obj)
+            self.assertIn('-- routed to the daily_by_state rollup', sql)
+            self.assertIn('superset_rollup_1_1', sql)
+            self.assertIn('__bucket_start', sql)
+
+            not_covered = [
+                dict(query_obj, groupby=['name']),
+                dict(query_obj, metrics=['count']),
+                dict(query_obj, from_dttm=datetime(2000, 1, 1, 12)),
+                dict(query_obj, extras={'time_grain_sqla': 'PT1H'}),
+                dict(query_obj, extras={'time_grain_sqla': 'P1Y', 'where': '1 = 1'}),
+                # the rollup may lack rows after its last complete bucket
+                dict(query_obj, to_dttm=datetime(2019, 5, 1)),
+                dict(query_obj, to_dttm=None),
+            ]
+            for obj in not_covered:
+                self.assertFalse(rollup.covers(obj))
+                self.assertNotIn('superset_rollup_1_1', tbl.get_query_str(obj))
+
+            # editing a metric leaves the rollup stale until its next refresh
+            metric = [m for m in tbl.metrics if m.metric_name == 'sum__num'][0]
+            metric.expression = 'SUM(num + 1)'
+            self.assertFalse(rollup.covers(query_obj))
+            self.assertTrue(rollup.is_due(datetime.utcnow()))
+
+            rollup.dimensions = '["gender", "nope"]'
+            with self.assertRaises(SupersetException):
+                rollup.validate()
+        finally:
+            db.session.rollback()
+
+    def test_approximate_query(self):
+        tbl = self.get_table_by_name('birth_names')
+        query_obj = {
+            'groupby': ['gender'],
+            'metrics': [{
+                'expressionType': 'SIMPLE',
+                'aggregate': 'COUNT_DISTINCT',
+                'column': {'column_name': 'name'},
+                'label': 'names',
+            }],
+            'granularity': None,
+            'from_dttm': None,
+            'to_dttm': None,
+            'is_timeseries': False,
+            'filter': [],
+            'extras': {'approximate': True},
+        }
+        spec = tbl.database.db_engine_spec
+        with patch.object(
+                spec, 'approximate_aggregates', {'COUNT_DISTINCT': 'NDV({col})'}):
+            self.assertTrue(tbl.is_approximate(query_obj))
+            self.assertIn('NDV(name)', tbl.get_query_str(query_obj))
+            exact_query_obj = dict(query_obj, extras={'approximate': False})
+            self.assertFalse(tbl.is_approximate(exact_query_obj))
+            self.assertNotIn('NDV', tbl.get_query_str(exact_query_obj))
+        self.assertFalse(tbl.is_approximate(query_obj))
+        self.assertNotIn('NDV', tbl.get_query_str(query_obj))
@@ -0,0 +1,42 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for stale-while-revalidate chart caching"""
+from unittest import TestCase
+from unittest.mock import patch
+
+from superset.utils.stale_cache import is_stale, set_freshness
+
+
+class StaleCacheTestCase(TestCase):
+
+    @patch('superset.utils.stale_cache.time')
+    def test_freshness(self, mock_time):
+        mock_time.time.return_value = 1000
+        cache_value = {}
+        self.assertEqual(set_freshness(cache_value, 60, 600), 660)
+        self.assertEqual(cache_value, {'fresh_until': 1060})
+        self.assertFalse(is_stale(cache_value))
+        mock_time.time.return_value = 1061
+        self.assertTrue(is_stale(cache_value))
+
+    def test_freshness_disabled(self):
+        cache_value = {}
+        self.assertEqual(set_freshness(cache_value, 60, None), 60)
+        # entries that never expire never go stale
+        self.assertEqual(set_freshness(cache_value, 0, 600), 0)
+        self.assertEqual(cache_value, {})
+        self.assertFalse(is_stale(cache_value))
@@ -0,0 +1,104 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for answering queries from broader cached results"""
+from unittest import TestCase
+
+import pandas as pd
+from werkzeug.contrib.cache import SimpleCache
+
+from superset.utils import subsumption
+from superset.utils.cache_index import register
+
+
+def query_obj(row_limit, *filters):
+    return {
+        'groupby': ['gender', 'state'],
+        'metrics': ['count'],
+        'row_limit': row_limit,
+        'filter': list(filters),
+    }
+
+
+class SubsumptionTestCase(TestCase):
+
+    def test_split_filters(self):
+        relaxable, others = subsumption.split_filters(query_obj(
+            10,
+            {'col': 'gender', 'op': '==', 'val': 'boy'},
+            {'col': 'state', 'op': 'not in', 'val': ['CA']},
+            {'col': 'name', 'op': 'in', 'val': ['Aaron']},
+        ))
+        self.assertEqual({'gender': ['boy']}, relaxable)
+        self.assertEqual(['state', 'name'], [flt['col'] for flt in others])
+        filtered = query_obj(100, {'col': 'gender', 'op': '==', 'val': 'boy'})
+        self.assertEqual(
+            subsumption.relax(filtered), subsumption.relax(query_obj(10)))
+
+    def test_match(self):
+        df = pd.DataFrame({'gender': ['boy', 'girl'], 'count': [2, 1]})
+        complete = subsumption.make_entry(
+            'complete',
+            query_obj(10, {'col': 'gender', 'op': 'in', 'val': ['boy', 'girl']}),
+            df)
+        truncated = subsumption.make_entry('truncated', query_obj(2), df)
+
+        self.assertEqual('row_limit', subsumption.match(
+            complete, {'gender': ['girl', 'boy']}, 1000))
+        self.assertEqual('filter', subsumption.match(
+            complete, {'gender': ['boy'], 'state': ['CA']}, 10))
+        self.assertIsNone(subsumption.match(complete, {}, 10))
+        self.assertIsNone(subsumption.match(complete, {'gender': ['other']}, 10))
+
+        self.assertEqual('row_limit', subsumption.match(truncated, {}, 1))
+        self.assertIsNone(subsumption.match(truncated, {}, 3))
+        self.assertIsNone(subsumption.match(truncated, {'gender': ['boy']}, 1))
+
+    def test_find_source_and_apply(self):
+        cache = SimpleCache()
+        df = pd.DataFrame({
+            'gender': ['boy', 'girl', 'boy', None],
+            'state': ['CA', 'CA', 'NY', 'NY'],
+            'count': [4, 3, 2, 1],
+        })
+        register(
+            cache,
+            'index',
+            subsumption.make_entry('key', query_obj(10), df),
+            max_entries=10,
+            timeout=60)
+
+        qry = query_obj(
+            10,
+            {'col': 'gender', 'op': 'in', 'val': ['boy', '<NULL>']},
+            {'col': 'state', 'op': '==', 'val': 'NY'})
+        entry, kind = subsumption.find_source(cache, 'index', qry)
+        self.assertEqual(('key', 'filter'), (entry['key'], kind))
+        result = subsumption.apply(df, qry)
+        self.assertEqual([2, 1], list(result['count']))
+
+        # booleans and dates aren't compared in pandas
+        for gender in (
+                [True, False, True, None],
+                [True, False, True, False],
+                pd.to_datetime(['2019-01-01', '2019-01-02', None, None]),
+                [pd.Timestamp('2019-01-01'), None, None, None]):
+            qry = query_obj(10, {'col': 'gender', 'op': '==', 'val': 'true'})
+            self.assertIsNone(subsumption.apply(df.assign(gender=gender), qry))
+
+        entry, kind = subsumption.find_source(cache, 'index', query_obj(2))
+        self.assertEqual('row_limit', kind)
+        self.assertEqual([4, 3], list(subsumption.apply(df, query_obj(2))['count']))
@@ -0,0 +1,152 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the in-process chart cache tier"""
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from werkzeug.contrib.cache import SimpleCache
+
+from superset.utils.tiered_cache import (
+    evict_local,
+    has_key,
+    LocalLRUCache,
+    setup_tiered_cache,
+    TieredCache,
+)
+
+
+class LocalLRUCacheTestCase(TestCase):
+
+    def test_get_set(self):
+        local = LocalLRUCache()
+        self.assertEqual(local.get('foo'), (False, None))
+        local.set('foo', b'bar')
+        self.assertEqual(local.get('foo'), (True, b'bar'))
+        local.set('baz', {'a': 1})
+        self.assertEqual(local.get('baz'), (True, {'a': 1}))
+
+    def test_values_are_not_shared(self):
+        local = LocalLRUCache()
+        local.set('foo', {'a': 1})
+        local.get('foo')[1]['a'] = 2
+        self.assertEqual(local.get('foo'), (True, {'a': 1}))
+
+    def test_max_entries(self):
+        local = LocalLRUCache(max_entries=2)
+        local.set('a', b'1')
+        local.set('b', b'2')
+        local.get('a')
+        self.assertEqual(local.set('c', b'3'), 1)
+        self.assertTrue(local.get('a')[0])
+        self.assertFalse(local.get('b')[0])
+        self.assertTrue(local.get('c')[0])
+
+    def test_max_bytes(self):
+        local = LocalLRUCache(max_bytes=10)
+        local.set('a', b'12345')
+        local.set('b', b'12345')
+        local.set('c', b'1')
+        self.assertFalse(local.get('a')[0])
+        self.assertEqual(local.size, 6)
+        local.set('d', b'x' * 11)
+        self.assertFalse(local.get('d')[0])
+
+    @patch('superset.utils.tiered_cache.time')
+    def test_timeouts(self, mock_time):
+        mock_time.time.return_value = 0
+        local = LocalLRUCache(max_timeout=300)
+        local.set('a', b'1', timeout=10)
+        local.set('b', b'2', timeout=3600)
+        mock_time.time.return_value = 20
+        self.assertFalse(local.get('a')[0])
+        self.assertTrue(local.get('b')[0])
+        mock_time.time.return_value = 301
+        self.assertFalse(local.get('b')[0])
+        self.assertEqual(len(local), 0)
+
+
+class TieredCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.backend = Mock()
+        self.stats_logger = Mock()
+        self.cache = TieredCache(
+            self.backend, LocalLRUCache(), self.stats_logger)
+
+    def test_reads_through_local_tier(self):
+        self.backend.get.return_value = b'value'
+        self.assertEqual(self.cache.get('key'), b'value')
+        self.assertEqual(self.cache.get('key'), b'value')
+        self.backend.get.assert_called_once_with('key')
+        self.stats_logger.incr.assert_any_call('l1_cache_miss')
+        self.stats_logger.incr.assert_any_call('l1_cache_hit')
+
+    def test_set_writes_both_tiers(self):
+        self.cache.set('key', b'value', timeout=60)
+        self.backend.set.assert_called_once_with('key', b'value', timeout=60)
+        self.assertEqual(self.cache.get('key'), b'value')
+        self.backend.get.assert_not_called()
+
+    def test_failed_set_skips_local_tier(self):
+        self.cache.set('key', b'old')
+        self.backend.set.return_value = False
+        self.assertFalse(self.cache.set('key', b'value'))
+        self.backend.get.return_value = b'old'
+        self.assertEqual(self.cache.get('key'), b'old')
+        self.backend.get.assert_called_once_with('key')
+
+        self.backend.set.side_effect = Exception('Connection refused')
+        with self.assertRaises(Exception):
+            self.cache.set('other', b'value')
+        self.backend.get.return_value = None
+        self.assertIsNone(self.cache.get('other'))
+
+    def test_evict_local(self):
+        self.cache.set('key', b'value')
+        evict_local(self.cache, 'key')
+        self.backend.get.return_value = None
+        self.assertIsNone(self.cache.get('key'))
+        # no-op on caches without a local tier
+        evict_local(self.backend, 'key')
+
+    def test_proxies_backend(self):
+        self.cache.clear()
+        self.backend.clear.assert_called_once()
+        self.assertEqual(self.cache.cache, self.backend.cache)
+
+    def test_setup_tiered_cache(self):
+        self.assertIs(setup_tiered_cache(self.backend, {}), self.backend)
+        cache = setup_tiered_cache(
+            self.backend, {'CACHE_L1_MAX_ENTRIES': 10, 'CACHE_L1_MAX_BYTES': 100})
+        self.assertEqual(cache.local.max_entries, 10)
+        self.assertEqual(cache.local.max_bytes, 100)
+
+    def test_has_key(self):
+        self.cache.set('key', b'value')
+        self.assertTrue(has_key(self.cache, 'key'))
+        self.backend.cache.has.assert_not_called()
+
+        self.backend.cache.has.return_value = False
+        self.assertFalse(has_key(self.cache, 'other'))
+        self.backend.get.assert_not_called()
+
+        # backends that can't tell fall back to fetching the value
+        backend = SimpleCache()
+        backend.has = Mock(side_effect=NotImplementedError)
+        backend.set('key', b'value')
+        self.assertTrue(has_key(backend, 'key'))
+        self.assertFalse(has_key(backend, 'other'))
@@ -0,0 +1,65 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for answering time comparisons with a single query"""
+from collections import OrderedDict
+from datetime import datetime
+from unittest import TestCase
+
+import pandas as pd
+
+from superset.utils.core import DTTM_ALIAS, TIME_WINDOWS_ALIAS
+from superset.utils.time_compare import is_worth_scanning_together, split_windows
+
+
+class TimeCompareTestCase(TestCase):
+
+    def test_is_worth_scanning_together(self):
+        week = (datetime(2019, 5, 8), datetime(2019, 5, 15))
+        previous_week = (datetime(2019, 5, 1), datetime(2019, 5, 8))
+        previous_year = (datetime(2018, 5, 8), datetime(2018, 5, 15))
+        self.assertTrue(is_worth_scanning_together([week, previous_week], 1))
+        self.assertFalse(is_worth_scanning_together([week, previous_year], 1))
+        self.assertTrue(is_worth_scanning_together([week, previous_year], 100))
+        self.assertFalse(is_worth_scanning_together([week, previous_week], None))
+        self.assertFalse(is_worth_scanning_together([week], 1))
+
+    def test_split_windows(self):
+        df = pd.DataFrame({
+            'gender': ['boy', 'girl', 'boy', 'boy'],
+            DTTM_ALIAS: pd.to_datetime([
+                '2019-05-01', '2019-05-01', '2019-05-08', '2019-05-08']),
+            'sum__num': [1, 2, 3, 4],
+            # the bucket of the 8th straddles the bound of both windows
+            TIME_WINDOWS_ALIAS: [2, 2, 1, 3],
+        })
+        aggregates = OrderedDict([('sum__num', 'sum')])
+        week, previous_week = split_windows(df, 2, ['gender'], aggregates, 10, True)
+        self.assertEqual(['gender', DTTM_ALIAS, 'sum__num'], list(week.columns))
+        self.assertEqual([7], list(week['sum__num']))
+        self.assertEqual([4, 2, 1], list(previous_week['sum__num']))
+
+        # frames that could have been truncated by the row limit are left out
+        week, previous_week = split_windows(df, 2, ['gender'], aggregates, 2, True)
+        self.assertIsNotNone(week)
+        self.assertIsNone(previous_week)
+
+        # NULLs are a group of their own in SQL
+        df.loc[2, 'gender'] = None
+        df.loc[3, 'gender'] = None
+        week, previous_week = split_windows(df, 2, ['gender'], aggregates, 10, True)
+        self.assertIsNone(week)
+        self.assertEqual([4, 2, 1], list(previous_week['sum__num']))
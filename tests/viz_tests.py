@@ -22,7 +22,7 @@ import pandas as pd
 
 from superset import app
 from superset.exceptions import SpatialException
-from superset.utils.core import DTTM_ALIAS
+from superset.utils.core import DTTM_ALIAS, QueryStatus
 import superset.viz as viz
 from .base_tests import SupersetTestCase
 from .utils import load_fixture
@@ -93,6 +93,14 @@ class BaseVizTestCase(SupersetTestCase):
         self.assertEqual(type(result), pd.DataFrame)
         self.assertTrue(result.empty)
 
+    def test_get_df_confirms_cost_outside_query_obj(self):
+        query_obj = {'granularity': 'day', 'extras': {}}
+        datasource = self.get_datasource_mock()
+        test_viz = viz.BaseViz(datasource, {'confirm_cost': True})
+        test_viz.get_df(query_obj)
+        datasource.query.assert_called_with(query_obj, cost_confirmed=True)
+        self.assertEqual({'granularity': 'day', 'extras': {}}, query_obj)
+
     def test_get_df_handles_dttm_col(self):
         form_data = {'dummy': 123}
         query_obj = {'granularity': 'day'}
@@ -100,6 +108,7 @@ class BaseVizTestCase(SupersetTestCase):
         results.query = Mock()
         results.status = Mock()
         results.error_message = Mock()
+        results.queue_wait = 0
         datasource = Mock()
         datasource.type = 'table'
         datasource.query = Mock(return_value=results)
@@ -168,6 +177,84 @@ class BaseVizTestCase(SupersetTestCase):
         test_viz = viz.BaseViz(datasource, form_data={})
         self.assertEqual(app.config['CACHE_DEFAULT_TIMEOUT'], test_viz.cache_timeout)
 
+    def test_cache_stale_timeout(self):
+        datasource = self.get_datasource_mock()
+        datasource.params_dict = {'cache_stale_timeout': 60}
+        test_viz = viz.BaseViz(datasource, form_data={})
+        self.assertEqual(60, test_viz.cache_stale_timeout)
+
+        datasource.params_dict = {}
+        datasource.database.get_extra.return_value = {'cache_stale_timeout': 600}
+        self.assertEqual(600, test_viz.cache_stale_timeout)
+
+        datasource.database.get_extra.return_value = {}
+        self.assertEqual(
+            app.config['CACHE_STALE_TIMEOUT'], test_viz.cache_stale_timeout)
+
+    def test_get_df_incremental(self):
+        datasource = self.get_datasource_mock()
+        datasource.uid = '1__table'
+        datasource.offset = 0
+        datasource.cache_generation = None
+        test_viz = viz.BaseViz(datasource, form_data={})
+        cached = {}
+        mock_cache = Mock()
+        mock_cache.get_many.side_effect = lambda *keys: [cached.get(k) for k in keys]
+        mock_cache.set.side_effect = \
+            lambda key, value, timeout=None: cached.update({key: value})
+
+        def get_df(query_obj):
+            test_viz.status = QueryStatus.SUCCESS
+            test_viz.query = 'SELECT ...'
+            days = pd.date_range(
+                query_obj['from_dttm'], query_obj['to_dttm'], freq='D')
+            return pd.DataFrame({
+                DTTM_ALIAS: days,
+                'count': [d.day for d in days],
+            })
+
+        def query_obj(from_dttm, to_dttm):
+            return {
+                'granularity': 'ds',
+                'from_dttm': from_dttm,
+                'to_dttm': to_dttm,
+                'is_timeseries': True,
+                'groupby': [],
+                'metrics': ['count'],
+                'row_limit': 100,
+                'filter': [],
+                'timeseries_limit': 0,
+                'extras': {'time_grain_sqla': 'P1D'},
+                'order_desc': True,
+                'prequeries': [],
+                'is_prequery': False,
+            }
+
+        cache_config = {'CACHE_TYPE': 'simple', 'CACHE_INCREMENTAL': True}
+        with patch.dict(app.config, {'CACHE_CONFIG': cache_config}), \
+                patch.object(viz, 'cache', mock_cache), \
+                patch.object(test_viz, 'get_df', side_effect=get_df) as mock_get_df:
+            qry = query_obj(datetime(2019, 5, 1), datetime(2019, 5, 5))
+            buckets = test_viz.incremental_buckets(qry)
+            self.assertEqual(4, len(buckets))
+            df = test_viz.get_df_incremental(qry, buckets)
+            self.assertEqual([5, 4, 3, 2, 1], list(df['count']))
+            self.assertEqual(4, len(cached))
+
+            # moving the time range only queries the days that aren't cached
+            mock_get_df.reset_mock()
+            qry = query_obj(datetime(2019, 5, 2), datetime(2019, 5, 6))
+            df = test_viz.get_df_incremental(qry, test_viz.incremental_buckets(qry))
+            self.assertEqual([6, 5, 4, 3, 2], list(df['count']))
+            self.assertEqual(1, mock_get_df.call_count)
+            range_obj = mock_get_df.call_args[0][0]
+            self.assertEqual(datetime(2019, 5, 5), range_obj['from_dttm'])
+            self.assertEqual(datetime(2019, 5, 6), range_obj['to_dttm'])
+
+            # ranked series can't be split in time buckets
+            qry['timeseries_limit'] = 10
+            self.assertIsNone(test_viz.incremental_buckets(qry))
+
 
 class TableVizTestCase(SupersetTestCase):
 
@@ -1096,3 +1183,128 @@ class TimeSeriesVizTestCase(SupersetTestCase):
                 u'key': (u'Real Madrid C.F.\U0001f1fa\U0001f1f8\U0001f1ec\U0001f1e7',)},
         ]
         self.assertEqual(expected, viz_data)
+
+
+class FilterBoxVizTestCase(SupersetTestCase):
+
+    def test_extra_queries_run_concurrently(self):
+        datasource = self.get_datasource_mock()
+        datasource.database.get_extra.return_value = {'query_concurrency': 3}
+        test_viz = viz.FilterBoxViz(datasource, form_data={})
+        self.assertEqual(3, test_viz.query_concurrency)
+
+        df = pd.DataFrame({'gender': ['boy', 'girl']})
+        queries = [({'groupby': ['gender']}, {}), ({'groupby': ['state']}, {})]
+        extra_payloads = {
+            'gender': {
+                'cache_key': 'gender_key',
+                'cached_dttm': '2019-01-01T00:00:00',
+                'df': df,
+                'is_cached': True,
+                'is_stale': False,
+            },
+            'state': {
+                'df': None,
+                'error': 'Column state does not exist',
+                'is_cached': False,
+                'status': QueryStatus.FAILED,
+            },
+        }
+        main_payload = {'cache_key': None, 'df': None, 'is_cached': False}
+        with app.app_context(), \
+                patch.object(viz.FilterBoxViz, 'extra_queries', return_value=queries), \
+                patch.object(
+                    viz.FilterBoxViz,
+                    'get_extra_df_payload',
+                    side_effect=lambda qry: extra_payloads[qry['groupby'][0]]), \
+                patch.object(
+                    viz.FilterBoxViz, 'get_df_payload', return_value=main_payload):
+            payload = test_viz.get_df_payload_with_extras()
+
+        self.assertIs(df, test_viz.dataframes['gender'])
+        self.assertIsNone(test_viz.dataframes['state'])
+        self.assertTrue(payload['is_cached'])
+        self.assertEqual('gender_key', payload['cache_key'])
+        self.assertEqual('2019-01-01T00:00:00', payload['cached_dttm'])
+
+    def test_extra_queries_run_serially_in_query_pool(self):
+        datasource = self.get_datasource_mock()
+        datasource.database.get_extra.return_value = {'query_concurrency': 3}
+        test_viz = viz.FilterBoxViz(datasource, form_data={})
+        test_viz.run_extras_concurrently = False
+
+        df = pd.DataFrame({'gender': ['boy', 'girl']})
+        queries = [({'groupby': ['gender'], 'extras': {}}, {})]
+        main_payload = {'cache_key': None, 'df': None, 'is_cached': False}
+
+        def get_df_payload(query_obj=None):
+            return {'df': df} if query_obj else main_payload
+
+        with app.app_context(), \
+                patch.object(viz.FilterBoxViz, 'extra_queries', return_value=queries), \
+                patch.object(viz.FilterBoxViz, 'get_extra_df_payload') as extra, \
+                patch.object(
+                    viz.FilterBoxViz, 'get_df_payload', side_effect=get_df_payload):
+            payload = test_viz.get_df_payload_with_extras()
+
+        extra.assert_not_called()
+        self.assertIs(main_payload, payload)
+        self.assertIs(df, test_viz.dataframes['gender'])
+
+    def test_grouping_sets(self):
+        datasource = self.get_datasource_mock()
+        datasource.database.db_engine_spec.allows_grouping_sets = True
+        columns = {
+            'gender': Mock(type='VARCHAR(16)'),
+            'num_boys': Mock(type='BIGINT'),
+        }
+        datasource.get_col = Mock(side_effect=columns.get)
+        test_viz = viz.FilterBoxViz(datasource, form_data={})
+        filter_queries = [
+            ({
+                'groupby': ['gender'],
+                'metrics': ['sum__num'],
+                'row_limit': 1000,
+                'extras': {},
+            }, {}),
+            ({
+                'groupby': ['num_boys'],
+                'metrics': [],
+                'row_limit': 1000,
+                'extras': {},
+            }, {}),
+        ]
+        df = pd.DataFrame({
+            'gender': ['boy', 'girl', None, None],
+            'num_boys': [None, None, 1, 2],
+            'sum__num': [10, 20, 1, 29],
+            '__grouping__gender': [0, 0, 1, 1],
+            '__grouping__num_boys': [1, 1, 0, 0],
+        })
+        with patch.object(
+                viz.FilterBoxViz, 'filter_queries', return_value=filter_queries):
+            queries = test_viz.extra_queries()
+            self.assertEqual(1, len(queries))
+            qry = queries[0][0]
+            self.assertEqual(['gender', 'num_boys'], qry['groupby'])
+            self.assertEqual(['sum__num'], qry['metrics'])
+            self.assertEqual(2000, qry['row_limit'])
+            self.assertTrue(qry['extras']['grouping_sets'])
+
+            test_viz.process_extra_payloads(queries, [{'df': df}])
+            gender_df = test_viz.dataframes['gender']
+            self.assertEqual(['gender', 'sum__num'], list(gender_df.columns))
+            self.assertEqual(['boy', 'girl'], list(gender_df['gender']))
+            num_boys_df = test_viz.dataframes['num_boys']
+            self.assertEqual(['num_boys'], list(num_boys_df.columns))
+            self.assertEqual('int64', str(num_boys_df['num_boys'].dtype))
+
+            # truncated results fall back to a query per filter
+            with patch.object(
+                    viz.FilterBoxViz,
+                    'get_df_payload',
+                    side_effect=lambda qry: {'df': qry['groupby'][0]}):
+                test_viz.process_extra_payloads(
+                    [(dict(qry, row_limit=4), {})], [{'df': df}])
+            self.assertEqual(
+                {'gender': 'gender', 'num_boys': 'num_boys'}, test_viz.dataframes)